@@ -1,21 +1,53 @@
+import time
+_MODULE_LOAD_STARTED = time.perf_counter() # --profile-startup reports this module's own import time from here
 import pickle
 import os
 import sys
 import threading
-import time
 import random
 import functools
-import tkinter as tk
-import win32api
-import win32con # Import win32con for SW_SHOWNA and MONITOR_DEFAULTTOPRIMARY
-
-import customtkinter
-import ahk
-import win32gui
+import collections
+import fnmatch
+import heapq
+import concurrent.futures
+import re
+import importlib
 import ctypes
+import ctypes.wintypes
 import platform
-import subprocess
-import importlib.util
+
+IMPORT_TIMINGS = {} # module name -> ms spent importing it, for --profile-startup
+_OPTIONAL_MODULES = {}
+
+def optional_import(name):
+    """
+    Imports a third-party module on first use and caches it (None if it is not installed), so later
+    calls are a dict lookup. The import time is recorded in IMPORT_TIMINGS.
+    """
+    if name not in _OPTIONAL_MODULES:
+        start = time.perf_counter()
+        try:
+            _OPTIONAL_MODULES[name] = importlib.import_module(name)
+        except ImportError:
+            _OPTIONAL_MODULES[name] = None
+        IMPORT_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 1)
+    return _OPTIONAL_MODULES[name]
+
+# pywin32 is needed as soon as the engine enumerates windows, so it is loaded here. It is Windows-only;
+# elsewhere only the simulated window system (benchmarks) works.
+win32api = optional_import('win32api')
+win32gui = optional_import('win32gui')
+
+tk = customtkinter = None # Set by load_gui_toolkit(); a headless engine never imports them
+
+def load_gui_toolkit():
+    """Imports tkinter and customtkinter for the settings panel, once."""
+    global tk, customtkinter
+    if customtkinter is None:
+        tk = optional_import('tkinter')
+        customtkinter = optional_import('customtkinter')
+        if tk is None or customtkinter is None:
+            raise ImportError("The settings panel needs tkinter and customtkinter (pip install customtkinter).")
 
 # --- Windows API Constants and Functions ---
 GWL_EXSTYLE = -20
@@ -27,6 +59,77 @@ PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
 PROCESS_QUERY_INFORMATION = 0x0400
 PROCESS_VM_READ = 0x0010
 
+# WinEvent hook constants (SetWinEventHook)
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_CREATE = 0x8000
+EVENT_OBJECT_DESTROY = 0x8001
+EVENT_OBJECT_SHOW = 0x8002
+EVENT_OBJECT_HIDE = 0x8003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+
+# Modifier bitmask (same values as the RegisterHotKey MOD_* flags)
+MOD_ALT = 0x0001
+MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
+MOD_WIN = 0x0008
+
+VK_SHIFT = 0x10
+VK_CONTROL = 0x11
+VK_MENU = 0x12
+VK_LWIN = 0x5B
+VK_RWIN = 0x5C
+
+# Low-level hook constants (native hotkey backend)
+WH_KEYBOARD_LL = 13
+WH_MOUSE_LL = 14
+WM_QUIT = 0x0012
+WM_KEYDOWN = 0x0100
+WM_KEYUP = 0x0101
+WM_SYSKEYDOWN = 0x0104
+WM_SYSKEYUP = 0x0105
+WM_LBUTTONDOWN = 0x0201
+WM_LBUTTONUP = 0x0202
+WM_RBUTTONDOWN = 0x0204
+WM_RBUTTONUP = 0x0205
+WM_MBUTTONDOWN = 0x0207
+WM_MBUTTONUP = 0x0208
+WM_MOUSEWHEEL = 0x020A
+WM_XBUTTONDOWN = 0x020B
+WM_XBUTTONUP = 0x020C
+LLKHF_INJECTED = 0x10
+LLMHF_INJECTED = 0x01
+
+# GetLastError codes used to classify transparency failures
+ERROR_ACCESS_DENIED = 5
+ERROR_INVALID_WINDOW_HANDLE = 1400
+
+# Hung-window-safe variants (SendMessageTimeoutW / SetWindowPos)
+WM_GETTEXT = 0x000D
+SMTO_ABORTIFHUNG = 0x0002
+SWP_NOZORDER = 0x0004
+SWP_NOACTIVATE = 0x0010
+SWP_ASYNCWINDOWPOS = 0x4000
+
+# ShowWindow / GetAncestor / MonitorFromWindow arguments (as in win32con)
+SW_MINIMIZE = 6
+SW_RESTORE = 9
+GA_ROOT = 2
+MONITOR_DEFAULTTOPRIMARY = 1
+
+class KBDLLHOOKSTRUCT(ctypes.Structure):
+    _fields_ = [('vkCode', ctypes.c_ulong), ('scanCode', ctypes.c_ulong), ('flags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong), ('dwExtraInfo', ctypes.c_size_t)]
+
+class MSLLHOOKSTRUCT(ctypes.Structure):
+    _fields_ = [('x', ctypes.c_long), ('y', ctypes.c_long), ('mouseData', ctypes.c_ulong), ('flags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong), ('dwExtraInfo', ctypes.c_size_t)]
+
+WIN32_AVAILABLE = win32gui is not None
+WIN32_LOAD_ERROR = None if WIN32_AVAILABLE else "pywin32 is not installed"
 try:
     user32 = ctypes.windll.user32
     kernel32 = ctypes.windll.kernel32
@@ -43,12 +146,44 @@ try:
     SetLayeredWindowAttributes = user32.SetLayeredWindowAttributes
     OpenProcess = kernel32.OpenProcess
     QueryFullProcessImageNameW = kernel32.QueryFullProcessImageNameW
+    GetProcessTimes = kernel32.GetProcessTimes
     CloseHandle = kernel32.CloseHandle
+    GetLastError = kernel32.GetLastError
+    SetLastError = kernel32.SetLastError
+
+    WINEVENTPROC = ctypes.WINFUNCTYPE(None, ctypes.wintypes.HANDLE, ctypes.wintypes.DWORD, ctypes.wintypes.HWND,
+                                      ctypes.wintypes.LONG, ctypes.wintypes.LONG, ctypes.wintypes.DWORD, ctypes.wintypes.DWORD)
+    SetWinEventHook = user32.SetWinEventHook
+    SetWinEventHook.restype = ctypes.wintypes.HANDLE
+    SetWinEventHook.argtypes = [ctypes.wintypes.DWORD, ctypes.wintypes.DWORD, ctypes.wintypes.HMODULE, WINEVENTPROC,
+                                ctypes.wintypes.DWORD, ctypes.wintypes.DWORD, ctypes.wintypes.DWORD]
+    UnhookWinEvent = user32.UnhookWinEvent
+    UnhookWinEvent.argtypes = [ctypes.wintypes.HANDLE]
+    GetAsyncKeyState = user32.GetAsyncKeyState
+    GetAsyncKeyState.restype = ctypes.c_short
+
+    LowLevelHookProc = ctypes.WINFUNCTYPE(ctypes.c_ssize_t, ctypes.c_int, ctypes.wintypes.WPARAM, ctypes.wintypes.LPARAM)
+    SetWindowsHookExW = user32.SetWindowsHookExW
+    SetWindowsHookExW.restype = ctypes.wintypes.HANDLE
+    SetWindowsHookExW.argtypes = [ctypes.c_int, LowLevelHookProc, ctypes.wintypes.HINSTANCE, ctypes.wintypes.DWORD]
+    CallNextHookEx = user32.CallNextHookEx
+    CallNextHookEx.restype = ctypes.c_ssize_t
+    CallNextHookEx.argtypes = [ctypes.wintypes.HANDLE, ctypes.c_int, ctypes.wintypes.WPARAM, ctypes.wintypes.LPARAM]
+    UnhookWindowsHookEx = user32.UnhookWindowsHookEx
+    UnhookWindowsHookEx.argtypes = [ctypes.wintypes.HANDLE]
+    GetMessageW = user32.GetMessageW
+    PostThreadMessageW = user32.PostThreadMessageW
+    GetCurrentThreadId = kernel32.GetCurrentThreadId
+    SendMessageTimeoutW = user32.SendMessageTimeoutW
+    SendMessageTimeoutW.restype = ctypes.c_ssize_t
+    IsHungAppWindow = user32.IsHungAppWindow
+    ShowWindowAsync = user32.ShowWindowAsync
+    SetWindowPos = user32.SetWindowPos
 
 except AttributeError as e:
-    print(f"Error loading Windows API functions: {e}")
-    print("This script is intended for Windows operating systems.")
-    sys.exit(1)
+    # Checked before the GUI starts; benchmarks run on a simulated desktop without these.
+    WIN32_AVAILABLE = False
+    WIN32_LOAD_ERROR = e
 
 # --- GLOBAL CONFIGURATION ---
 INITIAL_WINDOW_SIZE = "450x900" # Slightly increased height for new settings
@@ -71,6 +206,7 @@ DEFAULT_SETTINGS = {
         'minimize_others': 'ctrl+shift+rbutton',
         'toggle_focus_mode': 'alt+q',
         'focus_mode_alt_tab': 'alt+tab',
+        'open_settings': 'ctrl+alt+shift+o',
         'increase_brightness': 'alt+wheelup',
         'decrease_brightness': 'alt+wheeldown',
         'set_80_percent_brightness': 'alt+xbutton2',
@@ -106,6 +242,7 @@ DEFAULT_SETTINGS = {
     'tooltip_alpha': 0.86,
     'ui_always_on_top': False,
     'show_mouse_position_ui': False,
+    'expanded_settings_sections': [], # Settings panel sections left open; their widgets are built once the window is up
     'apply_transparency_to_new_windows': False,
     'new_window_transparency_level': 86,
     'global_transparency_exclusions': 'dsclock, explorer, WorkerW, SideBar_HTMLHostWindow, Sidebar, kv_ds_digitclock_32', # REMOVED ElectricsheepWndClass
@@ -116,6 +253,17 @@ DEFAULT_SETTINGS = {
     'inactive_window_auto_update': False,    # RESTORED
     'window_monitor_interval_ms': 200,
     'new_window_check_interval_ms': 2000,
+    'use_window_event_hooks': True, # Track foreground changes via WinEvent hooks instead of polling
+    'foreground_fallback_poll_ms': 1000, # Safety-net poll while hooks are active (0 = disabled)
+    'new_window_fallback_poll_ms': 30000, # Safety-net EnumWindows diff while hooks are active (0 = disabled)
+    'idle_poll_max_backoff': 4, # Periodic checks that see no change slow down to at most this multiple of their interval
+    'window_snapshot_max_age_ms': 150, # Window enumerations younger than this are shared by all consumers
+    'window_snapshot_max_stale_ms': 5000, # Older snapshots are still served (while a background rescan runs) up to this age
+    'window_metadata_revalidate_ms': 30000, # How often a cached window's process start time is re-checked (PID reuse guard)
+    'win32_call_timeout_ms': 250, # Calls into other processes' windows give up after this long; the window is quarantined
+    'input_coalesce_interval_ms': 16, # Hotkey commands (and coalesced wheel/preset input) are pumped at most once per this interval (~one 60 Hz frame)
+    'startup_pass_slice_ms': 8, # 'Apply on Script Start' works on windows for at most this long at a time...
+    'startup_pass_gap_ms': 16, # ...then leaves the loop free for this long (input, painting) before the next slice
     'center_on_first_launch': True,
     'prevent_window_edges_off_screen': False,
     'focus_mode_active': False,
@@ -128,1322 +276,5224 @@ DEFAULT_SETTINGS = {
     'apply_on_script_start': True,
     'center_electricsheep_special': True,
     'enable_hotkey_passthrough': False, # NEW: Setting for Electricsheep crash protection
+    'hotkey_backend': 'ahk', # 'ahk' (AutoHotkey subprocess) or 'native' (in-process low-level hooks); applied on restart
+    'ahk_executable_path': 'C:\\Program Files\\AutoHotkey\\v2\\AutoHotkey.exe',
 }
 
 SETTINGS_FILE = 'transparency_settings.pkl'
 
-class TransparencyControllerApp:
-    _CUSTOM_KEY_DISPLAY_ORDER = [
-        'None',
-        'Backspace', 'Tab', 'Enter', 'Esc', 'Space', 'Page Up', 'Page Down', 'End', 'Home',
-        'Left', 'Up', 'Right', 'Down', 'Ins', 'Del',
-        '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
-        'Numpad 0', 'Numpad 1', 'Numpad 2', 'Numpad 3', 'Numpad 4', 'Numpad 5', 'Numpad 6', 'Numpad 7', 'Numpad 8', 'Numpad 9',
-        'Num *', 'Num +', 'Num -', 'Num .', 'Num /',
-        'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'F9', 'F10', 'F11', 'F12',
-        'Mouse Left Click', 'Mouse Right Click', 'Mouse Middle Click', 'Mouse XButton1', 'Mouse XButton2', 'Mouse Wheel Up', 'Mouse Wheel Down',
-        '~', '-', '=', '[', ']', ';', "'", ',', '.', '\\', '/'
-    ]
-    
-    _CHROMA_KEY_COLOR_HEX = "#00FF00"
+# --- Window Event Sources ---
 
-    def __init__(self, root):
-        self.root = root
-        
-        # Fix for clicking out of variable boxes
-        self.root.bind_all("<Button-1>", self._on_click_anywhere)
-        
-        self.load_settings()
-        self.apply_theme_settings()
+class WinEventSource:
+    """
+    Delivers window events (event_id, hwnd) to subscribed callbacks.
+    Subclasses decide where the events come from; dispatch always happens on the thread
+    that pumps the source (the Tk thread for the Win32 implementation).
+    """
+    def __init__(self):
+        self._subscribers = {}
+        self._dispatching = False
+        self._pending_events = []
+        self.events_dispatched = 0
+        self.total_dispatch_ms = 0.0
+        self.max_dispatch_ms = 0.0
+
+    def subscribe(self, event_id, callback):
+        """Registers callback(event_id, hwnd) for the given event id. Must be called before start()."""
+        self._subscribers.setdefault(event_id, []).append(callback)
+
+    def start(self):
+        """Starts delivering events. Returns True if the source is live."""
+        return True
 
-        self.root.title("Transparency Controller")
-        self.root.geometry(INITIAL_WINDOW_SIZE)
-        self.root.resizable(True, True)
-        self.root.attributes('-topmost', self.settings['ui_always_on_top'])
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+    def stop(self):
+        """Stops delivering events."""
+        pass
 
-        self.current_transparency_level = self.settings['transparency_levels']['initial']
-        self.script_enabled = self.settings['script_enabled']
-        self.focus_mode_active = self.settings['focus_mode_active']
-        self.last_scroll_time = 0
-        self.last_processed_hwnd = None
-        self.tooltip_timer = None
-        self.hotkey_capture_active = False
-        self.changer_window = None # Ensure changer_window is initialized to None early
-        self.setting_entries = {}
-        self.exclusion_list_entries = {}
+    def _dispatch(self, event_id, hwnd):
+        # A callback may pump messages (and thus trigger another hook callback) while we
+        # are still dispatching; queue those and deliver them once the current one returns.
+        if self._dispatching:
+            self._pending_events.append((event_id, hwnd))
+            return
+        self._dispatching = True
+        try:
+            while True:
+                start = time.perf_counter()
+                for callback in self._subscribers.get(event_id, ()):
+                    try:
+                        callback(event_id, hwnd)
+                    except Exception as e:
+                        print(f"[red] Error handling window event {event_id:#06x} for HWND {hwnd}: {e}")
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.events_dispatched += 1
+                self.total_dispatch_ms += elapsed_ms
+                self.max_dispatch_ms = max(self.max_dispatch_ms, elapsed_ms)
+                if not self._pending_events:
+                    break
+                event_id, hwnd = self._pending_events.pop(0)
+        finally:
+            self._dispatching = False
+
+    def get_stats(self):
+        """Returns dispatch counters for diagnostics."""
+        avg_ms = self.total_dispatch_ms / self.events_dispatched if self.events_dispatched else 0.0
+        return {
+            'events_dispatched': self.events_dispatched,
+            'avg_dispatch_ms': round(avg_ms, 3),
+            'max_dispatch_ms': round(self.max_dispatch_ms, 3),
+        }
 
-        self.mouse_pos_timer = None
+class Win32WinEventSource(WinEventSource):
+    """
+    WinEvent hook based source. Hooks are installed out-of-context on the calling thread,
+    so callbacks arrive through that thread's message loop (Tk's, when started from the GUI).
+    """
+    def __init__(self, skip_own_process_events=()):
+        super().__init__()
+        self._skip_own_process_events = set(skip_own_process_events)
+        self._hooks = []
+        # Keep a reference to the ctypes callback for as long as the hooks live.
+        self._proc = WINEVENTPROC(self._on_win_event)
+
+    def _on_win_event(self, h_hook, event, hwnd, id_object, id_child, event_thread, event_time):
+        if id_object != OBJID_WINDOW or id_child != CHILDID_SELF or not hwnd:
+            return
+        self._dispatch(event, hwnd)
 
-        self.tooltip_following = False
-        self.tooltip_follow_timer = None
+    def start(self):
+        if self._hooks:
+            return True
+        for event_id in self._subscribers:
+            flags = WINEVENT_OUTOFCONTEXT
+            if event_id in self._skip_own_process_events:
+                flags |= WINEVENT_SKIPOWNPROCESS
+            hook = SetWinEventHook(event_id, event_id, None, self._proc, 0, 0, flags)
+            if not hook:
+                self.stop()
+                return False
+            self._hooks.append(hook)
+        return True
 
-        # NEW: Brightness control state
-        self.current_brightness_level = self.settings['brightness_levels']['initial']
-        self.is_brightness_scrolling = False
-        self.last_brightness_scroll_time = 0
-        self.last_brightness_hotkey_press_time = 0 # NEW: For tracking hotkey presses for reset_on_scroll_start
-        self._sbc_available = False # Flag to check if screen_brightness_control is available
+    def stop(self):
+        for hook in self._hooks:
+            UnhookWinEvent(hook)
+        self._hooks = []
 
-        # NEW: Transparency scrolling state
-        self.is_transparency_scrolling = False # NEW
-        self.last_transparency_hotkey_press_time = 0 # NEW
+class SimulatedWinEventSource(WinEventSource):
+    """
+    In-memory event source for exercising the event-driven paths without Windows.
+    Events are delivered synchronously from emit(), so the recorded dispatch time is the
+    full event-to-handled latency.
+    """
+    def __init__(self):
+        super().__init__()
+        self.started = False
 
-        self.last_foreground_hwnd = None
-        self.processed_new_windows = set()
-        self.managed_by_script_hwnds = set()
-        self.minimized_by_script_hwnds = set()
-        self.initial_script_start_hwnds = set()
-        self.window_last_active_time = {}
+    def start(self):
+        self.started = True
+        return True
 
-        self.window_monitor_fg_timer = None
-        self.window_monitor_new_timer = None
-        self.window_monitor_inactivity_timer = None
+    def stop(self):
+        self.started = False
 
-        self.ahk = ahk.AHK(executable_path='C:\\Program Files\\AutoHotkey\\v2\\AutoHotkey.exe')
+    def emit(self, event_id, hwnd):
+        """Delivers a single event to subscribers, as a hook callback would."""
+        if self.started:
+            self._dispatch(event_id, hwnd)
 
-        self._initialize_hotkey_maps()
+class WindowRegistry:
+    """
+    Incrementally tracks visible, titled top-level windows from create/destroy/show/hide/name-change
+    events, so new windows are noticed the moment they appear instead of on the next EnumWindows pass.
+    is_trackable(hwnd) decides whether a window counts; on_window_appeared(hwnd) and
+    on_window_closed(hwnd) are called on transitions.
+    """
+    APPEAR_EVENTS = (EVENT_OBJECT_CREATE, EVENT_OBJECT_SHOW, EVENT_OBJECT_NAMECHANGE)
+    CLOSE_EVENTS = (EVENT_OBJECT_DESTROY, EVENT_OBJECT_HIDE)
+
+    def __init__(self, is_trackable, on_window_appeared, on_window_closed):
+        self.is_trackable = is_trackable
+        self.on_window_appeared = on_window_appeared
+        self.on_window_closed = on_window_closed
+        self.tracked_hwnds = set()
+        self.appeared_count = 0
+        self.closed_count = 0
+
+    def attach(self, event_source):
+        """Subscribes to the window lifecycle events of the given source."""
+        for event_id in self.APPEAR_EVENTS + self.CLOSE_EVENTS:
+            event_source.subscribe(event_id, self._on_event)
+
+    def reset(self, hwnds):
+        """Replaces the tracked set, e.g. with the result of a full enumeration."""
+        self.tracked_hwnds = set(hwnds)
+
+    def _on_event(self, event_id, hwnd):
+        if event_id in self.CLOSE_EVENTS:
+            if hwnd in self.tracked_hwnds:
+                self.tracked_hwnds.discard(hwnd)
+                self.closed_count += 1
+                self.on_window_closed(hwnd)
+        elif hwnd not in self.tracked_hwnds and self.is_trackable(hwnd):
+            self.tracked_hwnds.add(hwnd)
+            self.appeared_count += 1
+            self.on_window_appeared(hwnd)
+
+    def get_stats(self):
+        """Returns registry counters for diagnostics."""
+        return {
+            'tracked': len(self.tracked_hwnds),
+            'appeared': self.appeared_count,
+            'closed': self.closed_count,
+        }
 
-        # --- FIX: Create tooltip window BEFORE populating initial HWNDs ---
-        self.setup_tooltip_window() 
-        # --- END FIX ---
+# --- Window System ---
 
-        self._populate_initial_script_hwnds()
+class WindowSystem:
+    """
+    Everything the controller asks of, or does to, other programs' windows. Win32WindowSystem talks to
+    the live desktop; SimulatedWindowSystem is an in-memory desktop for benchmarks and tests.
+    Rects are (left, top, right, bottom); monitor info is {'Monitor': rect, 'Work': rect}.
+    """
+    name = "none"
 
-        # Check for screen_brightness_control availability on Windows
-        if platform.system() == "Windows":
-            self._sbc_available = importlib.util.find_spec("screen_brightness_control") is not None
-            if not self._sbc_available:
-                self.show_message("Warning: 'screen-brightness-control' library not found. Brightness control will be unavailable. Please install it manually: pip install screen-brightness-control pywin32", "orange")
+    def enum_windows(self):
+        """Returns all top-level HWNDs in Z-order."""
+        raise NotImplementedError
 
-        self.scrollable_frame = customtkinter.CTkScrollableFrame(self.root)
-        self.scrollable_frame.pack(pady=10, padx=10, fill="both", expand=True)
-        self.create_widgets(self.scrollable_frame) # create_widgets will now use the existing tooltip_window
+    def get_foreground_window(self):
+        raise NotImplementedError
 
-        self.ahk.start_hotkeys()
+    def window_from_point(self, point):
+        raise NotImplementedError
 
-        self.register_hotkeys()
-        self.update_status_label()
+    def get_cursor_pos(self):
+        raise NotImplementedError
 
-        if self.settings['show_mouse_position_ui']:
-            self.update_mouse_position_label()
+    def is_window(self, hwnd):
+        raise NotImplementedError
 
-        self._start_window_monitoring()
+    def is_visible(self, hwnd):
+        raise NotImplementedError
 
-        # NEW: Apply settings on script start if enabled
-        if self.settings['apply_on_script_start']:
-            self.show_message("Applying initial settings based on 'Apply on Script Start'.", "blue")
-            # Populate managed_by_script_hwnds with all initial non-excluded windows if manage_all is ON
-            # or if dynamic transparency is enabled and allowed for new windows (which includes initial ones for this purpose)
-            if self.settings['manage_all_windows_dynamically'] or self.settings['dynamic_transparency_enabled']:
-                for hwnd in self.initial_script_start_hwnds:
-                    if not self._is_window_excluded(hwnd):
-                        self.managed_by_script_hwnds.add(hwnd)
+    def is_iconic(self, hwnd):
+        raise NotImplementedError
 
-            # Reapply dynamic transparency to all relevant windows (initial ones)
-            if self.settings['dynamic_transparency_enabled']:
-                self._reapply_dynamic_transparency_on_all_windows(force_all=self.settings['manage_all_windows_dynamically'])
-            
-            # Apply centering to initial windows if enabled
-            if self.settings['center_on_first_launch']:
-                for hwnd in self.initial_script_start_hwnds:
-                    if not self._is_window_excluded(hwnd) and hwnd not in self.managed_by_script_hwnds: # Only center if not already managed/processed
-                        self._center_window(hwnd, show_tooltip=False)
-
-        # Initialize window_last_active_time for all currently open windows
-        current_time_ms = time.time() * 1000
-        for hwnd in self.initial_script_start_hwnds:
-            self.window_last_active_time[hwnd] = current_time_ms
-        # Also for the foreground window
-        fg_hwnd = win32gui.GetForegroundWindow()
-        if fg_hwnd:
-            self.window_last_active_time[fg_hwnd] = current_time_ms
+    def is_hung(self, hwnd):
+        raise NotImplementedError
 
-    def _on_click_anywhere(self, event):
-        """Handles click events globally to clear focus from entry widgets."""
-        # If the clicked widget is NOT an entry, focus the root window (clearing entry focus)
-        if not isinstance(event.widget, (customtkinter.CTkEntry, tk.Entry)):
-            self.root.focus_set()
+    def get_root(self, hwnd):
+        """Returns the top-level ancestor of hwnd (GetAncestor GA_ROOT)."""
+        raise NotImplementedError
 
-    def load_settings(self):
-        """Loads settings from file, or uses defaults if file is not found/corrupt."""
-        try:
-            with open(SETTINGS_FILE, 'rb') as f:
-                self.settings = pickle.load(f)
-            def merge_dicts(source, destination):
-                for key, value in source.items():
-                    if key not in destination:
-                        destination[key] = value
-                    elif isinstance(value, dict) and isinstance(destination[key], dict):
-                        merge_dicts(value, destination[key])
-            merge_dicts(DEFAULT_SETTINGS, self.settings)
+    def get_title(self, hwnd):
+        raise NotImplementedError
 
-            # Remove deprecated settings
-            if 'hotkey_capture_settings' in self.settings:
-                del self.settings['hotkey_capture_settings']
-            if 'ui_topmost_checkbox_x' in self.settings:
-                del self.settings['ui_topmost_checkbox_x']
-            if 'show_mouse_pos_checkbox_x' in self.settings:
-                del self.settings['show_mouse_pos_checkbox_x']
-            if 'new_window_transparency_exclusions' in self.settings:
-                del self.settings['new_window_transparency_exclusions']
-            if 'dynamic_transparency_exclusions' in self.settings:
-                del self.settings['dynamic_transparency_exclusions']
-            if 'manage_existing_windows_dynamically' in self.settings:
-                del self.settings['manage_existing_windows_dynamically']
-            # REMOVED DELETION OF THESE KEYS as they are being restored
-            # if 'inactive_window_auto_update' in self.settings:
-            #     del self.settings['inactive_window_auto_update']
-            if 'brightness_levels' in self.settings and 'scroll_stop_delay_ms' in self.settings['brightness_levels']:
-                del self.settings['brightness_levels']['scroll_stop_delay_ms']
+    def get_title_timeout(self, hwnd, timeout_ms):
+        """Returns the title, or None if the window did not answer within timeout_ms."""
+        raise NotImplementedError
 
-        except (FileNotFoundError, EOFError, pickle.UnpickingError):
-            self.settings = DEFAULT_SETTINGS.copy()
-        self.settings['hotkeys'] = DEFAULT_SETTINGS['hotkeys'].copy() # Reset hotkeys for test
-        self.original_hotkeys = self.settings['hotkeys'].copy()
+    def get_class_name(self, hwnd):
+        raise NotImplementedError
 
-    def save_settings(self):
-        """Saves current settings to file."""
-        with open(SETTINGS_FILE, 'wb') as f:
-            pickle.dump(self.settings, f)
+    def get_pid(self, hwnd):
+        """Returns the owning process ID, or 0 if hwnd is not a window."""
+        raise NotImplementedError
 
-    def apply_theme_settings(self):
-        """Applies CustomTkinter theme and appearance mode based on settings."""
-        customtkinter.set_appearance_mode(self.settings['appearance_mode'])
-        customtkinter.set_default_color_theme(self.settings['theme_color'])
+    def get_process_info(self, pid):
+        """Returns (exe name, process start time); (None, None) if the process cannot be opened."""
+        raise NotImplementedError
 
-    def create_widgets(self, parent_frame):
-        """Creates and places all GUI elements within the given parent frame."""
-        # CHANGED: Removed fill="x" to allow frame to shrink-wrap (centering the block)
-        appearance_frame = customtkinter.CTkFrame(parent_frame)
-        appearance_frame.pack(pady=10, padx=10, anchor="center") 
+    def get_exe_name(self, hwnd):
+        pid = self.get_pid(hwnd)
+        return self.get_process_info(pid)[0] if pid else None
 
-        customtkinter.CTkLabel(appearance_frame, text="Appearance Settings", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+    def get_rect(self, hwnd):
+        raise NotImplementedError
 
-        # --- Theme Color and Appearance Mode on one line ---
-        theme_mode_row_frame = customtkinter.CTkFrame(appearance_frame, fg_color="transparent")
-        theme_mode_row_frame.pack(pady=2, anchor="center")
+    def get_monitor_info(self, hwnd):
+        """Returns the monitor info of the monitor hwnd is on (the primary one if none)."""
+        raise NotImplementedError
 
-        theme_col_frame = customtkinter.CTkFrame(theme_mode_row_frame, fg_color="transparent")
-        theme_col_frame.pack(side="left", padx=10, pady=2, expand=True)
-        customtkinter.CTkLabel(theme_col_frame, text="Theme Color:").pack(pady=(0,2), anchor="center")
-        self.theme_menu_var = customtkinter.StringVar(value=self.settings['theme_color'])
-        self.theme_menu = customtkinter.CTkOptionMenu(theme_col_frame, values=['green', 'blue', 'dark-blue'],
-                                                 variable=self.theme_menu_var,
-                                                 command=self.change_theme_color)
-        self.theme_menu.pack(pady=(2,0), anchor="center")
+    def get_ex_style(self, hwnd):
+        raise NotImplementedError
 
-        appearance_mode_col_frame = customtkinter.CTkFrame(theme_mode_row_frame, fg_color="transparent")
-        appearance_mode_col_frame.pack(side="left", padx=10, pady=2, expand=True)
-        customtkinter.CTkLabel(appearance_mode_col_frame, text="Mode:").pack(pady=(0,2), anchor="center")
-        self.appearance_menu_var = customtkinter.StringVar(value=self.settings['appearance_mode'])
-        self.appearance_menu = customtkinter.CTkOptionMenu(appearance_mode_col_frame, values=['System', 'Dark', 'Light'],
-                                                      variable=self.appearance_menu_var,
-                                                      command=self.change_appearance_mode)
-        self.appearance_menu.pack(pady=(2,0), anchor="center")
-        # --- End Theme Color and Appearance Mode ---
+    def apply_layered_alpha(self, hwnd, ex_style, alpha):
+        """Makes hwnd layered (if ex_style lacks WS_EX_LAYERED; None = already layered) and sets its alpha.
+        Returns (success, FAILURE_* reason or None)."""
+        raise NotImplementedError
 
-        # --- Always On Top and Mouse Position on one line ---
-        checkbox_row_frame = customtkinter.CTkFrame(appearance_frame, fg_color="transparent")
-        checkbox_row_frame.pack(pady=5, anchor="center", fill="x")
+    def show_window_async(self, hwnd, command):
+        raise NotImplementedError
 
-        # Frame for "Always On Top" checkbox
-        ui_topmost_col_frame = customtkinter.CTkFrame(checkbox_row_frame, fg_color="transparent")
-        ui_topmost_col_frame.pack(side="left", padx=10, expand=True, fill="x")
-        self.ui_topmost_checkbox = customtkinter.CTkCheckBox(ui_topmost_col_frame,
-                                                             text="Always On Top",
-                                                             command=self.toggle_ui_topmost)
-        self.ui_topmost_checkbox.pack(anchor="center") # Centered within its column frame
-        if self.settings['ui_always_on_top']:
-            self.ui_topmost_checkbox.select()
-        else:
-            self.ui_topmost_checkbox.deselect()
+    def move_window_async(self, hwnd, x, y, width, height):
+        raise NotImplementedError
 
-        # Frame for "Mouse Position" checkbox
-        show_mouse_pos_col_frame = customtkinter.CTkFrame(checkbox_row_frame, fg_color="transparent")
-        show_mouse_pos_col_frame.pack(side="left", padx=10, expand=True, fill="x")
-        self.show_mouse_pos_checkbox = customtkinter.CTkCheckBox(show_mouse_pos_col_frame,
-                                                                 text="Mouse Position",
-                                                                 command=self.toggle_show_mouse_position_ui)
-        self.show_mouse_pos_checkbox.pack(anchor="center") # Centered within its column frame
-        if self.settings['show_mouse_position_ui']:
-            self.show_mouse_pos_checkbox.select()
-        else:
-            self.show_mouse_pos_checkbox.deselect()
-        # --- End Always On Top and Mouse Position ---
+    def get_stats(self):
+        return {'window_system': self.name}
 
-        self.restart_warning_label = customtkinter.CTkLabel(appearance_frame,
-                                                            text="Warning: Restart needed for full theme changes. Click to restart.",
-                                                            text_color="yellow",
-                                                            cursor="hand2",
-                                                            wraplength=300)
-        self.restart_warning_label.pack(pady=5, anchor="center")
-        self.restart_warning_label.pack_forget()
-        self.restart_warning_label.bind("<Button-1>", lambda event: self.restart_app())
+class Win32WindowSystem(WindowSystem):
+    """The live desktop, through pywin32 and the ctypes user32/kernel32 bindings."""
+    name = "win32"
 
-        # CHANGED: Removed fill="x"
-        hotkey_frame = customtkinter.CTkFrame(parent_frame)
-        hotkey_frame.pack(pady=10, padx=10, anchor="center") 
-        customtkinter.CTkLabel(hotkey_frame, text="Hotkey Configuration", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+    def enum_windows(self):
+        hwnds = []
+        win32gui.EnumWindows(lambda hwnd, extra: hwnds.append(hwnd) or True, None)
+        return hwnds
 
-        self.hotkey_labels = {}
-        for action, hotkey in self.settings['hotkeys'].items():
-            row_frame = customtkinter.CTkFrame(hotkey_frame, fg_color="transparent")
-            # CHANGED: anchor="w" to align rows left within the centered block
-            row_frame.pack(pady=2, anchor="w")
+    def get_foreground_window(self):
+        return win32gui.GetForegroundWindow()
 
-            customtkinter.CTkLabel(row_frame, text=f"{action.replace('_', ' ').title()}:", width=150, anchor="w").pack(side="left", padx=5)
+    def window_from_point(self, point):
+        return win32gui.WindowFromPoint(point)
 
-            display_text = self._get_hotkey_display_text(action, hotkey)
-            self.hotkey_labels[action] = customtkinter.CTkLabel(row_frame, text=display_text, width=120, anchor="w")
-            self.hotkey_labels[action].pack(side="left", padx=5)
+    def get_cursor_pos(self):
+        return win32api.GetCursorPos()
 
-            change_button = customtkinter.CTkButton(row_frame, text="Change", width=60,
-                                                    command=lambda a=action: self.open_manual_hotkey_changer(a))
-            change_button.pack(side="right", padx=5)
+    def is_window(self, hwnd):
+        return bool(win32gui.IsWindow(hwnd))
 
-        # CHANGED: Removed fill="x"
-        transparency_settings_frame = customtkinter.CTkFrame(parent_frame)
-        transparency_settings_frame.pack(pady=10, padx=10, anchor="center")
-        customtkinter.CTkLabel(transparency_settings_frame, text="Transparency Settings", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+    def is_visible(self, hwnd):
+        return bool(win32gui.IsWindowVisible(hwnd))
 
-        self.create_setting_entry(transparency_settings_frame, "Initial Level (%):", 'transparency_levels', 'initial')
-        self.create_setting_entry(transparency_settings_frame, "Min Level (%):", 'transparency_levels', 'min')
-        self.create_setting_entry(transparency_settings_frame, "Max Level (%):", 'transparency_levels', 'max')
-        self.create_setting_entry(transparency_settings_frame, "Slow Scroll Inc:", 'transparency_levels', 'scroll_increment_slow')
-        self.create_setting_entry(transparency_settings_frame, "Fast Scroll Inc:", 'transparency_levels', 'scroll_increment_fast')
-        self.create_setting_entry(transparency_settings_frame, "Fast Scroll Threshold (ms):", 'transparency_levels', 'fast_scroll_threshold_ms')
-        self.create_setting_entry(transparency_settings_frame, "XButton2 Preset (%):", 'transparency_levels', 'preset_xbutton2')
-        self.create_setting_entry(transparency_settings_frame, "Ctrl+Shift+XButton2 Preset (%):", 'transparency_levels', 'preset_xbutton2_shift')
-        self.create_setting_entry(transparency_settings_frame, "XButton1 Preset (%):", 'transparency_levels', 'preset_xbutton1')
-        
-        # NEW: Reset Transparency on Scroll Start checkbox
-        self.transparency_reset_on_scroll_checkbox = customtkinter.CTkCheckBox(transparency_settings_frame,
-                                                                          text="Reset Transparency on Scroll Start",
-                                                                          command=lambda: self._update_setting_from_checkbox('reset_on_scroll_start', self.transparency_reset_on_scroll_checkbox, category='transparency_levels'))
-        self.transparency_reset_on_scroll_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['transparency_levels']['reset_on_scroll_start']:
-            self.transparency_reset_on_scroll_checkbox.select()
-        else:
-            self.transparency_reset_on_scroll_checkbox.deselect()
+    def is_iconic(self, hwnd):
+        return bool(win32gui.IsIconic(hwnd))
 
-        # CHANGED: Removed fill="x"
-        tooltip_settings_frame = customtkinter.CTkFrame(parent_frame)
-        tooltip_settings_frame.pack(pady=10, padx=10, anchor="center")
-        customtkinter.CTkLabel(tooltip_settings_frame, text="Tooltip Settings", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
-        self.create_setting_entry(tooltip_settings_frame, "Tooltip X Offset:", 'tooltip_x_position', None, is_top_level=True)
-        self.create_setting_entry(tooltip_settings_frame, "Tooltip Y Offset:", 'tooltip_y_position', None, is_top_level=True)
-        self.create_setting_entry(tooltip_settings_frame, "Tooltip Alpha (0.0-1.0):", 'tooltip_alpha', None, is_top_level=True, value_type=float, increment=0.01)
+    def is_hung(self, hwnd):
+        return bool(IsHungAppWindow(hwnd))
 
-        # CHANGED: Removed fill="x"
-        brightness_settings_frame = customtkinter.CTkFrame(parent_frame)
-        brightness_settings_frame.pack(pady=10, padx=10, anchor="center")
-        customtkinter.CTkLabel(brightness_settings_frame, text="Brightness Settings", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+    def get_root(self, hwnd):
+        return win32gui.GetAncestor(hwnd, GA_ROOT)
 
-        self.create_setting_entry(brightness_settings_frame, "Initial Level (%):", 'brightness_levels', 'initial')
-        self.create_setting_entry(brightness_settings_frame, "Min Level (%):", 'brightness_levels', 'min')
-        self.create_setting_entry(brightness_settings_frame, "Max Level (%):", 'brightness_levels', 'max')
-        self.create_setting_entry(brightness_settings_frame, "Slow Scroll Inc:", 'brightness_levels', 'scroll_increment_slow')
-        self.create_setting_entry(brightness_settings_frame, "Fast Scroll Inc:", 'brightness_levels', 'scroll_increment_fast')
-        self.create_setting_entry(brightness_settings_frame, "Fast Scroll Threshold (ms):", 'brightness_levels', 'fast_scroll_threshold_ms')
-        self.create_setting_entry(brightness_settings_frame, "XButton2 Preset (%):", 'brightness_levels', 'preset_xbutton2')
-        self.create_setting_entry(brightness_settings_frame, "XButton1 Preset (%):", 'brightness_levels', 'preset_xbutton1')
+    def get_title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
 
-        self.brightness_reset_on_scroll_checkbox = customtkinter.CTkCheckBox(brightness_settings_frame,
-                                                                          text="Reset Brightness on Scroll Start",
-                                                                          command=lambda: self._update_setting_from_checkbox('reset_on_scroll_start', self.brightness_reset_on_scroll_checkbox, category='brightness_levels'))
-        self.brightness_reset_on_scroll_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['brightness_levels']['reset_on_scroll_start']:
-            self.brightness_reset_on_scroll_checkbox.select()
-        else:
-            self.brightness_reset_on_scroll_checkbox.deselect()
+    def get_title_timeout(self, hwnd, timeout_ms):
+        buffer = ctypes.create_unicode_buffer(512)
+        result = ctypes.c_size_t()
+        if not SendMessageTimeoutW(hwnd, WM_GETTEXT, len(buffer), buffer, SMTO_ABORTIFHUNG,
+                                   timeout_ms, ctypes.byref(result)):
+            return None
+        return buffer.value
 
-        # CHANGED: Removed fill="x"
-        advanced_transparency_frame = customtkinter.CTkFrame(parent_frame)
-        advanced_transparency_frame.pack(pady=10, padx=10, anchor="center")
-        customtkinter.CTkLabel(advanced_transparency_frame, text="Advanced Window Management", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+    def get_class_name(self, hwnd):
+        return get_window_class_name(hwnd)
 
-        self.new_window_transparency_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                          text="Apply transparency to new windows (once)",
-                                                                          command=self.toggle_apply_transparency_to_new_windows)
-        self.new_window_transparency_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['apply_transparency_to_new_windows']:
-            self.new_window_transparency_checkbox.select()
-        else:
-            self.new_window_transparency_checkbox.deselect()
-
-        self.create_setting_entry(advanced_transparency_frame, "New Window Level (%):", 'new_window_transparency_level', None, is_top_level=True)
+    def get_pid(self, hwnd):
+        return get_window_pid(hwnd)
 
-        self.dynamic_transparency_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                       text="Dynamic Transparency Active/Inactive Manual Update",
-                                                                       command=self.toggle_dynamic_transparency)
-        self.dynamic_transparency_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['dynamic_transparency_enabled']:
-            self.dynamic_transparency_checkbox.select()
-        else:
-            self.dynamic_transparency_checkbox.deselect()
+    def get_process_info(self, pid):
+        return get_process_exe_and_start_time(pid)
 
-        # New: Controls for granular behavior when "Manage ALL Windows" is OFF
+    def get_rect(self, hwnd):
+        return win32gui.GetWindowRect(hwnd)
 
-        self.inactive_window_auto_update_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                                                  text="Inactive Window Auto Update",
-                                                                                                  command=lambda: self._update_setting_from_checkbox('inactive_window_auto_update', self.inactive_window_auto_update_checkbox))
-        self.inactive_window_auto_update_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['inactive_window_auto_update']:
-            self.inactive_window_auto_update_checkbox.select()
-        else:
-            self.inactive_window_auto_update_checkbox.deselect()
+    def get_monitor_info(self, hwnd):
+        return win32api.GetMonitorInfo(win32api.MonitorFromWindow(hwnd, MONITOR_DEFAULTTOPRIMARY))
 
-        self.create_setting_entry(advanced_transparency_frame, "Active Window Level (%):", 'active_window_transparency', None, is_top_level=True)
-        self.create_setting_entry(advanced_transparency_frame, "Inactive Window Level (%):", 'inactive_window_transparency', None, is_top_level=True)
+    def get_ex_style(self, hwnd):
+        return GetWindowLongPtrW(hwnd, GWL_EXSTYLE)
 
-        # NEW: Manage ALL Windows Switch
-        self.manage_all_windows_dynamically_switch = customtkinter.CTkSwitch(advanced_transparency_frame,
-                                                                          text="Manage ALL Windows (Existing & New)",
-                                                                          command=self.toggle_manage_all_windows_dynamically,
-                                                                          onvalue=True, offvalue=False)
-        self.manage_all_windows_dynamically_switch.pack(pady=5, anchor="w", padx=10)
-        if self.settings['manage_all_windows_dynamically']:
-            self.manage_all_windows_dynamically_switch.select()
-        else:
-            self.manage_all_windows_dynamically_switch.deselect()
+    def apply_layered_alpha(self, hwnd, ex_style, alpha):
+        return apply_layered_alpha(hwnd, ex_style, alpha)
 
-        # New: Center on First Launch Checkbox
-        self.center_on_first_launch_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                         text="Center new windows (once)", # Changed text
-                                                                         command=self.toggle_center_on_first_launch)
-        self.center_on_first_launch_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['center_on_first_launch']:
-            self.center_on_first_launch_checkbox.select()
-        else:
-            self.center_on_first_launch_checkbox.deselect()
+    def show_window_async(self, hwnd, command):
+        return bool(ShowWindowAsync(hwnd, command))
 
-        # New: Prevent Window Edges Off Screen Checkbox
-        self.prevent_edges_off_screen_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                           text="Prevent centered window edges off screen",
-                                                                           command=self.toggle_prevent_window_edges_off_screen)
-        self.prevent_edges_off_screen_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['prevent_window_edges_off_screen']:
-            self.prevent_edges_off_screen_checkbox.select()
-        else:
-            self.prevent_edges_off_screen_checkbox.deselect()
+    def move_window_async(self, hwnd, x, y, width, height):
+        return bool(SetWindowPos(hwnd, None, x, y, width, height, SWP_NOZORDER | SWP_NOACTIVATE | SWP_ASYNCWINDOWPOS))
 
-        # NEW: Electricsheep Special Centering Checkbox
-        self.center_electricsheep_special_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                               text="Center Electricsheep (es.exe) with title bar hidden",
-                                                                               command=self.toggle_center_electricsheep_special)
-        self.center_electricsheep_special_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['center_electricsheep_special']:
-            self.center_electricsheep_special_checkbox.select()
-        else:
-            self.center_electricsheep_special_checkbox.deselect()
+class SimulatedWindow:
+    """One window of a SimulatedWindowSystem desktop."""
+    def __init__(self, hwnd, title, class_name, exe_name, pid, rect, visible=True, iconic=False):
+        self.hwnd = hwnd
+        self.title = title
+        self.class_name = class_name
+        self.exe_name = exe_name
+        self.pid = pid
+        self.rect = rect
+        self.visible = visible
+        self.iconic = iconic
+        self.ex_style = 0
+        self.alpha = None
+        self.hung = False
+        self.failure = None # FAILURE_* reason returned for every transparency change, if set
 
-        # NEW: Electricsheep Crash Protection Checkbox
-        self.enable_hotkey_passthrough_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                                 text="""Enable Hotkey Passthrough Non-Suppressing Exception
-Fixes Electricsheep Hotkey Compatibility """,
-                                                                                 command=self.toggle_enable_hotkey_passthrough)
-        self.enable_hotkey_passthrough_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['enable_hotkey_passthrough']:
-            self.enable_hotkey_passthrough_checkbox.select()
-        else:
-            self.enable_hotkey_passthrough_checkbox.deselect()
+class SimulatedWindowSystem(WindowSystem):
+    """
+    Deterministic in-memory desktop. Every call is counted per method; latency_ms (or a per-method
+    entry in method_latency_ms) is spent in time.sleep, which releases the GIL like a real Win32 call.
+    Hung windows make the *_timeout calls report a timeout and block the plain ones for hang_ms.
+    """
+    name = "simulated"
+    MONITOR = (0, 0, 1920, 1080)
+    WORK_AREA = (0, 0, 1920, 1040)
+
+    def __init__(self, latency_ms=0.0, method_latency_ms=None, hang_ms=2000):
+        self.latency_ms = latency_ms
+        self.method_latency_ms = method_latency_ms or {}
+        self.hang_ms = hang_ms
+        self.windows = {} # hwnd -> SimulatedWindow, in Z-order (first = top)
+        self.foreground_hwnd = 0
+        self.cursor_pos = (960, 540)
+        self.calls = collections.Counter()
+        self._next_hwnd = 0x10010
+
+    @classmethod
+    def synthetic(cls, window_count, seed=0, invisible_ratio=0.75, **kwargs):
+        """A desktop of window_count top-level windows, most of them invisible as on a real session."""
+        desktop = cls(**kwargs)
+        rng = random.Random(seed)
+        exe_names = ['explorer', 'chrome', 'code', 'notepad', 'outlook', 'slack', 'steam', 'spotify']
+        for index in range(window_count):
+            exe_name = rng.choice(exe_names)
+            left, top = rng.randrange(0, 1400), rng.randrange(0, 700)
+            visible = rng.random() >= invisible_ratio
+            desktop.add_window(f"{exe_name} {index}" if visible else "", f"{exe_name.title()}Window", exe_name,
+                               pid=1000 + exe_names.index(exe_name),
+                               rect=(left, top, left + rng.randrange(300, 900), top + rng.randrange(200, 700)),
+                               visible=visible)
+        visible_hwnds = [hwnd for hwnd, window in desktop.windows.items() if window.visible]
+        if visible_hwnds:
+            desktop.foreground_hwnd = visible_hwnds[0]
+        return desktop
+
+    def add_window(self, title, class_name="SimulatedWindow", exe_name="simulated", pid=1000,
+                   rect=(100, 100, 900, 700), visible=True, iconic=False):
+        """Opens a window on top of the Z-order and returns its HWND."""
+        hwnd = self._next_hwnd
+        self._next_hwnd += 0x10
+        window = SimulatedWindow(hwnd, title, class_name, exe_name, pid, rect, visible, iconic)
+        self.windows = {hwnd: window, **self.windows}
+        return hwnd
+
+    def close_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+        if self.foreground_hwnd == hwnd:
+            self.foreground_hwnd = next(iter(self.windows), 0)
+
+    def set_foreground(self, hwnd):
+        """Activates hwnd (restoring it and moving it to the top of the Z-order)."""
+        window = self.windows[hwnd]
+        window.iconic = False
+        self.windows = {hwnd: window, **{h: w for h, w in self.windows.items() if h != hwnd}}
+        self.foreground_hwnd = hwnd
+
+    def _call(self, method, hwnd=None):
+        self.calls[method] += 1
+        latency_ms = self.method_latency_ms.get(method, self.latency_ms)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        return self.windows.get(hwnd)
+
+    def enum_windows(self):
+        self._call('enum_windows')
+        return list(self.windows)
+
+    def get_foreground_window(self):
+        self._call('get_foreground_window')
+        return self.foreground_hwnd
+
+    def window_from_point(self, point):
+        self._call('window_from_point')
+        x, y = point
+        for hwnd, window in self.windows.items():
+            left, top, right, bottom = window.rect
+            if window.visible and not window.iconic and left <= x < right and top <= y < bottom:
+                return hwnd
+        return 0
+
+    def get_cursor_pos(self):
+        self._call('get_cursor_pos')
+        return self.cursor_pos
+
+    def is_window(self, hwnd):
+        return self._call('is_window', hwnd) is not None
+
+    def is_visible(self, hwnd):
+        window = self._call('is_visible', hwnd)
+        return bool(window and window.visible)
+
+    def is_iconic(self, hwnd):
+        window = self._call('is_iconic', hwnd)
+        return bool(window and window.iconic)
+
+    def is_hung(self, hwnd):
+        window = self._call('is_hung', hwnd)
+        return bool(window and window.hung)
+
+    def get_root(self, hwnd):
+        self._call('get_root', hwnd)
+        return hwnd
+
+    def _block_if_hung(self, window):
+        if window is not None and window.hung:
+            time.sleep(self.hang_ms / 1000)
+
+    def get_title(self, hwnd):
+        window = self._call('get_title', hwnd)
+        self._block_if_hung(window)
+        return window.title if window else ""
+
+    def get_title_timeout(self, hwnd, timeout_ms):
+        window = self._call('get_title_timeout', hwnd)
+        if window is None or window.hung:
+            return None
+        return window.title
+
+    def get_class_name(self, hwnd):
+        window = self._call('get_class_name', hwnd)
+        return window.class_name if window else None
+
+    def get_pid(self, hwnd):
+        window = self._call('get_pid', hwnd)
+        return window.pid if window else 0
+
+    def get_process_info(self, pid):
+        self._call('get_process_info')
+        for window in self.windows.values():
+            if window.pid == pid:
+                return window.exe_name, pid
+        return None, None
+
+    def get_rect(self, hwnd):
+        window = self._call('get_rect', hwnd)
+        return window.rect if window else (0, 0, 0, 0)
+
+    def get_monitor_info(self, hwnd):
+        self._call('get_monitor_info', hwnd)
+        return {'Monitor': self.MONITOR, 'Work': self.WORK_AREA}
+
+    def get_ex_style(self, hwnd):
+        window = self._call('get_ex_style', hwnd)
+        return window.ex_style if window else 0
+
+    def apply_layered_alpha(self, hwnd, ex_style, alpha):
+        window = self._call('apply_layered_alpha', hwnd)
+        if window is None:
+            return False, FAILURE_INVALID
+        self._block_if_hung(window)
+        if window.failure:
+            return False, window.failure
+        window.ex_style |= WS_EX_LAYERED
+        window.alpha = alpha
+        return True, None
+
+    def show_window_async(self, hwnd, command):
+        window = self._call('show_window_async', hwnd)
+        if window is None:
+            return False
+        if command == SW_MINIMIZE:
+            window.iconic = True
+        elif command == SW_RESTORE:
+            window.iconic = False
+        return True
 
-        # NEW: Minimize Inactive Windows Checkbox
-        self.minimize_inactive_windows_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                          text="Minimize inactive windows",
-                                                                          command=self.toggle_minimize_inactive_windows)
-        self.minimize_inactive_windows_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['minimize_inactive_windows']:
-            self.minimize_inactive_windows_checkbox.select()
-        else:
-            self.minimize_inactive_windows_checkbox.deselect()
+    def move_window_async(self, hwnd, x, y, width, height):
+        window = self._call('move_window_async', hwnd)
+        if window is None:
+            return False
+        window.rect = (x, y, x + width, y + height)
+        return True
 
-        # NEW: Minimize Inactive Windows settings entries
-        self.create_setting_entry(advanced_transparency_frame, "Minimize after inactive for (ms):", 'minimize_inactive_delay_ms', None, is_top_level=True)
-        self.create_setting_entry(advanced_transparency_frame, "Ignore X oldest inactive windows:", 'minimize_inactive_ignore_count', None, is_top_level=True)
+    def get_stats(self):
+        return {
+            'window_system': self.name,
+            'windows': len(self.windows),
+            'calls': sum(self.calls.values()),
+            'calls_by_method': dict(self.calls),
+        }
 
-        # NEW: Apply on Script Start checkbox
-        self.apply_on_script_start_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
-                                                                        text="Apply settings on script start",
-                                                                        command=lambda: self._update_setting_from_checkbox('apply_on_script_start', self.apply_on_script_start_checkbox))
-        self.apply_on_script_start_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['apply_on_script_start']:
-            self.apply_on_script_start_checkbox.select()
-        else:
-            self.apply_on_script_start_checkbox.deselect()
+# --- Shared Window Snapshot ---
 
+WindowInfo = collections.namedtuple('WindowInfo', ['hwnd', 'visible', 'title', 'iconic', 'class_name',
+                                                   'exe_name', 'rect', 'pid', 'process_start'],
+                                    defaults=(None, None, None, None))
 
-        # New: Focus Mode Settings Frame
-        # CHANGED: Removed fill="x"
-        focus_mode_frame = customtkinter.CTkFrame(parent_frame)
-        focus_mode_frame.pack(pady=10, padx=10, anchor="center")
-        customtkinter.CTkLabel(focus_mode_frame, text="Focus Mode Settings", font=customtkinter.CTkFont(weight="bold")).pack(pady=5, anchor="center")
+class WindowSnapshot:
+    """Immutable result of one EnumWindows pass, keyed by HWND in Z-order."""
+    def __init__(self, windows, taken_at):
+        self.windows = windows
+        self.taken_at = taken_at
 
-        self.focus_mode_checkbox = customtkinter.CTkCheckBox(focus_mode_frame,
-                                                             text="Enable Focus Mode",
-                                                             command=self.toggle_focus_mode_ui)
-        self.focus_mode_checkbox.pack(pady=5, anchor="w", padx=10)
-        if self.settings['focus_mode_active']:
-            self.focus_mode_checkbox.select()
-        else:
-            self.focus_mode_checkbox.deselect()
+    def get(self, hwnd):
+        """Returns the WindowInfo for hwnd, or None if it was not enumerated."""
+        return self.windows.get(hwnd)
 
-        self.create_setting_entry(focus_mode_frame, "Focus Tooltip X Offset:", 'focus_tooltip_x_position', None, is_top_level=True)
-        self.create_setting_entry(focus_mode_frame, "Focus Tooltip Y Offset:", 'focus_tooltip_y_position', None, is_top_level=True)
-        self.create_setting_entry(focus_mode_frame, "Alt+Tab Delay (ms):", 'focus_mode_alt_tab_delay_ms', None, is_top_level=True)
+    def visible_titled_hwnds(self):
+        """Returns the visible windows with a non-empty title, in Z-order."""
+        return [hwnd for hwnd, info in self.windows.items() if info.visible and info.title]
 
-        self.create_exclusion_list_entry(advanced_transparency_frame, "Global Exclusions (exe/class,exe/class):", 'global_transparency_exclusions')
+    def __len__(self):
+        return len(self.windows)
 
-        # CHANGED: Removed fill="x"
-        control_frame = customtkinter.CTkFrame(parent_frame)
-        control_frame.pack(pady=10, padx=10, anchor="center")
-        self.status_label = customtkinter.CTkLabel(control_frame, text="Status: Initializing...")
-        self.status_label.pack(pady=5, anchor="center")
+class WindowScanner:
+    """
+    Builds WindowSnapshots from a WindowSystem's enumeration. Title, iconic state, class, exe and rect are only read for
+    visible titled windows; class names never change and exe names only change with the owning PID,
+    so both are carried over between scans. With a SafeWin32, titles are read with a timeout and a hung
+    window keeps the title it had in the previous scan. Safe to call from any thread.
+    """
+    def __init__(self, window_system=None, safe_win32=None):
+        self.window_system = window_system or Win32WindowSystem()
+        self.safe_win32 = safe_win32
+        self._lock = threading.Lock()
+        self._titles = {}
+        self._class_names = {}
+        self._processes = {} # hwnd -> (pid, exe name, process start time)
+        self.scans = 0
+        self.win32_calls = 0
+        self.last_scan_ms = 0.0
+
+    def scan(self):
+        with self._lock:
+            start = time.perf_counter()
+            window_system = self.window_system
+            hwnds = window_system.enum_windows()
+            calls = 1
+            windows = {}
+            titles = {}
+            class_names = {}
+            processes = {}
+            for hwnd in hwnds:
+                calls += 1
+                if not window_system.is_visible(hwnd):
+                    windows[hwnd] = WindowInfo(hwnd, False, "", False, None)
+                    continue
+                calls += 1
+                title = self.get_window_text(hwnd, self._titles.get(hwnd, ""))
+                titles[hwnd] = title
+                iconic = False
+                class_name = None
+                rect = None
+                pid = exe_name = process_start = None
+                if title:
+                    calls += 3
+                    iconic = window_system.is_iconic(hwnd)
+                    rect = window_system.get_rect(hwnd)
+                    class_name = self._class_names.get(hwnd)
+                    if class_name is None:
+                        calls += 1
+                        class_name = window_system.get_class_name(hwnd)
+                    class_names[hwnd] = class_name
+                    pid = window_system.get_pid(hwnd)
+                    cached = self._processes.get(hwnd)
+                    if cached is not None and cached[0] == pid:
+                        exe_name, process_start = cached[1], cached[2]
+                    elif pid:
+                        calls += 1
+                        exe_name, process_start = window_system.get_process_info(pid)
+                    processes[hwnd] = (pid, exe_name, process_start)
+                windows[hwnd] = WindowInfo(hwnd, True, title, iconic, class_name, exe_name, rect, pid, process_start)
+            self._titles = titles
+            self._class_names = class_names
+            self._processes = processes
+            self.scans += 1
+            self.win32_calls += calls
+            self.last_scan_ms = (time.perf_counter() - start) * 1000
+            return WindowSnapshot(windows, time.monotonic())
+
+    def get_window_text(self, hwnd, default=""):
+        """Reads a window title, through the SafeWin32 timeout if there is one."""
+        if self.safe_win32 is not None:
+            return self.safe_win32.get_window_text(hwnd, default)
+        return self.window_system.get_title(hwnd)
+
+    def forget(self, hwnd):
+        """Drops cached names for a destroyed window."""
+        with self._lock:
+            self._titles.pop(hwnd, None)
+            self._class_names.pop(hwnd, None)
+            self._processes.pop(hwnd, None)
+
+class WindowScanWorker:
+    """
+    Runs scanner.scan() on a dedicated thread and passes each immutable snapshot to on_snapshot (on the
+    worker thread; the app forwards it to the Tk thread through the command queue). Requests made while
+    a scan is running are coalesced into one follow-up scan, started no sooner than min_interval_ms
+    after the previous one.
+    """
+    def __init__(self, scanner, on_snapshot, min_interval_ms=150):
+        self.scanner = scanner
+        self._on_snapshot = on_snapshot
+        self.min_interval_ms = min_interval_ms
+        self._condition = threading.Condition()
+        self._requested = False
+        self._stopped = False
+        self._last_scan_at = 0.0
+        self.requests = 0
+        self.coalesced = 0
+        self.scans = 0
+        self.errors = 0
+        self._scan_total_ms = 0.0
+        self.max_scan_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="WindowScanWorker", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Asks for a fresh snapshot; returns immediately."""
+        with self._condition:
+            self.requests += 1
+            if self._requested:
+                self.coalesced += 1
+            self._requested = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._requested and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                # Requests arriving while we hold off coalesce into this scan
+                wait_s = self._last_scan_at + self.min_interval_ms / 1000 - time.monotonic()
+                while wait_s > 0 and not self._stopped:
+                    self._condition.wait(wait_s)
+                    wait_s = self._last_scan_at + self.min_interval_ms / 1000 - time.monotonic()
+                if self._stopped:
+                    return
+                self._requested = False
+            start = time.perf_counter()
+            try:
+                snapshot = self.scanner.scan()
+            except Exception as e:
+                self.errors += 1
+                print(f"Window scan failed: {e}")
+                snapshot = None
+            self._last_scan_at = time.monotonic()
+            scan_ms = (time.perf_counter() - start) * 1000
+            self.scans += 1
+            self._scan_total_ms += scan_ms
+            self.max_scan_ms = max(self.max_scan_ms, scan_ms)
+            if snapshot is not None:
+                self._on_snapshot(snapshot)
+
+    def stop(self):
+        """Stops the worker; a scan in progress is allowed to finish."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def get_stats(self):
+        """Returns scan counters for diagnostics."""
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'scans': self.scans,
+            'errors': self.errors,
+            'avg_scan_ms': round(self._scan_total_ms / self.scans, 3) if self.scans else None,
+            'max_scan_ms': round(self.max_scan_ms, 3),
+        }
 
-        self.toggle_button = customtkinter.CTkButton(control_frame, text="Toggle Script (Alt+W)", command=self.toggle_script_ui)
-        self.toggle_button.pack(pady=5, anchor="center")
+class WindowSnapshotService:
+    """
+    Shares one window enumeration per scheduling tick between every monitor and bulk operation.
+    With a WindowScanWorker attached, snapshots are taken off the Tk thread and published here;
+    a snapshot that is stale (too old or invalidated) but younger than max_stale_ms is served while
+    a background rescan runs. Without a worker, or with nothing usable, get() scans synchronously.
+    Bulk actions (minimize others, inactivity minimizing) pass fresh=True and never see a stale snapshot.
+    """
+    def __init__(self, max_age_ms=150, scanner=None, max_stale_ms=5000):
+        self.max_age_ms = max_age_ms
+        self.max_stale_ms = max_stale_ms
+        self.scanner = scanner or WindowScanner()
+        self._worker = None
+        self._snapshot = None
+        self._stale = False
+        self.sync_scans = 0
+        self.published = 0
+        self.stale_served = 0
+        self.snapshot_requests = 0
+        self.live_queries = 0
+
+    def attach_worker(self, worker):
+        """Routes refreshes through a WindowScanWorker whose snapshots are passed to publish()."""
+        self._worker = worker
+
+    def _age_ms(self):
+        return (time.monotonic() - self._snapshot.taken_at) * 1000
+
+    def _is_fresh(self):
+        return self._snapshot is not None and not self._stale and self._age_ms() < self.max_age_ms
+
+    def get(self, fresh=False):
+        """
+        Returns the current snapshot, refreshing it in the background (or synchronously) if needed.
+        With fresh=True a stale snapshot is never served: anything but a fresh one means a synchronous scan.
+        """
+        self.snapshot_requests += 1
+        if self._is_fresh():
+            return self._snapshot
+        if not fresh and self._worker is not None and self._snapshot is not None and self._age_ms() < self.max_stale_ms:
+            self.stale_served += 1
+            self._worker.request()
+            return self._snapshot
+        self.sync_scans += 1
+        self._snapshot = self.scanner.scan()
+        self._stale = False
+        return self._snapshot
+
+    def publish(self, snapshot):
+        """Accepts a snapshot from the scan worker (Tk thread). Older snapshots than the current one are ignored."""
+        if self._snapshot is not None and snapshot.taken_at < self._snapshot.taken_at:
+            return False
+        self.published += 1
+        self._snapshot = snapshot
+        self._stale = False
+        return True
 
-        # NEW: Restore All Managed Windows to 100% button
-        restore_button = customtkinter.CTkButton(control_frame, text="Restore All Managed Windows to 100%", command=self.restore_all_managed_to_full_opacity)
-        restore_button.pack(pady=5, anchor="center")
+    def request_refresh(self):
+        """Asks the worker (if any) for a new snapshot without waiting for it."""
+        if self._worker is not None:
+            self._worker.request()
 
-        reset_button = customtkinter.CTkButton(control_frame, text="Reset to Defaults", command=self.reset_to_defaults)
-        reset_button.pack(pady=5, anchor="center")
+    def peek(self):
+        """Returns the current snapshot if it is still fresh, without ever enumerating."""
+        return self._snapshot if self._is_fresh() else None
 
-        self.mouse_pos_label = customtkinter.CTkLabel(self.root, text="")
-        self.mouse_pos_label.pack(side="bottom", anchor="s", padx=10, pady=5)
+    def invalidate(self):
+        """Marks the snapshot stale (after window state changed) and starts a background rescan if possible."""
+        self._stale = True
+        if self._worker is None:
+            self._snapshot = None
+        self.request_refresh()
 
-    def create_setting_entry(self, parent_frame, label_text, category, key, is_top_level=False, value_type=int, increment=1):
-        """Helper to create a label, entry, and apply button for a setting, with scroll/arrow key support."""
-        frame = customtkinter.CTkFrame(parent_frame, fg_color="transparent")
-        # CHANGED: anchor="w" to align rows left within the centered block
-        frame.pack(pady=2, anchor="w")
+    def forget(self, hwnd):
+        """Drops cached data for a destroyed window."""
+        self.scanner.forget(hwnd)
+        self.invalidate()
 
-        customtkinter.CTkLabel(frame, text=label_text, width=200, anchor="w").pack(side="left")
+    def _served(self):
+        """
+        The snapshot get() would serve now, without counting a request or asking the worker again. None while
+        the worker's first snapshot is still on its way, rather than enumerating everything here.
+        """
+        if self._is_fresh() or (self._worker is not None and self._snapshot is not None and self._age_ms() < self.max_stale_ms):
+            return self._snapshot
+        if self._worker is not None and self._snapshot is None:
+            return None
+        return self.get()
 
-        if is_top_level:
-            initial_value = self.settings[category]
-        else:
-            initial_value = self.settings[category][key]
+    def is_visible_titled(self, hwnd):
+        """
+        Equivalent of IsWindow and IsWindowVisible and GetWindowText, answered from the snapshot get() serves
+        (stale or not, like every other per-tick consumer).
+        """
+        snapshot = self._served()
+        info = snapshot.get(hwnd) if snapshot is not None else None
+        if info is not None:
+            return info.visible and bool(info.title)
+        # Not in the snapshot (e.g. the window was created since): ask the window system directly.
+        self.live_queries += 1
+        window_system = self.scanner.window_system
+        return bool(window_system.is_window(hwnd) and window_system.is_visible(hwnd) and self.scanner.get_window_text(hwnd))
+
+    def get_stats(self):
+        """Returns enumeration counters for diagnostics."""
+        return {
+            'enumerations': self.scanner.scans,
+            'sync_scans': self.sync_scans,
+            'published': self.published,
+            'stale_served': self.stale_served,
+            'snapshot_requests': self.snapshot_requests,
+            'shared_hits': self.snapshot_requests - self.sync_scans - self.stale_served,
+            'live_queries': self.live_queries,
+            'win32_calls': self.scanner.win32_calls,
+            'last_scan_ms': round(self.scanner.last_scan_ms, 3),
+            'windows': len(self._snapshot) if self._snapshot else 0,
+        }
 
-        entry = customtkinter.CTkEntry(frame, width=80)
-        if value_type == float:
-            entry.insert(0, f"{initial_value:.2f}")
-        else:
-            entry.insert(0, str(initial_value))
-        entry.pack(side="left", padx=5)
+# --- Hung-Window-Safe Win32 Calls ---
 
-        if is_top_level:
-            self.setting_entries[(category,)] = (entry, value_type, increment)
-        else:
-            self.setting_entries[(category, key)] = (entry, value_type, increment)
+class SafeWin32:
+    """
+    Cross-process window calls that cannot stall the caller on a hung window. Titles are read with
+    SendMessageTimeoutW(WM_GETTEXT, SMTO_ABORTIFHUNG); show and move use ShowWindowAsync and
+    SetWindowPos(SWP_ASYNCWINDOWPOS); calls with no async variant (style and layered attribute changes)
+    run on a small bounded pool and are abandoned after timeout_ms. A window that times out or is
+    reported hung is quarantined, and calls for it are skipped until its quarantine (doubling with every
+    strike, up to quarantine_max_ms) expires; a successful call lifts it. Safe to use from any thread.
+
+    A pool worker stuck in an abandoned call no longer counts against pool_size: the pool is replaced
+    by a fresh one, up to max_abandoned stuck workers at a time. Past that the pool can run out; calls
+    are then refused, the windows holding its workers are struck again, and the state is logged and
+    shown as 'exhausted' in the stats until a stuck call returns.
+    """
+    def __init__(self, timeout_ms=250, pool_size=2, quarantine_base_ms=2000, quarantine_max_ms=60000, clock=time.monotonic,
+                 window_system=None, max_abandoned=8):
+        self.window_system = window_system or Win32WindowSystem()
+        self.timeout_ms = timeout_ms
+        self.pool_size = pool_size
+        self.quarantine_base_ms = quarantine_base_ms
+        self.quarantine_max_ms = quarantine_max_ms
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.max_abandoned = max_abandoned
+        self._pool = self._new_pool()
+        self._in_flight = {} # future -> (hwnd, started at), calls holding a pool slot
+        self._abandoned = set() # futures of timed-out calls whose worker is still stuck
+        self._exhausted = False
+        self._quarantine = {} # hwnd -> (quarantined until, strikes)
+        self.calls = 0
+        self.timeouts = 0
+        self.hung_skips = 0
+        self.quarantine_skips = 0
+        self.pool_exhausted = 0
+        self.workers_replaced = 0
+        self.quarantined_total = 0
+
+    def _new_pool(self):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="SafeWin32")
+
+    def is_quarantined(self, hwnd):
+        with self._lock:
+            entry = self._quarantine.get(hwnd)
+            return entry is not None and entry[0] > self._clock()
+
+    def _admit(self, hwnd):
+        """Returns False (and counts the skip) if hwnd is quarantined or hung."""
+        self.calls += 1
+        if self.is_quarantined(hwnd):
+            self.quarantine_skips += 1
+            return False
+        if self.window_system.is_hung(hwnd):
+            self.hung_skips += 1
+            self._strike(hwnd)
+            return False
+        return True
 
-        entry.bind("<MouseWheel>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_scroll(event, e, c, k, i_tl, vt, inc))
-        entry.bind("<Up>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_arrow_key(event, e, c, k, i_tl, 1, vt, inc))
-        entry.bind("<Down>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_arrow_key(event, e, c, k, i_tl, -1, vt, inc))
+    def _strike(self, hwnd):
+        with self._lock:
+            strikes = self._quarantine.get(hwnd, (0, 0))[1] + 1
+            backoff_ms = min(self.quarantine_max_ms, self.quarantine_base_ms * 2 ** (strikes - 1))
+            self._quarantine[hwnd] = (self._clock() + backoff_ms / 1000, strikes)
+            self.quarantined_total += 1
+
+    def _succeeded(self, hwnd):
+        if hwnd in self._quarantine:
+            with self._lock:
+                self._quarantine.pop(hwnd, None)
+
+    def forget(self, hwnd):
+        """Drops the quarantine entry of a destroyed window."""
+        with self._lock:
+            self._quarantine.pop(hwnd, None)
+
+    def get_window_text(self, hwnd, default=""):
+        """GetWindowText that gives up on a hung window (returning default) instead of waiting for it."""
+        if self.is_quarantined(hwnd):
+            self.calls += 1
+            self.quarantine_skips += 1
+            return default
+        self.calls += 1
+        title = self.window_system.get_title_timeout(hwnd, self.timeout_ms)
+        if title is None:
+            # Also fails for destroyed windows; only count a timeout while the window still exists.
+            if self.window_system.is_window(hwnd):
+                self.timeouts += 1
+                self._strike(hwnd)
+            return default
+        self._succeeded(hwnd)
+        return title
+
+    def show_window(self, hwnd, command):
+        """ShowWindowAsync: posts the show command instead of waiting for the window's thread."""
+        if not self._admit(hwnd):
+            return False
+        return self.window_system.show_window_async(hwnd, command)
 
-        save_button = customtkinter.CTkButton(frame, text="Apply", width=60,
-                                              command=lambda: self.apply_setting(entry, category, key, is_top_level, value_type))
-        save_button.pack(side="left", padx=5)
+    def move_window(self, hwnd, x, y, width, height):
+        """Moves and resizes hwnd with SWP_ASYNCWINDOWPOS, so a hung owner cannot block us."""
+        if not self._admit(hwnd):
+            return False
+        return self.window_system.move_window_async(hwnd, x, y, width, height)
 
-    def create_exclusion_list_entry(self, parent_frame, label_text, setting_key):
-        """Helper to create a label, entry for an exclusion list, and apply button."""
-        # Separate label onto its own line
-        # CHANGED: anchor="w" to align label left within the centered block
-        customtkinter.CTkLabel(parent_frame, text=label_text, anchor="w").pack(pady=(5, 2), padx=5, anchor="w")
+    def call(self, hwnd, function, *args):
+        """
+        Runs function(*args) (a call that may wait on hwnd's thread) on the pool. Returns its result, or
+        None if it was skipped (quarantined, hung, pool held by stuck calls) or timed out.
+        """
+        if not self._admit(hwnd):
+            return None
+        now = self._clock()
+        with self._lock:
+            if len(self._in_flight) >= self.pool_size:
+                self.pool_exhausted += 1
+                # The asking window is not to blame; the ones whose calls overran are.
+                stuck_hwnds = {stuck_hwnd for stuck_hwnd, started in self._in_flight.values()
+                               if (now - started) * 1000 > self.timeout_ms}
+                first_report = not self._exhausted
+                self._exhausted = True
+                future = None
+            else:
+                future = self._pool.submit(function, *args)
+                self._in_flight[future] = (hwnd, now)
+        if future is None:
+            for stuck_hwnd in stuck_hwnds:
+                self._strike(stuck_hwnd)
+            if first_report:
+                print(f"SafeWin32: all {self.pool_size} workers are stuck on hung windows and {len(self._abandoned)} more "
+                      f"were abandoned; cross-process calls are refused until one returns.")
+            return None
+        future.add_done_callback(self._call_done)
+        try:
+            result = future.result(timeout=self.timeout_ms / 1000)
+        except concurrent.futures.TimeoutError:
+            self.timeouts += 1
+            self._strike(hwnd)
+            self._abandon(future)
+            return None
+        self._succeeded(hwnd)
+        return result
+
+    def _abandon(self, future):
+        """Stops counting a timed-out call against the pool by moving later calls to a fresh pool."""
+        with self._lock:
+            if future not in self._in_flight or len(self._abandoned) >= self.max_abandoned:
+                return # Already finished, or too many stuck threads: it keeps its slot
+            del self._in_flight[future]
+            self._abandoned.add(future)
+            old_pool, self._pool = self._pool, self._new_pool()
+            self.workers_replaced += 1
+        old_pool.shutdown(wait=False) # Calls still running there finish normally
+
+    def _call_done(self, future):
+        with self._lock:
+            self._in_flight.pop(future, None)
+            self._abandoned.discard(future)
+            if len(self._in_flight) < self.pool_size:
+                self._exhausted = False
+
+    def close(self):
+        """Stops accepting pool calls; calls stuck on hung windows are left behind."""
+        self._pool.shutdown(wait=False)
+
+    def get_stats(self):
+        """Returns call, timeout and quarantine counters for diagnostics."""
+        now = self._clock()
+        with self._lock:
+            quarantined = sum(1 for until, _ in self._quarantine.values() if until > now)
+            in_flight = len(self._in_flight)
+            abandoned = len(self._abandoned)
+            exhausted = self._exhausted
+        return {
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'hung_skips': self.hung_skips,
+            'quarantine_skips': self.quarantine_skips,
+            'pool_exhausted': self.pool_exhausted,
+            'exhausted': exhausted,
+            'in_flight': in_flight,
+            'abandoned_workers': abandoned,
+            'workers_replaced': self.workers_replaced,
+            'quarantined': quarantined,
+            'quarantined_total': self.quarantined_total,
+        }
 
-        frame = customtkinter.CTkFrame(parent_frame, fg_color="transparent")
-        # CHANGED: anchor="w" to align entry left within the centered block
-        frame.pack(pady=2, anchor="w", fill="x")
+# --- Transparency Reconciler ---
 
-        initial_value = self.settings[setting_key]
-        entry = customtkinter.CTkEntry(frame)
-        entry.insert(0, str(initial_value))
-        entry.pack(side="left", padx=5, fill="x", expand=True)
+# Reason codes for windows that reject transparency
+FAILURE_ACCESS_DENIED = 'access_denied' # Elevated / higher-integrity window (UIPI)
+FAILURE_NOT_LAYERABLE = 'not_layerable' # The window refuses WS_EX_LAYERED or layered attributes
+FAILURE_INVALID = 'invalid' # The HWND is gone
+FAILURE_UNRESPONSIVE = 'unresponsive' # Skipped or timed out by SafeWin32 (which quarantines it itself)
 
-        self.exclusion_list_entries[setting_key] = entry
+class TransparencyFailureCache:
+    """
+    Remembers windows that rejected transparency, keyed by HWND and exe name (an HWND reused by another
+    program starts clean), with a reason code. A failed window is skipped until its retry time, which
+    doubles with every consecutive failure up to max_backoff_ms; a success clears it.
+    """
+    def __init__(self, base_backoff_ms=2000, max_backoff_ms=300000, clock=time.monotonic):
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self._clock = clock
+        self._entries = {} # hwnd -> {'exe_name', 'reason', 'failures', 'retry_at'}
+        self.skipped_calls = 0
+        self.failures_by_reason = collections.Counter()
+
+    def should_skip(self, hwnd, get_exe_name):
+        """Returns True if hwnd is a known-bad target still backing off. The exe name is only looked up for known HWNDs."""
+        entry = self._entries.get(hwnd)
+        if entry is None:
+            return False
+        if entry['exe_name'] != get_exe_name(hwnd):
+            del self._entries[hwnd]
+            return False
+        if entry['retry_at'] > self._clock():
+            self.skipped_calls += 1
+            return True
+        return False
 
-        save_button = customtkinter.CTkButton(frame, text="Apply", width=60,
-                                              command=lambda: self.apply_exclusion_list_setting(entry, setting_key))
-        save_button.pack(side="left", padx=5)
+    def record_failure(self, hwnd, exe_name, reason):
+        entry = self._entries.get(hwnd)
+        failures = entry['failures'] + 1 if entry is not None and entry['exe_name'] == exe_name else 1
+        backoff_ms = min(self.max_backoff_ms, self.base_backoff_ms * 2 ** (failures - 1))
+        self._entries[hwnd] = {
+            'exe_name': exe_name,
+            'reason': reason,
+            'failures': failures,
+            'retry_at': self._clock() + backoff_ms / 1000,
+        }
+        self.failures_by_reason[reason] += 1
+
+    def record_success(self, hwnd):
+        self._entries.pop(hwnd, None)
+
+    def reason(self, hwnd):
+        """Returns the reason code of hwnd's last failure, or None."""
+        entry = self._entries.get(hwnd)
+        return entry['reason'] if entry else None
+
+    def forget(self, hwnd):
+        self._entries.pop(hwnd, None)
+
+    def get_stats(self):
+        """Returns cache contents and the calls it saved, for diagnostics."""
+        return {
+            'entries': len(self._entries),
+            'skipped_calls': self.skipped_calls,
+            'failures_by_reason': dict(self.failures_by_reason),
+            'entries_by_reason': dict(collections.Counter(entry['reason'] for entry in self._entries.values())),
+            'exe_names': sorted({entry['exe_name'] or '?' for entry in self._entries.values()}),
+        }
 
-    def apply_exclusion_list_setting(self, entry_widget, setting_key):
-        """Applies an exclusion list setting from an entry widget."""
+class TransparencyReconciler:
+    """
+    Remembers the alpha and layered style last applied to each window and only issues
+    SetWindowLongPtrW / SetLayeredWindowAttributes when a window's desired alpha actually changes.
+    GWL_EXSTYLE is read once per window instead of on every apply. With a SafeWin32, the calls that
+    wait on the window's thread go through its timeout and quarantine. Windows that reject
+    transparency are recorded in a TransparencyFailureCache and skipped while they back off.
+    """
+    def __init__(self, safe_win32=None, get_exe_name=None, failure_cache=None, window_system=None):
+        self.window_system = window_system or (safe_win32.window_system if safe_win32 else Win32WindowSystem())
+        self.safe_win32 = safe_win32
+        self._get_exe_name = get_exe_name or self.window_system.get_exe_name
+        self.failure_cache = failure_cache or TransparencyFailureCache()
+        self._applied_alpha = {}
+        self._layered = set()
+        self.ops_issued = 0
+        self.ops_skipped = 0
+        self.style_reads = 0
+        self.failures = 0
+
+    def apply(self, hwnd, transparency_percentage):
+        """Brings hwnd to the given transparency (1-100). Returns True on success (or if already there)."""
+        alpha = transparency_percentage_to_alpha(transparency_percentage)
+        if self._applied_alpha.get(hwnd) == alpha:
+            self.ops_skipped += 1
+            return True
+        if self.failure_cache.should_skip(hwnd, self._get_exe_name):
+            return False
         try:
-            value_str = entry_widget.get()
-            cleaned_list = [item.strip().lower() for item in value_str.split(',') if item.strip()]
-            self.settings[setting_key] = ", ".join(cleaned_list)
-            self.save_settings()
-            self.show_message(f"Applied {setting_key.replace('_', ' ').title()}: {self.settings[setting_key]}", "green")
-            
-            # NEW: Trigger re-evaluation for all managed windows and reset inactivity tracking
-            # Crucially, we need to make sure that if an item is removed from the list, it is no longer considered excluded immediately.
-            self._reapply_dynamic_transparency_on_all_windows(force_all=True) # Forces re-evaluation of all windows
-            self._reset_inactivity_tracking_state() # Re-evaluates for minimization based on new exclusions
-            
-        except Exception as e:
-            self.show_message(f"Error applying exclusion list setting: {e}", "red")
+            current_ex_style = None
+            if hwnd not in self._layered:
+                self.style_reads += 1
+                current_ex_style = self.window_system.get_ex_style(hwnd)
+                if not (current_ex_style & WS_EX_LAYERED):
+                    self.ops_issued += 1
+            self.ops_issued += 1
+            result = self._call(hwnd, self.window_system.apply_layered_alpha, hwnd, current_ex_style, alpha)
+        except Exception:
+            result = (False, FAILURE_INVALID)
+        success, reason = result if result is not None else (False, FAILURE_UNRESPONSIVE)
+        if success:
+            self._applied_alpha[hwnd] = alpha
+            self._layered.add(hwnd)
+            self.failure_cache.record_success(hwnd)
+        else:
+            self.failures += 1
+            self._drop(hwnd)
+            if reason != FAILURE_UNRESPONSIVE:
+                self.failure_cache.record_failure(hwnd, self._get_exe_name(hwnd), reason)
+        return success
 
-    def toggle_apply_transparency_to_new_windows(self):
-        """Toggles the 'apply_transparency_to_new_windows' setting."""
-        new_state = self.new_window_transparency_checkbox.get() == 1
-        self.settings['apply_transparency_to_new_windows'] = new_state
-        self.save_settings()
-        self.show_message(f"'Apply transparency to new windows' set to: {new_state}", "blue")
+    def failure_reason(self, hwnd):
+        """Returns why hwnd last rejected transparency, or None."""
+        return self.failure_cache.reason(hwnd)
+
+    def _call(self, hwnd, function, *args):
+        if self.safe_win32 is None:
+            return function(*args)
+        return self.safe_win32.call(hwnd, function, *args) # None if skipped or timed out
+
+    def reconcile(self, desired_levels):
+        """Applies a {hwnd: transparency_percentage} mapping. Returns the set of HWNDs that failed."""
+        return {hwnd for hwnd, level in desired_levels.items() if not self.apply(hwnd, level)}
+
+    def transparent_hwnds(self):
+        """Returns the windows last left below full opacity. Safe to call from another thread."""
+        return [hwnd for hwnd, alpha in list(self._applied_alpha.items()) if alpha < 255]
+
+    def _drop(self, hwnd):
+        self._applied_alpha.pop(hwnd, None)
+        self._layered.discard(hwnd)
+
+    def forget(self, hwnd):
+        """Drops what we know about hwnd (destroyed, or changed behind our back), including past failures."""
+        self._drop(hwnd)
+        self.failure_cache.forget(hwnd)
+
+    def get_stats(self):
+        """Returns operation counters for diagnostics."""
+        return {
+            'tracked': len(self._applied_alpha),
+            'ops_issued': self.ops_issued,
+            'ops_skipped': self.ops_skipped,
+            'style_reads': self.style_reads,
+            'failures': self.failures,
+            'failure_cache_skips': self.failure_cache.skipped_calls,
+        }
 
-    def toggle_dynamic_transparency(self):
-        """Toggles the 'dynamic_transparency_enabled' setting and applies changes."""
-        new_state = self.dynamic_transparency_checkbox.get() == 1
-        self.settings['dynamic_transparency_enabled'] = new_state
-        self.save_settings()
-        self.show_message(f"'Dynamic transparency for active/inactive windows' set to: {new_state}", "blue")
+# --- Exclusion Matching ---
 
-        # Reapply dynamic transparency to current windows based on the new state.
-        # The _reapply_dynamic_transparency_on_all_windows function will now correctly
-        # handle whether to apply transparency or just remove from managed set without restoring.
-        self._reapply_dynamic_transparency_on_all_windows(force_all=True) # Force re-evaluation of all windows
+class ExclusionMatcher:
+    """
+    Compiled form of the global exclusion list. Plain entries are matched exactly (case-insensitive)
+    against the exe name and window class via a frozenset; entries with glob wildcards (e.g. 'chrome*')
+    are merged into one compiled pattern. 're:' entries (e.g. 're:^Chrome_WidgetWin_\\d+$') are compiled
+    and searched one by one: joined, inline flags, group names and backreferences would clash across
+    entries. Invalid regex entries are skipped and listed in invalid_entries.
+    """
+    REGEX_PREFIX = 're:'
+    GLOB_CHARS = frozenset('*?[')
+
+    def __init__(self, exclusion_list_str):
+        self.invalid_entries = []
+        exact_names = set()
+        patterns = []
+        regexes = []
+        for item in split_exclusion_list(exclusion_list_str):
+            if item.lower().startswith(self.REGEX_PREFIX):
+                try:
+                    regexes.append(re.compile(item[len(self.REGEX_PREFIX):], re.IGNORECASE))
+                except re.error:
+                    self.invalid_entries.append(item)
+            elif self.GLOB_CHARS.intersection(item):
+                patterns.append(f"(?:{fnmatch.translate(item.lower())})")
+            else:
+                exact_names.add(item.lower())
+        self.exact_names = frozenset(exact_names)
+        self.pattern = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+        self.regexes = tuple(regexes)
+
+    def matches(self, exe_name, window_class):
+        """Returns True if the exe name or window class is excluded."""
+        if exe_name and exe_name.lower() in self.exact_names:
+            return True
+        if window_class and window_class.lower() in self.exact_names:
+            return True
+        if self.pattern is not None:
+            if exe_name and self.pattern.match(exe_name):
+                return True
+            if window_class and self.pattern.match(window_class):
+                return True
+        for regex in self.regexes:
+            if (exe_name and regex.search(exe_name)) or (window_class and regex.search(window_class)):
+                return True
+        return False
 
-    def toggle_manage_all_windows_dynamically(self):
+def split_exclusion_list(exclusion_list_str):
+    """Splits a comma-separated exclusion list into stripped, non-empty entries.
+    Plain and glob entries are lowercased; 're:' entries keep their case so escapes like \\D stay intact."""
+    items = []
+    for item in exclusion_list_str.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.lower().startswith(ExclusionMatcher.REGEX_PREFIX):
+            items.append(ExclusionMatcher.REGEX_PREFIX + item[len(ExclusionMatcher.REGEX_PREFIX):])
+        else:
+            items.append(item.lower())
+    return items
+
+# --- Window Metadata Cache ---
+
+class WindowMetadataCache:
+    """
+    Caches exe name, class name and the exclusion verdict per HWND so the hot paths do not
+    open the owning process on every call. Entries are keyed by HWND and PID; the process
+    start time is re-checked every revalidate_ms to catch a PID that was reused by a new process.
+    """
+    def __init__(self, revalidate_ms=30000, window_system=None):
+        self.revalidate_ms = revalidate_ms
+        self.window_system = window_system or Win32WindowSystem()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.process_opens = 0
+        self.revalidations = 0
+        self.pid_reuses = 0
+        self.primed = 0
+
+    def _lookup(self, hwnd):
+        """Returns the cache entry for hwnd (a dict), or None if hwnd is not a window."""
+        pid = self.window_system.get_pid(hwnd)
+        if not pid:
+            self._entries.pop(hwnd, None)
+            return None
+        now = time.monotonic()
+        entry = self._entries.get(hwnd)
+        if entry is not None and entry['pid'] == pid:
+            if (now - entry['checked_at']) * 1000 < self.revalidate_ms:
+                self.hits += 1
+                return entry
+            # Same HWND and PID, but old enough that the PID may have been recycled.
+            self.revalidations += 1
+            self.process_opens += 1
+            exe_name, start_time = self.window_system.get_process_info(pid)
+            if start_time == entry['start_time']:
+                entry['checked_at'] = now
+                self.hits += 1
+                return entry
+            self.pid_reuses += 1
+        else:
+            self.process_opens += 1
+            exe_name, start_time = self.window_system.get_process_info(pid)
+        self.misses += 1
+        entry = {
+            'pid': pid,
+            'start_time': start_time,
+            'exe_name': exe_name,
+            'class_name': self.window_system.get_class_name(hwnd),
+            'excluded': None,
+            'checked_at': now,
+        }
+        self._entries[hwnd] = entry
+        return entry
+
+    def get_exe_name(self, hwnd):
+        """Returns the exe name (lowercase basename without extension, e.g. 'notepad') of the process owning hwnd, or None."""
+        entry = self._lookup(hwnd)
+        return entry['exe_name'] if entry else None
+
+    def get_class_name(self, hwnd):
+        """Cached equivalent of get_window_class_name."""
+        entry = self._lookup(hwnd)
+        return entry['class_name'] if entry else None
+
+    def is_excluded(self, hwnd, matches_exclusions):
+        """Returns the cached exclusion verdict, computing it with matches_exclusions(exe_name, class_name) if needed.
+        Invalid windows are never excluded."""
+        entry = self._lookup(hwnd)
+        if entry is None:
+            return False
+        if entry['excluded'] is None:
+            entry['excluded'] = matches_exclusions(entry['exe_name'], entry['class_name'])
+        return entry['excluded']
+
+    def prime(self, snapshot):
+        """Seeds entries from a scanner snapshot, whose exe names were already read off the Tk thread."""
+        for info in snapshot.windows.values():
+            if not info.pid or info.exe_name is None:
+                continue
+            entry = self._entries.get(info.hwnd)
+            if entry is not None and entry['pid'] == info.pid and entry['start_time'] == info.process_start:
+                continue
+            self.primed += 1
+            self._entries[info.hwnd] = {
+                'pid': info.pid,
+                'start_time': info.process_start,
+                'exe_name': info.exe_name,
+                'class_name': info.class_name,
+                'excluded': None,
+                'checked_at': snapshot.taken_at,
+            }
+
+    def reset_verdicts(self):
+        """Drops all exclusion verdicts (after the exclusion list changed); names stay cached."""
+        for entry in self._entries.values():
+            entry['excluded'] = None
+
+    def forget(self, hwnd):
+        """Drops the entry for a destroyed window."""
+        self._entries.pop(hwnd, None)
+
+    def prune(self, live_hwnds):
+        """Drops entries for windows that no longer exist."""
+        for hwnd in [hwnd for hwnd in self._entries if hwnd not in live_hwnds]:
+            del self._entries[hwnd]
+
+    def get_stats(self):
+        """Returns cache counters for diagnostics."""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'process_opens': self.process_opens,
+            'revalidations': self.revalidations,
+            'pid_reuses': self.pid_reuses,
+            'primed': self.primed,
+        }
+
+# --- Input Aggregation ---
+
+class InputAggregator:
+    """
+    Coalesces wheel and preset input per channel ('transparency', 'brightness') and hands it to
+    apply_fn(channel, new_level, step) at most once per interval_ms. Deltas are summed (each notch
+    already scaled by the fast/slow increment at the moment it arrived); a preset replaces
+    whatever was pending before it. submit_* may be called from any thread. With schedule=None
+    the owner calls flush() itself (the command queue does so at the end of every pump).
+    """
+    def __init__(self, schedule, apply_fn, interval_ms=16):
+        self._schedule = schedule
+        self._apply_fn = apply_fn
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flush_scheduled = False
+        self._last_delta_time = {}
+        self.events = 0
+        self.flushes = 0
+        self.max_queue_depth = 0
+        self._latency_total_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def _get_pending(self, channel):
+        """Returns the pending batch for channel, creating it (and scheduling a flush) if needed. Caller holds the lock."""
+        batch = self._pending.get(channel)
+        if batch is None:
+            batch = self._pending[channel] = {'level': None, 'step': 0, 'events': 0, 'since': time.perf_counter()}
+        batch['events'] += 1
+        self.events += 1
+        self.max_queue_depth = max(self.max_queue_depth, sum(b['events'] for b in self._pending.values()))
+        if self._schedule and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._schedule(self.interval_ms, self.flush)
+        return batch
+
+    def submit_delta(self, channel, delta, levels_config, event_time_ms=None):
         """
-        Toggles the 'manage_all_windows_dynamically' setting (the switch).
-        When enabled, the script will manage transparency for ALL open windows (if not excluded).
-        When disabled, it will only manage windows that open *after* the script started
-        and were initially processed by 'apply_transparency_to_new_windows' (if respective sub-settings allow).
+        Queues one wheel notch (delta = +1/-1), scaled by the fast or slow increment of levels_config.
+        event_time_ms (time.time() based) is when the notch happened; defaults to now.
         """
-        new_state = self.manage_all_windows_dynamically_switch.get() # CTkSwitch uses .get() directly
-        self.settings['manage_all_windows_dynamically'] = new_state
-        self.save_settings()
-        self.show_message(f"'Manage ALL Windows' set to: {new_state}", "blue")
-
-        if new_state: # If switch is ON
-            if self.settings['dynamic_transparency_enabled']:
-                self.show_message("Applying dynamic transparency to all currently open windows.", "blue")
-                # Add all initial non-excluded windows to the managed set
-                for hwnd in self.initial_script_start_hwnds:
-                    if not self._is_window_excluded(hwnd):
-                        self.managed_by_script_hwnds.add(hwnd)
-                self._reapply_dynamic_transparency_on_all_windows(force_all=True)
+        now = event_time_ms if event_time_ms is not None else time.time() * 1000
+        with self._lock:
+            time_diff = now - self._last_delta_time.get(channel, 0)
+            self._last_delta_time[channel] = now
+            if time_diff < levels_config['fast_scroll_threshold_ms'] and time_diff > 0:
+                increment = levels_config['scroll_increment_fast']
             else:
-                self.show_message("Dynamic transparency is off, 'Manage ALL Windows' switch has limited effect.", "orange")
-                # Even if dynamic is off, if 'Manage ALL Windows' is ON, we might still want to track them.
-                # But for transparency, no action is taken.
-        else: # If switch is OFF
-            self.show_message("Stopping automatic dynamic management for windows opened before script started.", "blue")
-            # When manage_all is OFF, we don't automatically restore.
-            # The _reapply_dynamic_transparency_on_all_windows will handle removing
-            # windows from managed_by_script_hwnds that no longer meet criteria,
-            # and restoring their transparency if they were managed by this specific setting.
-            self._reapply_dynamic_transparency_on_all_windows(force_all=False)
+                increment = levels_config['scroll_increment_slow']
+            self._get_pending(channel)['step'] += increment * delta
+
+    def submit_preset(self, channel, level):
+        """Queues an absolute level; it overrides any deltas queued before it."""
+        with self._lock:
+            batch = self._get_pending(channel)
+            batch['level'] = level
+            batch['step'] = 0
+
+    def reset_scroll_timing(self, channel):
+        """Forgets the last notch time so the next notch uses the slow increment."""
+        with self._lock:
+            self._last_delta_time.pop(channel, None)
+
+    def flush(self):
+        """Applies everything pending. Runs on the GUI thread."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_scheduled = False
+        for channel, batch in pending.items():
+            self._apply_fn(channel, batch['level'], batch['step'])
+            latency_ms = (time.perf_counter() - batch['since']) * 1000
+            self.flushes += 1
+            self._latency_total_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def get_stats(self):
+        """Returns queue and latency counters for diagnostics."""
+        with self._lock:
+            queue_depth = sum(b['events'] for b in self._pending.values())
+        return {
+            'events': self.events,
+            'applies': self.flushes,
+            'coalesced': self.events - self.flushes - queue_depth,
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'avg_latency_ms': round(self._latency_total_ms / self.flushes, 2) if self.flushes else 0.0,
+            'max_latency_ms': round(self.max_latency_ms, 2),
+        }
 
-    def toggle_center_on_first_launch(self):
-        """Toggles the 'center_on_first_launch' setting."""
-        new_state = self.center_on_first_launch_checkbox.get() == 1
-        self.settings['center_on_first_launch'] = new_state
-        self.save_settings()
-        self.show_message(f"'Center new windows (once)' set to: {new_state}", "blue")
+# --- Settings Persistence ---
 
-    def toggle_prevent_window_edges_off_screen(self):
-        """Toggles the 'prevent_window_edges_off_screen' setting."""
-        new_state = self.prevent_edges_off_screen_checkbox.get() == 1
-        self.settings['prevent_window_edges_off_screen'] = new_state
-        self.save_settings()
-        self.show_message(f"'Prevent centered window edges off screen' set to: {new_state}", "blue")
+def write_file_atomic(path, data):
+    """
+    Writes data to path via a temp file in the same directory, fsync and os.replace, so a crash
+    leaves either the old file or the new one, never a truncated one. Returns the fsync time in ms.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        fsync_start = time.perf_counter()
+        os.fsync(f.fileno())
+        fsync_ms = (time.perf_counter() - fsync_start) * 1000
+    os.replace(temp_path, path)
+    return fsync_ms
+
+class SettingsPersistence:
+    """
+    Write-behind store for the settings file. mark_dirty pickles the settings on the caller's
+    thread (so the writer never sees a dict that is being mutated) and a background writer
+    persists the latest snapshot once no new change has arrived for quiet_ms. flush() writes
+    synchronously, e.g. on shutdown.
+    """
+    def __init__(self, path, quiet_ms=500):
+        self.path = path
+        self.quiet_ms = quiet_ms
+        self._condition = threading.Condition()
+        self._pending = None
+        self._last_mark = 0.0
+        self._closed = False
+        self._write_lock = threading.Lock()
+        self.marks = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_error = None
+        self.bytes_written = 0
+        self._fsync_total_ms = 0.0
+        self.max_fsync_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="SettingsWriter", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, settings):
+        """Records a new settings snapshot to be written after the quiet period."""
+        data = pickle.dumps(settings)
+        with self._condition:
+            self._pending = data
+            self._last_mark = time.monotonic()
+            self.marks += 1
+            self._condition.notify()
+
+    def _run(self):
+        """Writer thread: waits for a snapshot, then for quiet_ms without new marks, then writes it."""
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                remaining = self._last_mark + self.quiet_ms / 1000 - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def flush(self):
+        """Writes the pending snapshot (if any) now, on the calling thread."""
+        with self._write_lock:
+            with self._condition:
+                data, self._pending = self._pending, None
+            if data is None:
+                return
+            try:
+                fsync_ms = write_file_atomic(self.path, data)
+            except OSError as e:
+                self.errors += 1
+                self.last_error = str(e)
+                return
+            self.flushes += 1
+            self.bytes_written += len(data)
+            self._fsync_total_ms += fsync_ms
+            self.max_fsync_ms = max(self.max_fsync_ms, fsync_ms)
+
+    def close(self):
+        """Flushes any pending snapshot and stops the writer thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=2)
+        self.flush()
+
+    def get_stats(self):
+        """Returns write counters for diagnostics."""
+        return {
+            'marks': self.marks,
+            'flushes': self.flushes,
+            'pending': self._pending is not None,
+            'bytes_written': self.bytes_written,
+            'avg_fsync_ms': round(self._fsync_total_ms / self.flushes, 2) if self.flushes else 0.0,
+            'max_fsync_ms': round(self.max_fsync_ms, 2),
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
 
-    def toggle_center_electricsheep_special(self):
-        """Toggles the 'center_electricsheep_special' setting."""
-        new_state = self.center_electricsheep_special_checkbox.get() == 1
-        self.settings['center_electricsheep_special'] = new_state
-        self.save_settings()
-        self.show_message(f"'Center Electricsheep (es.exe) with title bar hidden' set to: {new_state}", "blue")
+# --- Brightness Control ---
 
-    def toggle_enable_hotkey_passthrough(self):
-        """Toggles the 'enable_hotkey_passthrough' setting and re-registers hotkeys."""
-        new_state = self.enable_hotkey_passthrough_checkbox.get() == 1
-        self.settings['enable_hotkey_passthrough'] = new_state
-        self.save_settings()
-        self.show_message(f"'Electricsheep Crash Protection' set to: {new_state}. Re-registering hotkeys.", "blue")
-        self.register_hotkeys() # Re-register hotkeys to apply new suppression logic
-        self._reset_inactivity_tracking_state() # Reset state for minimization exclusion
+class BrightnessError(Exception):
+    """A brightness backend failure, carrying the message and color shown to the user."""
+    def __init__(self, message, color="red"):
+        super().__init__(message)
+        self.color = color
 
-    def _populate_initial_script_hwnds(self):
-        """Populates the set of HWNDs that exist when the script starts."""
-        def callback(hwnd, extra):
-            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd) != "":
-                # Ensure our own UI windows are not added to initial_script_start_hwnds
-                if hwnd != self.root.winfo_id() and \
-                   hwnd != self.tooltip_window.winfo_id() and \
-                   not (self.changer_window and hwnd == self.changer_window.winfo_id()):
-                    self.initial_script_start_hwnds.add(hwnd)
-            return True
-        win32gui.EnumWindows(callback, None)
-        # print(f"DEBUG: Initial script HWNDs: {len(self.initial_script_start_hwnds)}")
+class BrightnessBackend:
+    """Sets the screen brightness (0-100). Implementations may block; they are only called from BrightnessWorker."""
+    name = "none"
 
-    def _check_foreground_window(self):
-        """Periodically checks the foreground window and applies dynamic transparency."""
-        if not self.script_enabled:
-            self.window_monitor_fg_timer = self.root.after(self.settings['window_monitor_interval_ms'], self._check_foreground_window)
-            return
+    def set_brightness(self, level):
+        raise NotImplementedError
 
-        current_fg_hwnd = win32gui.GetForegroundWindow()
+    def get_stats(self):
+        """Returns backend-specific counters for diagnostics."""
+        return {}
 
-        # Update last active time for the current foreground window
-        if current_fg_hwnd and win32gui.IsWindow(current_fg_hwnd):
-            self.window_last_active_time[current_fg_hwnd] = time.time() * 1000
+class PlatformBrightnessBackend(BrightnessBackend):
+    """
+    The OS-specific brightness logic (absorbed from set_brightness.py): screen-brightness-control
+    on Windows, osascript on macOS, and on Linux the sysfs backlight or, failing that, xrandr.
+    """
+    name = "platform"
+
+    def __init__(self):
+        self.os_name = platform.system()
+        self._linux_backend = None # Chosen on first use: sysfs backlight if writable, else xrandr
+
+    def set_brightness(self, level):
+        if self.os_name == "Windows":
+            self._set_windows(level)
+        elif self.os_name == "Darwin": # macOS
+            self._set_macos(level)
+        elif self.os_name == "Linux":
+            self._set_linux(level)
+        else:
+            raise BrightnessError(f"Error: Unsupported operating system for brightness control: {self.os_name}")
 
-        if current_fg_hwnd == self.root.winfo_id() or \
-           current_fg_hwnd == self.tooltip_window.winfo_id() or \
-           (self.changer_window and current_fg_hwnd == self.changer_window.winfo_id()):
-            if self.settings['dynamic_transparency_enabled'] and self.last_foreground_hwnd:
-                self._apply_dynamic_transparency(current_fg_hwnd, self.last_foreground_hwnd)
-            self.last_foreground_hwnd = current_fg_hwnd
-            self.window_monitor_fg_timer = self.root.after(self.settings['window_monitor_interval_ms'], self._check_foreground_window)
-            return
+    def _set_windows(self, level):
+        sbc = optional_import('screen_brightness_control')
+        if sbc is None:
+            raise BrightnessError("Brightness control is unavailable because 'screen-brightness-control' is not installed. Please install it manually: pip install screen-brightness-control pywin32", "orange")
+        try:
+            sbc.set_brightness(level)
+        except Exception as e:
+            raise BrightnessError(f"Error setting brightness on Windows: {e}. Ensure you have the necessary permissions and that 'screen-brightness-control' and 'pywin32' are correctly installed.")
 
-        if current_fg_hwnd != self.last_foreground_hwnd:
-            if self.settings['dynamic_transparency_enabled']:
-                self._apply_dynamic_transparency(current_fg_hwnd, self.last_foreground_hwnd)
-            self.last_foreground_hwnd = current_fg_hwnd
+    def _set_macos(self, level):
+        import subprocess
+        macos_level = level / 100.0
+        try:
+            script = f'tell application "System Events" to tell process "ControlCenter" to slider 1 of group 1 of group 1 of group 1 of UI element 1 of row 1 of outline 1 of scroll area 1 of group 1 of window "Control Center" to set value to {macos_level}'
+            subprocess.run(['osascript', '-e', script], check=True)
+        except FileNotFoundError:
+            raise BrightnessError("Error: 'osascript' command not found. This script requires macOS.")
+        except subprocess.CalledProcessError as e:
+            raise BrightnessError(f"Error executing osascript: {e}. Could not set brightness. Ensure System Events has permission to control ControlCenter.")
+
+    def _set_linux(self, level):
+        if self._linux_backend is None:
+            self._linux_backend = SysfsBacklightBackend.open() or XrandrBrightnessBackend()
+        self._linux_backend.set_brightness(level)
+
+    def get_stats(self):
+        if self._linux_backend is None:
+            return {}
+        return dict(self._linux_backend.get_stats(), linux_backend=self._linux_backend.name)
+
+class SysfsBacklightBackend(BrightnessBackend):
+    """
+    Writes scaled values straight to /sys/class/backlight/<device>/brightness, keeping the file
+    descriptor open between calls. Use open() to get an instance; it returns None when there is no
+    writable backlight device. base_path can point at a directory that mimics the sysfs layout.
+    """
+    name = "sysfs"
+    DEFAULT_BASE_PATH = '/sys/class/backlight'
+    # Preferred device types, as recommended by the kernel's backlight class documentation.
+    TYPE_PREFERENCE = ('firmware', 'platform', 'raw')
+
+    def __init__(self, device_path, max_brightness, fd):
+        self.device_path = device_path
+        self.max_brightness = max_brightness
+        self._fd = fd
+        self.writes = 0
+
+    @classmethod
+    def find_device(cls, base_path=DEFAULT_BASE_PATH):
+        """Returns the path of the preferred backlight device under base_path, or None."""
+        try:
+            names = sorted(os.listdir(base_path))
+        except OSError:
+            return None
+        candidates = []
+        for name in names:
+            device_path = os.path.join(base_path, name)
+            if not (os.path.exists(os.path.join(device_path, 'brightness')) and
+                    os.path.exists(os.path.join(device_path, 'max_brightness'))):
+                continue
+            try:
+                with open(os.path.join(device_path, 'type')) as f:
+                    device_type = f.read().strip()
+            except OSError:
+                device_type = 'raw'
+            rank = cls.TYPE_PREFERENCE.index(device_type) if device_type in cls.TYPE_PREFERENCE else len(cls.TYPE_PREFERENCE)
+            candidates.append((rank, device_path))
+        return min(candidates)[1] if candidates else None
+
+    @classmethod
+    def open(cls, base_path=DEFAULT_BASE_PATH):
+        """Returns a backend for the preferred writable backlight device under base_path, or None."""
+        device_path = cls.find_device(base_path)
+        if device_path is None:
+            return None
+        try:
+            with open(os.path.join(device_path, 'max_brightness')) as f:
+                max_brightness = int(f.read().strip())
+            fd = os.open(os.path.join(device_path, 'brightness'), os.O_WRONLY)
+        except (OSError, ValueError):
+            return None # Typically no write permission without a udev rule; fall back to xrandr.
+        return cls(device_path, max_brightness, fd)
+
+    def set_brightness(self, level):
+        value = str(round(level * self.max_brightness / 100)).encode()
+        try:
+            os.pwrite(self._fd, value, 0)
+        except OSError as e:
+            raise BrightnessError(f"Error writing backlight brightness to {self.device_path}: {e}")
+        self.writes += 1
 
-        self.window_monitor_fg_timer = self.root.after(self.settings['window_monitor_interval_ms'], self._check_foreground_window)
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
 
-    def _check_for_new_windows(self):
-        """Periodically enumerates all windows to find and process newly opened ones."""
-        # Only run if new window transparency or centering is enabled
-        if not self.script_enabled and \
-           not self.settings['apply_transparency_to_new_windows'] and \
-           not self.settings['center_on_first_launch']:
-            self.window_monitor_new_timer = self.root.after(self.settings['new_window_check_interval_ms'], self._check_for_new_windows)
-            return
+    def get_stats(self):
+        return {'device': self.device_path, 'max_brightness': self.max_brightness, 'writes': self.writes}
 
-        current_visible_hwnds = set()
-        def get_current_visible_hwnds_callback(hwnd, extra):
-            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd) != "":
-                # Ensure our own UI windows are not considered
-                if hwnd != self.root.winfo_id() and \
-                   hwnd != self.tooltip_window.winfo_id() and \
-                   (not self.changer_window or hwnd != self.changer_window.winfo_id()):
-                    current_visible_hwnds.add(hwnd)
-            return True
-        win32gui.EnumWindows(get_current_visible_hwnds_callback, None)
+class XrandrBrightnessBackend(BrightnessBackend):
+    """
+    Sets brightness with 'xrandr --brightness'. The primary output is discovered once and cached
+    until the connector status files under drm_path change (a monitor was plugged or unplugged),
+    so a wheel notch costs one xrandr launch instead of two. Without drm_path the cache is only
+    dropped after a failed set.
+    """
+    name = "xrandr"
+
+    def __init__(self, drm_path='/sys/class/drm'):
+        self.drm_path = drm_path
+        self._display = None
+        self._display_signature = None
+        self.discoveries = 0
+        self.launches = 0
+
+    def _display_config_signature(self):
+        """Returns the connector status of every DRM output; it changes when displays are (dis)connected."""
+        signature = []
+        try:
+            names = sorted(os.listdir(self.drm_path))
+        except OSError:
+            return None
+        for name in names:
+            try:
+                with open(os.path.join(self.drm_path, name, 'status')) as f:
+                    signature.append((name, f.read().strip()))
+            except OSError:
+                continue
+        return tuple(signature)
+
+    def _discover_display(self):
+        """Runs xrandr and returns the name of the connected primary output, or None."""
+        import subprocess
+        self.discoveries += 1
+        self.launches += 1
+        output = subprocess.run(['xrandr'], capture_output=True, text=True, check=True)
+        for line in output.stdout.splitlines():
+            if ' connected primary' in line:
+                return line.split(' ')[0]
+        return None
 
-        # Identify closed windows and remove them from tracking sets
-        closed_hwnds = self.processed_new_windows.difference(current_visible_hwnds)
-        for hwnd in closed_hwnds:
-            self.processed_new_windows.discard(hwnd)
-            self.managed_by_script_hwnds.discard(hwnd)
-            self.minimized_by_script_hwnds.discard(hwnd)
-            if hwnd in self.window_last_active_time:
-                del self.window_last_active_time[hwnd]
-            # Note: We don't remove from initial_script_start_hwnds as that's a static list of windows present at script start.
+    def set_brightness(self, level):
+        import subprocess
+        linux_level = level / 100.0
+        try:
+            signature = self._display_config_signature()
+            # No signature (no DRM sysfs) means "unknown", not "changed": keep the output until a set fails.
+            if self._display is None or (signature is not None and signature != self._display_signature):
+                self._display = self._discover_display()
+                self._display_signature = signature
+            if not self._display:
+                raise BrightnessError("Could not find primary display using xrandr.", "orange")
+            self.launches += 1
+            subprocess.run(['xrandr', '--output', self._display, '--brightness', str(linux_level)], check=True)
+        except FileNotFoundError:
+            raise BrightnessError("Error: 'xrandr' command not found. This script requires xrandr.")
+        except subprocess.CalledProcessError as e:
+            self._display = None # The cached output may be stale; rediscover next time.
+            raise BrightnessError(f"Error executing xrandr: {e}")
+
+    def get_stats(self):
+        return {'display': self._display, 'discoveries': self.discoveries, 'launches': self.launches}
+
+class SimulatedBrightnessBackend(BrightnessBackend):
+    """Records requested levels and sleeps latency_ms per call, like a slow DDC/CI monitor."""
+    name = "simulated"
+
+    def __init__(self, latency_ms=150):
+        self.latency_ms = latency_ms
+        self.applied_levels = []
+
+    def set_brightness(self, level):
+        time.sleep(self.latency_ms / 1000)
+        self.applied_levels.append(level)
+
+class BrightnessWorker:
+    """
+    Applies brightness on a dedicated thread with latest-value-wins semantics: request() only
+    records the level and returns immediately; levels requested while a set is in flight are
+    replaced by newer ones and never reach the backend. Errors are passed to on_error(message, color)
+    on the worker thread.
+    """
+    def __init__(self, backend, on_error=None):
+        self.backend = backend
+        self._on_error = on_error
+        self._condition = threading.Condition()
+        self._requested = None
+        self._stopped = False
+        self.requests = 0
+        self.applied = 0
+        self.dropped = 0
+        self.errors = 0
+        self._apply_total_ms = 0.0
+        self.max_apply_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="BrightnessWorker", daemon=True)
+        self._thread.start()
+
+    def request(self, level):
+        """Asks for level to be applied; supersedes any level not yet picked up by the worker."""
+        with self._condition:
+            if self._requested is not None:
+                self.dropped += 1
+            self._requested = level
+            self.requests += 1
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._requested is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                level, self._requested = self._requested, None
+            start = time.perf_counter()
+            try:
+                self.backend.set_brightness(level)
+            except BrightnessError as e:
+                self._report_error(str(e), e.color)
+            except Exception as e:
+                self._report_error(f"An unexpected error occurred during brightness control: {e}", "red")
+            else:
+                self.applied += 1
+            apply_ms = (time.perf_counter() - start) * 1000
+            self._apply_total_ms += apply_ms
+            self.max_apply_ms = max(self.max_apply_ms, apply_ms)
+
+    def _report_error(self, message, color):
+        self.errors += 1
+        if self._on_error:
+            self._on_error(message, color)
+
+    def stop(self):
+        """Stops the worker; a set already in flight is allowed to finish."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=1)
+
+    def get_stats(self):
+        """Returns request/apply counters for diagnostics."""
+        calls = self.applied + self.errors
+        return {
+            'backend': self.backend.name,
+            'backend_stats': self.backend.get_stats(),
+            'requests': self.requests,
+            'applied': self.applied,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'avg_apply_ms': round(self._apply_total_ms / calls, 2) if calls else 0.0,
+            'max_apply_ms': round(self.max_apply_ms, 2),
+        }
 
-        # Now, identify genuinely new windows (not in processed_new_windows)
-        for hwnd in current_visible_hwnds:
-            if hwnd not in self.processed_new_windows:
-                self._process_newly_found_window(hwnd)
+# --- Modifier State ---
+
+MODIFIER_NAME_TO_MASK = {'ctrl': MOD_CONTROL, 'shift': MOD_SHIFT, 'alt': MOD_ALT, 'win': MOD_WIN, 'windows': MOD_WIN}
+
+def modifier_mask_from_hotkey(hotkey_str):
+    """Returns the MOD_* bitmask of the modifiers named in a hotkey string like 'ctrl+shift+xbutton2'."""
+    mask = 0
+    for part in hotkey_str.split('+'):
+        mask |= MODIFIER_NAME_TO_MASK.get(part.strip().lower(), 0)
+    return mask
+
+class ModifierState:
+    """Reports which modifiers (Win, Ctrl, Shift, Alt) are currently held, as a MOD_* bitmask."""
+    name = "none"
+
+    def __init__(self):
+        self.reads = 0
+        self._read_total_us = 0.0
+
+    def read(self):
+        """Returns the current modifier bitmask."""
+        start = time.perf_counter()
+        mask = self._read()
+        self._read_total_us += (time.perf_counter() - start) * 1e6
+        self.reads += 1
+        return mask
+
+    def _read(self):
+        raise NotImplementedError
+
+    def get_stats(self):
+        """Returns read counters for diagnostics."""
+        return {
+            'source': self.name,
+            'reads': self.reads,
+            'avg_read_us': round(self._read_total_us / self.reads, 2) if self.reads else 0.0,
+        }
 
-        self.window_monitor_new_timer = self.root.after(self.settings['new_window_check_interval_ms'], self._check_for_new_windows)
+class Win32ModifierState(ModifierState):
+    """Reads all modifiers in-process with GetAsyncKeyState (five calls, no round-trip to AutoHotkey)."""
+    name = "win32"
+    _VK_MASKS = ((VK_CONTROL, MOD_CONTROL), (VK_SHIFT, MOD_SHIFT), (VK_MENU, MOD_ALT), (VK_LWIN, MOD_WIN), (VK_RWIN, MOD_WIN))
+
+    def _read(self):
+        mask = 0
+        for vk, bit in self._VK_MASKS:
+            if GetAsyncKeyState(vk) & 0x8000:
+                mask |= bit
+        return mask
+
+class AhkModifierState(ModifierState):
+    """The previous approach: eight ahk.key_state() queries, each a round-trip to the AutoHotkey process."""
+    name = "ahk"
+
+    def __init__(self, ahk_instance):
+        super().__init__()
+        self.ahk = ahk_instance
+
+    def _read(self):
+        mask = 0
+        if self.ahk.key_state('LWin') or self.ahk.key_state('RWin'):
+            mask |= MOD_WIN
+        if self.ahk.key_state('LCtrl') or self.ahk.key_state('RCtrl'):
+            mask |= MOD_CONTROL
+        if self.ahk.key_state('LShift') or self.ahk.key_state('RShift'):
+            mask |= MOD_SHIFT
+        if self.ahk.key_state('LAlt') or self.ahk.key_state('RAlt'):
+            mask |= MOD_ALT
+        return mask
+
+class SimulatedModifierState(ModifierState):
+    """A modifier source driven by press()/release() calls, for benchmarks and scripted input."""
+    name = "simulated"
+
+    def __init__(self, mask=0):
+        super().__init__()
+        self.mask = mask
+
+    def press(self, bits):
+        self.mask |= bits
+
+    def release(self, bits):
+        self.mask &= ~bits
+
+    def _read(self):
+        return self.mask
+
+# --- Hotkey Specs ---
+
+def build_hotkey_key_maps():
+    """
+    Returns (internal_to_display_map, display_to_internal_map): AHK key names to the names shown in the
+    hotkey dropdowns and back.
+    """
+    internal_to_display_map = {
+        'none': 'None',
+        'WheelUp': 'Mouse Wheel Up',
+        'WheelDown': 'Mouse Wheel Down',
+        'XButton1': 'Mouse XButton1',
+         'XButton2': 'Mouse XButton2',
+        'LButton': 'Mouse Left Click',
+        'RButton': 'Mouse Right Click', # Add RButton
+        'MButton': 'Mouse Middle Click',
+        'WheelUp': 'Mouse Wheel Up', # Ensure WheelUp/Down are here for Alt+Wheel
+        'WheelDown': 'Mouse Wheel Down',
+        'Ctrl': 'Ctrl', 'Shift': 'Shift', 'Alt': 'Alt', 'Win': 'Win',
+    }
+
+    ahk_key_mappings = {
+        'Backspace': 'Backspace', 'Tab': 'Tab', 'Enter': 'Enter', 'Escape': 'Esc', 'Space': 'Space',
+        'PgUp': 'Page Up', 'PgDn': 'Page Down', 'End': 'End', 'Home': 'Home',
+        'Left': 'Left', 'Up': 'Up', 'Right': 'Right', 'Down': 'Down',
+        'Insert': 'Ins', 'Delete': 'Del',
+        'Numpad0': 'Numpad 0', 'Numpad1': 'Numpad 1', 'Numpad2': 'Numpad 2', 'Numpad3': 'Numpad 3', 'Numpad4': 'Numpad 4',
+        'Numpad5': 'Numpad 5', 'Numpad6': 'Numpad 6', 'Numpad7': 'Numpad 7', 'Numpad8': 'Numpad 8', 'Numpad9': 'Numpad 9',
+        'NumpadMult': 'Num *', 'NumpadAdd': 'Num +', 'NumpadSub': 'Num -', 'NumpadDot': 'Num .', 'NumpadDiv': 'Num /',
+        'F1': 'F1', 'F2': 'F2', 'F3': 'F3', 'F4': 'F4', 'F5': 'F5', 'F6': 'F6', 'F7': 'F7', 'F8': 'F8', 'F9': 'F9', 'F10': 'F10', 'F11': 'F11', 'F12': 'F12',
+        '~': '~', '-': '-', '=': '=', '[': '[', ']': ']', ';': ';', '"': "'", ',': ',', '.': '.', '\\': '\\', '/': '/',
+    }
+
+    for i in range(10):
+        str_i = str(i)
+        ahk_key_mappings[str_i] = str_i
+
+    for char_code in range(ord('A'), ord('Z') + 1):
+        char_upper = chr(char_code)
+        ahk_key_mappings[char_upper] = char_upper
+
+    for char_code in range(ord('a'), ord('z') + 1):
+        char_lower = chr(char_code)
+        ahk_key_mappings[char_lower] = char_lower.upper()
+
+    for ahk_name, display_name in ahk_key_mappings.items():
+        if ahk_name not in internal_to_display_map:
+            internal_to_display_map[ahk_name] = display_name
+
+    display_to_internal_map = {v: k for k, v in internal_to_display_map.items()
+                               if k not in ['Ctrl', 'Shift', 'Alt', 'Win']}
+    return internal_to_display_map, display_to_internal_map
+
+HotkeySpec = collections.namedtuple('HotkeySpec', ['action', 'hotkey_str', 'modifiers', 'main_key', 'suppress', 'ahk_syntax'])
+
+class HotkeyCompiler:
+    """
+    Turns hotkey strings like 'ctrl+shift+xbutton2' into HotkeySpecs. Key names (AHK or display
+    names, any case) are resolved through a lookup built once from internal_to_display_map.
+    """
+    _AHK_MODIFIER_SYMBOLS = ((MOD_CONTROL, '^'), (MOD_SHIFT, '+'), (MOD_ALT, '!'), (MOD_WIN, '#'))
+
+    def __init__(self, internal_to_display_map):
+        self._key_lookup = {}
+        for ahk_key, display_name in internal_to_display_map.items():
+            # setdefault keeps the first match, as the old linear scan did
+            self._key_lookup.setdefault(ahk_key.lower(), ahk_key)
+            self._key_lookup.setdefault(display_name.lower(), ahk_key)
+
+    def resolve_main_key(self, part):
+        """Returns the AHK key name for one non-modifier token of a hotkey string."""
+        found_ahk_key = self._key_lookup.get(part.strip().lower())
+        if found_ahk_key:
+            return found_ahk_key
+        if len(part) == 1 and (part.isalpha() or part.isdigit()):
+            return part
+        return part.title()
+
+    def compile(self, action, hotkey_str, suppress=True):
+        """Returns the HotkeySpec for hotkey_str. ahk_syntax is None if there is nothing to register."""
+        modifiers = 0
+        main_key = ''
+        if hotkey_str and hotkey_str != 'none':
+            for part in hotkey_str.split('+'):
+                bit = MODIFIER_NAME_TO_MASK.get(part.strip().lower())
+                if bit:
+                    modifiers |= bit
+                else:
+                    main_key = self.resolve_main_key(part)
+        ahk_syntax = None
+        if main_key:
+            ahk_modifiers_str = "".join(symbol for bit, symbol in self._AHK_MODIFIER_SYMBOLS if modifiers & bit)
+            ahk_syntax = f"{'' if suppress else '~'}{ahk_modifiers_str}{main_key}"
+        return HotkeySpec(action, hotkey_str, modifiers, main_key, suppress, ahk_syntax)
+
+class HotkeyBindings:
+    """
+    Table of the hotkeys currently bound through add_fn(key, callback) / remove_fn(key). update()
+    applies only the difference to a desired table, wrapped in begin_fn() / end_fn() so the backend can
+    apply it as one batch. Bindings for priority actions (kill switch, toggle) are passed to add_fn with
+    priority=True, and are added before anything is removed; that keeps them live on backends that apply
+    each call as it comes. Batching backends keep them live themselves (see AhkHotkeyBackend).
+    """
+    def __init__(self, add_fn, remove_fn, begin_fn=None, end_fn=None):
+        self._add_fn = add_fn
+        self._remove_fn = remove_fn
+        self._begin_fn = begin_fn
+        self._end_fn = end_fn
+        self._bound = {} # key (AHK syntax) -> action
+        self.updates = 0
+        self.adds = 0
+        self.removes = 0
+        self.unchanged = 0
+        self.last_update_ms = 0.0
+
+    @staticmethod
+    def _base_key(key):
+        """The key without the '~' passthrough prefix; two bindings with the same base key conflict."""
+        return key.lstrip('~')
+
+    def update(self, desired, priority_actions=()):
+        """desired maps key -> (action, callback). Returns (added, removed) counts."""
+        start = time.perf_counter()
+        to_remove = [key for key, action in self._bound.items()
+                     if key not in desired or desired[key][0] != action]
+        to_add = [key for key, (action, _callback) in desired.items() if self._bound.get(key) != action]
+        self.unchanged += len(desired) - len(to_add)
+        if to_add or to_remove:
+            self._apply(desired, to_add, to_remove, priority_actions)
+
+        self.updates += 1
+        self.last_update_ms = (time.perf_counter() - start) * 1000
+        return len(to_add), len(to_remove)
+
+    def _apply(self, desired, to_add, to_remove, priority_actions):
+        if self._begin_fn:
+            self._begin_fn()
+        try:
+            # Priority bindings go in first unless their key is still taken by a binding being replaced.
+            bound_base_keys = {self._base_key(key) for key in self._bound}
+            first = [key for key in to_add if desired[key][0] in priority_actions and self._base_key(key) not in bound_base_keys]
+            for key in first:
+                self._add(key, *desired[key], priority=True)
+            for key in to_remove:
+                self._remove_fn(key)
+                del self._bound[key]
+                self.removes += 1
+            for key in to_add:
+                if key not in first:
+                    self._add(key, *desired[key], priority=desired[key][0] in priority_actions)
+        finally:
+            if self._end_fn:
+                self._end_fn()
+
+    def _add(self, key, action, callback, priority=False):
+        self._add_fn(key, callback, priority=priority)
+        self._bound[key] = action
+        self.adds += 1
+
+    def bound_actions(self):
+        """Returns {key: action} for everything currently bound."""
+        return dict(self._bound)
+
+    def get_stats(self):
+        """Returns update counters for diagnostics."""
+        return {
+            'bound': len(self._bound),
+            'updates': self.updates,
+            'adds': self.adds,
+            'removes': self.removes,
+            'unchanged': self.unchanged,
+            'last_update_ms': round(self.last_update_ms, 2),
+        }
 
-    def _process_newly_found_window(self, hwnd):
-        """Applies transparency and/or centers a newly found window if enabled and not excluded."""
-        # Mark as processed immediately to prevent re-processing by this specific check
-        self.processed_new_windows.add(hwnd)
+# --- Hotkey Backends ---
 
-        # Ensure our own UI windows are not processed as new windows
-        if hwnd == self.root.winfo_id() or \
-           hwnd == self.tooltip_window.winfo_id() or \
-           (self.changer_window and hwnd == self.changer_window.winfo_id()):
-            return
+class HotkeyBackend:
+    """
+    Delivers hotkeys to callbacks. Keys use AHK syntax ('~' passthrough prefix, ^+!# modifiers, AHK key
+    name), as produced by HotkeySpec.ahk_syntax. Callbacks run on a backend thread, never the Tk thread.
+    """
+    name = "none"
 
-        # If window is in the exclusion list, DO NOT ATTEMPT TO SET TRANSPARENCY OR CENTER.
-        # Just ensure it's not in the managed set.
-        if self._is_window_excluded(hwnd):
-            if hwnd in self.managed_by_script_hwnds:
-                self.managed_by_script_hwnds.discard(hwnd)
-            return
+    def __init__(self):
+        self._callbacks = {}
+        self.events = 0
+        self._latency_total_ms = 0.0
+        self.max_latency_ms = 0.0
 
-        # Center on first launch (only if not excluded)
-        if self.settings['center_on_first_launch']:
-            # Only center if it's a truly new window not already managed by script
-            if hwnd not in self.managed_by_script_hwnds:
-                self._center_window(hwnd, show_tooltip=False) # No tooltip for auto-center
+    def add_hotkey(self, key, callback, priority=False):
+        """
+        Binds key to callback. priority marks bindings that must stay live through updates (kill switch,
+        toggle); backends that can isolate them do so.
+        """
+        # Copy-on-write so hook threads can read the table without a lock
+        callbacks = dict(self._callbacks)
+        callbacks[key] = callback
+        self._callbacks = callbacks
 
-        # Apply transparency to new windows (only if not excluded)
-        if self.settings['apply_transparency_to_new_windows']:
-            # Only apply if it's a truly new window not already managed by script
-            if hwnd not in self.managed_by_script_hwnds:
-                target_level = self.settings['new_window_transparency_level']
-                
-                # If dynamic transparency is also enabled, and it's the foreground window,
-                # apply the active level immediately. Otherwise, apply the new_window_transparency_level.
-                # The dynamic transparency monitor will take over from here.
-                if self.settings['dynamic_transparency_enabled'] and \
-                   hwnd == win32gui.GetForegroundWindow():
-                    target_level = self.settings['active_window_transparency']
+    def remove_hotkey(self, key):
+        self._callbacks = {k: v for k, v in self._callbacks.items() if k != key}
 
-                set_transparency_for_hwnd(hwnd, target_level)
-                self.managed_by_script_hwnds.add(hwnd) # Add to managed set
-                # self.show_message(f"Applied new window transparency ({target_level}%) to {get_window_exe_name(hwnd)}", "blue")
+    def start_hotkeys(self):
+        pass
 
-    def _set_screen_brightness(self, level):
+    def stop_hotkeys(self):
+        pass
+
+    def begin_update(self):
         """
-        Sets the screen brightness to the specified level (0-100).
-        This method absorbs the logic from set_brightness.py.
+        Starts a batch of add_hotkey / remove_hotkey calls that end_update() applies together. The base
+        backend applies each call immediately, so bindings untouched by the batch stay live throughout.
+        Backends that apply the batch at the end must keep priority bindings live meanwhile.
         """
-        if not 0 <= level <= 100:
-            self.show_message("Error: Brightness level must be between 0 and 100.", "red")
+        pass
+
+    def end_update(self):
+        pass
+
+    def _dispatch(self, key, event_time):
+        """Runs the callback bound to key, recording the latency from event_time (perf_counter) to the call."""
+        callback = self._callbacks.get(key)
+        if callback is None:
+            return False
+        latency_ms = (time.perf_counter() - event_time) * 1000
+        self.events += 1
+        self._latency_total_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        callback()
+        return True
+
+    def get_stats(self):
+        """Returns event counters for diagnostics."""
+        return {
+            'backend': self.name,
+            'bound': len(self._callbacks),
+            'events': self.events,
+            'avg_event_to_callback_ms': round(self._latency_total_ms / self.events, 3) if self.events else None,
+            'max_event_to_callback_ms': round(self.max_latency_ms, 3) if self.events else None,
+        }
+
+class AhkHotkeyBackend(HotkeyBackend):
+    """
+    Hotkeys through AutoHotkey subprocesses (the ahk package). The original event time is not visible
+    from Python, so the recorded latency only covers the hop from AHK's callback thread.
+
+    The ahk package restarts a subprocess on every add_hotkey / remove_hotkey while it is running, and
+    nothing it binds is live during a restart. So priority bindings (kill switch, toggle) get their own
+    subprocess, which ordinary binding changes never touch. When a priority binding itself changes, a
+    new priority subprocess is started before the old one is stopped, and the old one's callbacks are
+    ignored from then on. Other bindings live in the main subprocess. A batch stops it before its first
+    change and starts it again in end_update(), so an update costs one restart there.
+    """
+    name = "ahk"
+
+    def __init__(self, executable_path):
+        super().__init__()
+        self._running = False
+        self._batching = False
+        self._stopped_for_batch = False
+        self.restarts = 0
+        self.priority_swaps = 0
+        self._ahk_module = optional_import('ahk')
+        if self._ahk_module is None:
+            raise ImportError("The AutoHotkey hotkey backend needs the 'ahk' package (pip install ahk).")
+        self.executable_path = executable_path
+        self.ahk = self._ahk_module.AHK(executable_path=executable_path)
+        self._priority_ahk = None
+        self._priority_keys = set()
+        self._priority_dirty = False
+        self._priority_generation = 0
+
+    def add_hotkey(self, key, callback, priority=False):
+        super().add_hotkey(key, callback)
+        if priority:
+            self._priority_keys.add(key)
+            self._priority_changed()
             return
+        self._pause_for_batch()
+        self.ahk.add_hotkey(key, functools.partial(self._on_hotkey, key))
+
+    def remove_hotkey(self, key):
+        super().remove_hotkey(key)
+        if key in self._priority_keys:
+            self._priority_keys.discard(key)
+            self._priority_changed()
+            return
+        self._pause_for_batch()
+        self.ahk.remove_hotkey(key)
 
-        os_name = platform.system()
+    def _priority_changed(self):
+        if self._batching:
+            self._priority_dirty = True
+        else:
+            self._swap_priority_instance()
+
+    def _swap_priority_instance(self):
+        """Brings up a subprocess with the current priority bindings, then stops the previous one."""
+        self._priority_dirty = False
+        self._priority_generation += 1
+        new_ahk = None
+        if self._priority_keys:
+            new_ahk = self._ahk_module.AHK(executable_path=self.executable_path)
+            for key in self._priority_keys:
+                new_ahk.add_hotkey(key, functools.partial(self._on_priority_hotkey, self._priority_generation, key))
+            if self._running:
+                new_ahk.start_hotkeys()
+        old_ahk, self._priority_ahk = self._priority_ahk, new_ahk
+        if old_ahk is not None and self._running:
+            old_ahk.stop_hotkeys()
+        self.priority_swaps += 1
+
+    def _pause_for_batch(self):
+        """Inside a batch, stops the running main subprocess once so later changes do not each restart it."""
+        if self._batching and self._running and not self._stopped_for_batch:
+            self.ahk.stop_hotkeys()
+            self._stopped_for_batch = True
+
+    def begin_update(self):
+        self._batching = True
+
+    def end_update(self):
+        self._batching = False
+        if self._priority_dirty:
+            self._swap_priority_instance()
+        if self._stopped_for_batch:
+            self._stopped_for_batch = False
+            self.ahk.start_hotkeys()
+            self.restarts += 1
+
+    def _on_hotkey(self, key):
+        self._dispatch(key, time.perf_counter())
+
+    def _on_priority_hotkey(self, generation, key):
+        # A replaced priority subprocess can still fire until it is stopped; the new one already covers the key.
+        if generation == self._priority_generation:
+            self._dispatch(key, time.perf_counter())
+
+    def start_hotkeys(self):
+        if not self._running:
+            if self._priority_ahk is not None:
+                self._priority_ahk.start_hotkeys()
+            self.ahk.start_hotkeys()
+            self._running = True
+
+    def stop_hotkeys(self):
+        if self._running:
+            self.ahk.stop_hotkeys()
+            if self._priority_ahk is not None:
+                self._priority_ahk.stop_hotkeys()
+            self._running = False
+
+    def get_stats(self):
+        return dict(super().get_stats(), restarts=self.restarts, priority_swaps=self.priority_swaps,
+                    priority_bound=len(self._priority_keys))
+
+def parse_ahk_hotkey(key):
+    """Splits AHK hotkey syntax like '~^+XButton2' into (suppress, MOD_* bitmask, key name)."""
+    suppress = not key.startswith('~')
+    key = key.lstrip('~')
+    modifiers = 0
+    symbols = {'^': MOD_CONTROL, '+': MOD_SHIFT, '!': MOD_ALT, '#': MOD_WIN}
+    while len(key) > 1 and key[0] in symbols:
+        modifiers |= symbols[key[0]]
+        key = key[1:]
+    return suppress, modifiers, key
+
+# Virtual-key codes for the AHK key names offered in the hotkey dropdowns (native backend).
+NATIVE_KEY_VK = {
+    'Backspace': 0x08, 'Tab': 0x09, 'Enter': 0x0D, 'Escape': 0x1B, 'Space': 0x20,
+    'PgUp': 0x21, 'PgDn': 0x22, 'End': 0x23, 'Home': 0x24, 'Left': 0x25, 'Up': 0x26, 'Right': 0x27, 'Down': 0x28,
+    'Insert': 0x2D, 'Delete': 0x2E,
+    'NumpadMult': 0x6A, 'NumpadAdd': 0x6B, 'NumpadSub': 0x6D, 'NumpadDot': 0x6E, 'NumpadDiv': 0x6F,
+    '~': 0xC0, '-': 0xBD, '=': 0xBB, '[': 0xDB, ']': 0xDD, ';': 0xBA, '"': 0xDE, ',': 0xBC, '.': 0xBE, '\\': 0xDC, '/': 0xBF,
+}
+NATIVE_KEY_VK.update({str(i): 0x30 + i for i in range(10)})
+NATIVE_KEY_VK.update({f"Numpad{i}": 0x60 + i for i in range(10)})
+NATIVE_KEY_VK.update({f"F{i}": 0x6F + i for i in range(1, 13)})
+NATIVE_KEY_VK.update({chr(c): c for c in range(ord('A'), ord('Z') + 1)})
+
+# Mouse "keys": (press message, release message to swallow along with a suppressed press)
+NATIVE_MOUSE_BUTTONS = {
+    'LButton': (WM_LBUTTONDOWN, WM_LBUTTONUP),
+    'RButton': (WM_RBUTTONDOWN, WM_RBUTTONUP),
+    'MButton': (WM_MBUTTONDOWN, WM_MBUTTONUP),
+}
+NATIVE_MOUSE_KEYS = set(NATIVE_MOUSE_BUTTONS) | {'XButton1', 'XButton2', 'WheelUp', 'WheelDown'}
 
-        try:
-            if os_name == "Windows":
-                if not self._sbc_available:
-                    self.show_message("Brightness control is unavailable because 'screen-brightness-control' is not installed.", "orange")
-                    return
-                try:
-                    import screen_brightness_control as sbc
-                    sbc.set_brightness(level)
-                except Exception as e:
-                    self.show_message(f"Error setting brightness on Windows: {e}", "red")
-                    self.show_message("Ensure you have the necessary permissions and that 'screen-brightness-control' and 'pywin32' are correctly installed.", "red")
+class NativeHotkeyBackend(HotkeyBackend):
+    """
+    In-process hotkeys via WH_KEYBOARD_LL / WH_MOUSE_LL hooks on a dedicated message-loop thread, with
+    no AutoHotkey process. The hooks only match the event (and swallow it for suppressing hotkeys);
+    callbacks run on a separate dispatch thread so a slow callback never stalls system input.
+    """
+    name = "native"
+
+    def __init__(self, modifier_state=None):
+        super().__init__()
+        self.modifier_state = modifier_state or Win32ModifierState()
+        self._triggers = {} # (vk code or mouse key name, MOD_* mask) -> (key, suppress)
+        self._swallow_release = set()
+        self._dispatch_queue = collections.deque()
+        self._dispatch_event = threading.Event()
+        self._hook_thread = None
+        self._hook_thread_id = None
+        self._running = False
+        self._batching = False
+        self.suppressed = 0
+        self.unsupported_keys = set()
+
+    def _rebuild_triggers(self):
+        triggers = {}
+        unsupported_keys = set()
+        for key in self._callbacks:
+            suppress, modifiers, key_name = parse_ahk_hotkey(key)
+            if key_name in NATIVE_MOUSE_KEYS:
+                trigger = key_name
+            else:
+                trigger = NATIVE_KEY_VK.get(key_name.upper() if len(key_name) == 1 else key_name)
+            if trigger is None:
+                unsupported_keys.add(key)
+            else:
+                triggers[(trigger, modifiers)] = (key, suppress)
+        self._triggers = triggers
+        self.unsupported_keys = unsupported_keys
+
+    def add_hotkey(self, key, callback, priority=False):
+        super().add_hotkey(key, callback)
+        if not self._batching:
+            self._rebuild_triggers()
+
+    def remove_hotkey(self, key):
+        super().remove_hotkey(key)
+        if not self._batching:
+            self._rebuild_triggers()
+
+    def begin_update(self):
+        """The hooks keep matching the old trigger table until end_update() swaps in the new one."""
+        self._batching = True
+
+    def end_update(self):
+        self._batching = False
+        self._rebuild_triggers()
+
+    def _match(self, trigger):
+        """Called from a hook: queues the bound callback. Returns True if the event should be swallowed."""
+        binding = self._triggers.get((trigger, self.modifier_state.read()))
+        if binding is None:
+            return False
+        key, suppress = binding
+        self._dispatch_queue.append((key, time.perf_counter()))
+        self._dispatch_event.set()
+        if suppress:
+            self.suppressed += 1
+        return suppress
+
+    def _press(self, trigger):
+        """Handles a key/button press; remembers swallowed presses so their release is swallowed too."""
+        if self._match(trigger):
+            self._swallow_release.add(trigger)
+            return True
+        return False
 
-            elif os_name == "Darwin": # macOS
-                macos_level = level / 100.0
-                try:
-                    script = f'tell application "System Events" to tell process "ControlCenter" to slider 1 of group 1 of group 1 of group 1 of UI element 1 of row 1 of outline 1 of scroll area 1 of group 1 of window "Control Center" to set value to {macos_level}'
-                    subprocess.run(['osascript', '-e', script], check=True)
-                except FileNotFoundError:
-                    self.show_message("Error: 'osascript' command not found. This script requires macOS.", "red")
-                except subprocess.CalledProcessError as e:
-                    self.show_message(f"Error executing osascript: {e}. Could not set brightness. Ensure System Events has permission to control ControlCenter.", "red")
-                except Exception as e:
-                    self.show_message(f"Error setting brightness on macOS: {e}", "red")
+    def _release(self, trigger):
+        if trigger in self._swallow_release:
+            self._swallow_release.discard(trigger)
+            return True
+        return False
 
-            elif os_name == "Linux":
-                linux_level = level / 100.0
-                try:
-                    output = subprocess.run(['xrandr'], capture_output=True, text=True, check=True)
-                    lines = output.stdout.splitlines()
-                    display = None
-                    for line in lines:
-                        if ' connected primary' in line:
-                            display = line.split(' ')[0]
-                            break
+    def _keyboard_proc(self, n_code, w_param, l_param):
+        try:
+            if n_code >= 0:
+                event = ctypes.cast(l_param, ctypes.POINTER(KBDLLHOOKSTRUCT)).contents
+                if not (event.flags & LLKHF_INJECTED):
+                    if w_param in (WM_KEYDOWN, WM_SYSKEYDOWN) and self._press(event.vkCode):
+                        return 1
+                    if w_param in (WM_KEYUP, WM_SYSKEYUP) and self._release(event.vkCode):
+                        return 1
+        except Exception:
+            pass
+        return CallNextHookEx(None, n_code, w_param, l_param)
 
-                    if display:
-                        subprocess.run(['xrandr', '--output', display, '--brightness', str(linux_level)], check=True)
+    def _mouse_proc(self, n_code, w_param, l_param):
+        try:
+            if n_code >= 0:
+                event = ctypes.cast(l_param, ctypes.POINTER(MSLLHOOKSTRUCT)).contents
+                if not (event.flags & LLMHF_INJECTED):
+                    high_word = ctypes.c_short((event.mouseData >> 16) & 0xFFFF).value
+                    if w_param == WM_MOUSEWHEEL:
+                        if self._match('WheelUp' if high_word > 0 else 'WheelDown'):
+                            return 1
+                    elif w_param in (WM_XBUTTONDOWN, WM_XBUTTONUP):
+                        key_name = 'XButton1' if high_word == 1 else 'XButton2'
+                        if (self._press(key_name) if w_param == WM_XBUTTONDOWN else self._release(key_name)):
+                            return 1
                     else:
-                        self.show_message("Could not find primary display using xrandr.", "orange")
-
-                except FileNotFoundError:
-                    self.show_message("Error: 'xrandr' command not found. This script requires xrandr.", "red")
-                except subprocess.CalledProcessError as e:
-                    self.show_message(f"Error executing xrandr: {e}", "red")
+                        for key_name, (down, up) in NATIVE_MOUSE_BUTTONS.items():
+                            if (w_param == down and self._press(key_name)) or (w_param == up and self._release(key_name)):
+                                return 1
+        except Exception:
+            pass
+        return CallNextHookEx(None, n_code, w_param, l_param)
+
+    def _hook_loop(self, ready):
+        self._hook_thread_id = GetCurrentThreadId()
+        # The ctypes callbacks must stay referenced for as long as the hooks are installed.
+        self._keyboard_proc_ref = LowLevelHookProc(self._keyboard_proc)
+        self._mouse_proc_ref = LowLevelHookProc(self._mouse_proc)
+        keyboard_hook = SetWindowsHookExW(WH_KEYBOARD_LL, self._keyboard_proc_ref, None, 0)
+        mouse_hook = SetWindowsHookExW(WH_MOUSE_LL, self._mouse_proc_ref, None, 0)
+        ready.set()
+        msg = ctypes.wintypes.MSG()
+        while GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            pass
+        if keyboard_hook:
+            UnhookWindowsHookEx(keyboard_hook)
+        if mouse_hook:
+            UnhookWindowsHookEx(mouse_hook)
+
+    def _dispatch_loop(self):
+        while self._running:
+            self._dispatch_event.wait()
+            self._dispatch_event.clear()
+            while self._dispatch_queue:
+                key, event_time = self._dispatch_queue.popleft()
+                try:
+                    self._dispatch(key, event_time)
                 except Exception as e:
-                    self.show_message(f"Error setting brightness on Linux: {e}", "red")
+                    print(f"Hotkey callback for '{key}' failed: {e}")
 
-            else:
-                self.show_message(f"Error: Unsupported operating system for brightness control: {os_name}", "red")
+    def start_hotkeys(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._dispatch_loop, name="HotkeyDispatch", daemon=True).start()
+        ready = threading.Event()
+        self._hook_thread = threading.Thread(target=self._hook_loop, args=(ready,), name="HotkeyHooks", daemon=True)
+        self._hook_thread.start()
+        ready.wait(timeout=2)
+
+    def stop_hotkeys(self):
+        if not self._running:
+            return
+        self._running = False
+        self._dispatch_event.set()
+        if self._hook_thread_id:
+            PostThreadMessageW(self._hook_thread_id, WM_QUIT, 0, 0)
+        self._hook_thread.join(timeout=1)
 
-        except Exception as e:
-            self.show_message(f"An unexpected error occurred during brightness control: {e}", "red")
+    def get_stats(self):
+        return dict(super().get_stats(), suppressed=self.suppressed, unsupported_keys=sorted(self.unsupported_keys))
 
-    def _update_brightness_gui(self, new_level=None, delta=0):
-        """
-        Updates the screen brightness and shows a tooltip.
-        This function is scheduled to run on the main GUI thread.
-        """
-        if not self.script_enabled:
-            return
+class ScriptedHotkeyBackend(HotkeyBackend):
+    """A backend driven by press(key) calls (same key syntax as add_hotkey); callbacks run synchronously."""
+    name = "scripted"
 
-        current_brightness_config = self.settings['brightness_levels']
+    def __init__(self):
+        super().__init__()
+        self.running = False
+        self.pressed = []
 
-        # Determine new brightness level
-        if new_level is not None:
-            self.current_brightness_level = new_level
-        elif delta != 0:
-            current_time = time.time() * 1000
-            # Calculate time difference using the dedicated scroll time
-            time_diff = current_time - self.last_brightness_scroll_time
-            self.last_brightness_scroll_time = current_time # Update *here* for fast/slow increment
-
-            if time_diff < current_brightness_config['fast_scroll_threshold_ms'] and time_diff > 0:
-                increment = current_brightness_config['scroll_increment_fast']
-            else:
-                increment = current_brightness_config['scroll_increment_slow']
+    def start_hotkeys(self):
+        self.running = True
 
-            self.current_brightness_level += (increment * delta)
+    def stop_hotkeys(self):
+        self.running = False
 
-        self.current_brightness_level = max(current_brightness_config['min'],
-                                            min(current_brightness_config['max'],
-                                                self.current_brightness_level))
+    def press(self, key):
+        """Fires the hotkey bound to key. Returns False if nothing is bound or the backend is stopped."""
+        self.pressed.append(key)
+        return self.running and self._dispatch(key, time.perf_counter())
 
-        # Apply brightness immediately
-        self._set_screen_brightness(self.current_brightness_level)
+    def bound_keys(self):
+        return sorted(self._callbacks)
 
-        # Show tooltip immediately
-        self.show_tooltip(f"Brightness: {self.current_brightness_level}%")
+def create_hotkey_backend(settings, modifier_state=None):
+    """Returns the hotkey backend selected by settings['hotkey_backend']."""
+    if settings['hotkey_backend'] == 'native':
+        return NativeHotkeyBackend(modifier_state)
+    return AhkHotkeyBackend(settings['ahk_executable_path'])
 
-    def _ahk_brightness_callback(self, action):
-        """
-        Generic callback for AHK hotkeys that modify brightness.
-        This function runs in the AHK hotkey thread, so it schedules GUI updates.
-        """
-        if not self.script_enabled:
-            return
+# --- Command Queue ---
 
-        hotkey_config_str = self.settings['hotkeys'][action]
+Command = collections.namedtuple('Command', ['name', 'handler', 'args', 'enqueued_at'])
 
-        if not self.check_modifiers_match(hotkey_config_str):
-            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
-                print(f"DEBUG: Modifiers mismatch for {action} with hotkey '{hotkey_config_str}'. Current state: Ctrl={self.ahk.key_state('Ctrl')}, Shift={self.ahk.key_state('Shift')}, Alt={self.ahk.key_state('Alt')}, Win={self.ahk.key_state('LWin') or self.ahk.key_state('RWin')}")
-            return
+class CommandQueue:
+    """
+    Lock-protected queue of Commands from hotkey threads to the Tk thread. post() only appends and,
+    if no pump is pending, schedules one; the pump runs every queued command on the Tk thread, then
+    calls on_drained (used to flush the input aggregator once per pump). So a burst of hotkey events
+    costs one Tcl 'after' per interval_ms instead of one per event.
+    """
+    def __init__(self, schedule, interval_ms=16, on_drained=None):
+        self._schedule = schedule
+        self.interval_ms = interval_ms
+        self._on_drained = on_drained
+        self._lock = threading.Lock()
+        self._queue = collections.deque()
+        self._pump_scheduled = False
+        self.posted = 0
+        self.executed = 0
+        self.pumps = 0
+        self.errors = 0
+        self.max_batch = 0
+        self.counts = collections.Counter()
+        self._latency_total_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def post(self, name, handler, *args):
+        """Queues handler(*args) to run on the Tk thread. Safe to call from any thread."""
+        with self._lock:
+            self._queue.append(Command(name, handler, args, time.perf_counter()))
+            self.posted += 1
+            if self._pump_scheduled:
+                return
+            self._pump_scheduled = True
+        self._schedule(self.interval_ms, self.pump)
+
+    def pump(self):
+        """Runs every queued command. Called on the Tk thread."""
+        with self._lock:
+            batch, self._queue = self._queue, collections.deque()
+            self._pump_scheduled = False
+        self.pumps += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        for command in batch:
+            latency_ms = (time.perf_counter() - command.enqueued_at) * 1000
+            self._latency_total_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            self.counts[command.name] += 1
+            self.executed += 1
+            try:
+                command.handler(*command.args)
+            except Exception as e:
+                self.errors += 1
+                print(f"Command '{command.name}' failed: {e}")
+        if self._on_drained:
+            self._on_drained()
+
+    def get_stats(self):
+        """Returns queue and latency counters for diagnostics."""
+        with self._lock:
+            depth = len(self._queue)
+        return {
+            'posted': self.posted,
+            'executed': self.executed,
+            'depth': depth,
+            'pumps': self.pumps,
+            'max_batch': self.max_batch,
+            'avg_latency_ms': round(self._latency_total_ms / self.executed, 2) if self.executed else 0.0,
+            'max_latency_ms': round(self.max_latency_ms, 2),
+            'errors': self.errors,
+            'by_command': dict(self.counts),
+        }
 
-        current_brightness_config = self.settings['brightness_levels']
+# --- Inactivity Scheduling ---
 
-        # Check if this is the start of a new scrolling sequence AND if reset is enabled
-        current_hotkey_time = time.time() * 1000
-        time_since_last_hotkey = current_hotkey_time - self.last_brightness_hotkey_press_time
-        
-        # A longer timeout to detect end of scroll sequence
-        if time_since_last_hotkey > SCROLL_SEQUENCE_TIMEOUT_MS:
-            self.is_brightness_scrolling = False
-
-        if not self.is_brightness_scrolling and current_brightness_config['reset_on_scroll_start']:
-            self.current_brightness_level = current_brightness_config['initial']
-            self.is_brightness_scrolling = True
-        elif not self.is_brightness_scrolling and not current_brightness_config['reset_on_scroll_start']:
-            self.is_brightness_scrolling = True
-        
-        self.last_brightness_hotkey_press_time = current_hotkey_time # Update last hotkey press time for next check
-
-        if action == 'increase_brightness':
-            self.root.after(0, lambda: self._update_brightness_gui(delta=1))
-        elif action == 'decrease_brightness':
-            self.root.after(0, lambda: self._update_brightness_gui(delta=-1))
-        elif action == 'set_80_percent_brightness':
-            self.root.after(0, lambda: self._update_brightness_gui(new_level=current_brightness_config['preset_xbutton2']))
-            self.is_brightness_scrolling = False # Presets are not part of a scroll sequence
-        elif action == 'set_0_percent_brightness':
-            self.root.after(0, lambda: self._update_brightness_gui(new_level=current_brightness_config['preset_xbutton1']))
-            self.is_brightness_scrolling = False # Presets are not part of a scroll sequence
+class InactivityScheduler:
+    """
+    Tracks when each window was last active on a monotonic clock and wakes only when the earliest
+    deadline (last active + delay_ms) passes. Deadlines live in a heap; entries made stale by a later
+    touch are skipped when popped. Windows whose deadline passed move to an expired pool, which is
+    handed (oldest first) to on_expired so the caller can honour the ignore count. A wake that comes
+    far later than planned (resume from sleep) shifts every deadline by the gap instead of expiring
+    everything at once.
+    """
+    SUSPEND_GAP_THRESHOLD_S = 5.0
+    MIN_WAKE_MS = 50
+
+    def __init__(self, schedule, cancel, on_expired, delay_ms=15000, clock=time.monotonic):
+        self._schedule = schedule
+        self._cancel = cancel
+        self._on_expired = on_expired
+        self.delay_s = delay_ms / 1000
+        self._clock = clock
+        self.enabled = True
+        self._last_active = {}
+        self._heap = []
+        self._expired = set()
+        self._timer = None
+        self._timer_due = None
+        self.wakes = 0
+        self.stale_entries = 0
+        self.suspend_shifts = 0
+
+    def _push(self, hwnd):
+        heapq.heappush(self._heap, (self._last_active[hwnd] + self.delay_s, hwnd))
+
+    def touch(self, hwnd):
+        """Marks hwnd active now (e.g. it became the foreground window)."""
+        self._last_active[hwnd] = self._clock()
+        self._expired.discard(hwnd)
+        self._push(hwnd)
+        if self._timer is None:
+            self._arm()
+
+    def track(self, hwnd):
+        """Starts tracking hwnd as active now, unless it is already tracked."""
+        if hwnd not in self._last_active:
+            self.touch(hwnd)
+
+    def forget(self, hwnd):
+        """Stops tracking hwnd (closed or hidden); its heap entry is dropped lazily."""
+        self._last_active.pop(hwnd, None)
+        self._expired.discard(hwnd)
+
+    def reset(self):
+        """Forgets every window."""
+        self._last_active.clear()
+        self._heap.clear()
+        self._expired.clear()
+        self._disarm()
+
+    def set_delay_ms(self, delay_ms):
+        """Changes the inactivity delay and recomputes every deadline."""
+        self.delay_s = delay_ms / 1000
+        self._rebuild()
+
+    def set_enabled(self, enabled):
+        """Pauses (no timer at all) or resumes the scheduler."""
+        self.enabled = enabled
+        if enabled:
+            self._arm()
         else:
-            self.show_message(f"Unhandled AHK hotkey action for brightness: {action}", "orange")
+            self._disarm()
+
+    def stop(self):
+        self._disarm()
+
+    def _rebuild(self):
+        self._heap = [(last_active + self.delay_s, hwnd) for hwnd, last_active in self._last_active.items()
+                      if hwnd not in self._expired]
+        heapq.heapify(self._heap)
+        self._disarm()
+        self._arm()
+
+    def _disarm(self):
+        if self._timer is not None:
+            self._cancel(self._timer)
+        self._timer = None
+        self._timer_due = None
+
+    def _arm(self):
+        """Schedules a wake for the earliest valid deadline, if any."""
+        if not self.enabled:
+            return
+        while self._heap:
+            deadline, hwnd = self._heap[0]
+            if self._last_active.get(hwnd) is not None and self._last_active[hwnd] + self.delay_s == deadline and hwnd not in self._expired:
+                break
+            heapq.heappop(self._heap)
+            self.stale_entries += 1
+        if not self._heap:
+            return
+        deadline = self._heap[0][0]
+        wait_ms = max(self.MIN_WAKE_MS, int((deadline - self._clock()) * 1000) + 1)
+        self._timer_due = self._clock() + wait_ms / 1000
+        self._timer = self._schedule(wait_ms, self._wake)
+
+    def _wake(self):
+        timer_due = self._timer_due
+        self._timer = None
+        self._timer_due = None
+        self.wakes += 1
+        now = self._clock()
+        if timer_due is not None and now - timer_due > self.SUSPEND_GAP_THRESHOLD_S:
+            # The machine was most likely suspended: nobody was inactive during the gap.
+            gap = now - timer_due
+            self.suspend_shifts += 1
+            for hwnd in self._last_active:
+                self._last_active[hwnd] += gap
+            self._rebuild()
+            return
+        newly_expired = False
+        while self._heap and self._heap[0][0] <= now:
+            deadline, hwnd = heapq.heappop(self._heap)
+            last_active = self._last_active.get(hwnd)
+            if last_active is None or last_active + self.delay_s != deadline:
+                self.stale_entries += 1
+                continue
+            self._expired.add(hwnd)
+            newly_expired = True
+        if newly_expired:
+            self.evaluate()
+        self._arm()
+
+    def evaluate(self):
+        """Hands the expired pool to on_expired as [(last_active, hwnd)], oldest first."""
+        if self._expired and self.enabled:
+            self._on_expired(sorted((self._last_active[hwnd], hwnd) for hwnd in self._expired))
+
+    def get_stats(self):
+        """Returns scheduler counters for diagnostics."""
+        next_wake_ms = None
+        if self._timer_due is not None:
+            next_wake_ms = max(0, int((self._timer_due - self._clock()) * 1000))
+        return {
+            'tracked': len(self._last_active),
+            'expired': len(self._expired),
+            'heap': len(self._heap),
+            'wakes': self.wakes,
+            'stale_entries': self.stale_entries,
+            'suspend_shifts': self.suspend_shifts,
+            'next_wake_ms': next_wake_ms,
+        }
 
-    def _should_window_be_dynamically_managed(self, hwnd, is_foreground):
-        """
-        Determines if a given window should be actively managed for dynamic transparency
-        based on current settings and its foreground status.
-        If it should be managed, it's added to self.managed_by_script_hwnds.
-        """
-        if not self.settings['dynamic_transparency_enabled']:
-            return False
+# --- Periodic Tasks ---
+
+class PeriodicTask:
+    """A task owned by PeriodicScheduler, with its current (backed-off) interval and run counters."""
+    def __init__(self, name, callback, interval_ms, enabled, max_backoff):
+        self.name = name
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.enabled = enabled
+        self.max_backoff = max_backoff
+        self.current_interval_ms = None
+        self.due = None
+        self.runs = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.backoffs = 0
+        self.errors = 0
+
+    def base_interval_ms(self):
+        return self.interval_ms() if callable(self.interval_ms) else self.interval_ms
+
+    def is_active(self):
+        return self.base_interval_ms() > 0 and self.enabled()
+
+class PeriodicScheduler:
+    """
+    Runs the app's periodic tasks from a single root.after timer armed for the earliest due task.
+    A callback returns True when it saw a change; otherwise its task backs off (interval doubled, up to
+    max_backoff times its base interval) and snaps back to the base interval on the next change.
+    Tasks whose enabled() predicate is False (or whose interval is 0) are paused with no timer at all;
+    call refresh() after changing anything a predicate or interval depends on.
+    """
+    BACKOFF_STEP = 2
+
+    def __init__(self, schedule, cancel, clock=time.perf_counter):
+        self._schedule = schedule
+        self._cancel = cancel
+        self._clock = clock
+        self._tasks = {}
+        self._timer = None
+        self._timer_due = None
+        self.timer_wakes = 0
+        self._started_at = clock()
+
+    def add_task(self, name, callback, interval_ms, enabled=None, max_backoff=1):
+        """Registers a task. interval_ms may be a number or a callable returning one (0 = paused)."""
+        self._tasks[name] = PeriodicTask(name, callback, interval_ms, enabled or (lambda: True), max_backoff)
+
+    def refresh(self):
+        """Pauses tasks that became inactive and starts (runs promptly) tasks that became active."""
+        now = self._clock()
+        for task in self._tasks.values():
+            if not task.is_active():
+                task.due = None
+                task.current_interval_ms = None
+            elif task.due is None:
+                task.current_interval_ms = task.base_interval_ms()
+                task.due = now
+        self._arm()
+
+    def wake(self, name):
+        """Activity outside the task's own callback: run it now at its base interval."""
+        task = self._tasks[name]
+        if task.is_active():
+            task.current_interval_ms = task.base_interval_ms()
+            task.due = self._clock()
+        self._arm()
+
+    def stop(self):
+        """Pauses every task."""
+        for task in self._tasks.values():
+            task.due = None
+        if self._timer is not None:
+            self._cancel(self._timer)
+        self._timer = None
+        self._timer_due = None
+
+    def _arm(self):
+        next_due = min((task.due for task in self._tasks.values() if task.due is not None), default=None)
+        if self._timer is not None and (next_due is None or self._timer_due > next_due):
+            self._cancel(self._timer)
+            self._timer = None
+        if next_due is None or self._timer is not None:
+            return
+        self._timer_due = next_due
+        self._timer = self._schedule(max(0, int((next_due - self._clock()) * 1000)), self._tick)
+
+    def _tick(self):
+        self._timer = None
+        self.timer_wakes += 1
+        now = self._clock()
+        for task in list(self._tasks.values()):
+            if task.due is None or task.due > now + 0.001:
+                continue
+            if not task.is_active():
+                task.due = None
+                continue
+            start = self._clock()
+            changed = False
+            try:
+                changed = task.callback()
+            except Exception as e:
+                task.errors += 1
+                print(f"Periodic task '{task.name}' failed: {e}")
+            elapsed_ms = (self._clock() - start) * 1000
+            task.runs += 1
+            task.total_ms += elapsed_ms
+            task.max_ms = max(task.max_ms, elapsed_ms)
+            if not task.is_active():
+                task.due = None
+                task.current_interval_ms = None
+                continue
+            base_ms = task.base_interval_ms()
+            if changed or task.current_interval_ms is None:
+                interval_ms = base_ms
+            else:
+                interval_ms = min(task.current_interval_ms * self.BACKOFF_STEP, base_ms * task.max_backoff)
+                interval_ms = max(interval_ms, base_ms)
+                if interval_ms > task.current_interval_ms:
+                    task.backoffs += 1
+            task.current_interval_ms = interval_ms
+            task.due = self._clock() + interval_ms / 1000
+        self._arm()
+
+    def get_stats(self):
+        """Returns per-task run counts and time spent, plus the overall share of one core used."""
+        wall_ms = max((self._clock() - self._started_at) * 1000, 1e-9)
+        tasks = {}
+        total_ms = 0.0
+        for task in self._tasks.values():
+            total_ms += task.total_ms
+            tasks[task.name] = {
+                'active': task.due is not None,
+                'interval_ms': task.current_interval_ms,
+                'runs': task.runs,
+                'total_ms': round(task.total_ms, 3),
+                'avg_ms': round(task.total_ms / task.runs, 3) if task.runs else None,
+                'max_ms': round(task.max_ms, 3),
+                'backoffs': task.backoffs,
+                'errors': task.errors,
+            }
+        return {
+            'timer_wakes': self.timer_wakes,
+            'busy_pct': round(total_ms / wall_ms * 100, 4),
+            'tasks': tasks,
+        }
 
-        if not win32gui.IsWindow(hwnd) or not win32gui.IsWindowVisible(hwnd) or not win32gui.GetWindowText(hwnd):
-            # Invalid or invisible windows should not be managed
-            if hwnd in self.managed_by_script_hwnds:
-                self.managed_by_script_hwnds.discard(hwnd)
-            return False
+# --- Time-Sliced Jobs ---
 
-        if self._is_window_excluded(hwnd):
-            # Excluded windows are never dynamically managed
-            if hwnd in self.managed_by_script_hwnds:
-                self.managed_by_script_hwnds.discard(hwnd)
-            return False
+class TimeSlicedJob:
+    """
+    Works through items on the loop's thread a slice at a time: each slice processes items until
+    slice_ms has passed (always at least one), then yields to the loop for gap_ms so input and painting
+    get a turn. Items are handled in the order given, so callers put the urgent ones first.
+    on_progress(done, total) runs after every slice and on_done() once, when the last item is handled.
+    """
+    def __init__(self, schedule, cancel, items, process, slice_ms=8, gap_ms=16, on_progress=None, on_done=None,
+                 clock=time.perf_counter):
+        self._schedule = schedule
+        self._cancel = cancel
+        self.items = list(items)
+        self._process = process
+        self.slice_ms = slice_ms
+        self.gap_ms = gap_ms
+        self._on_progress = on_progress
+        self._on_done = on_done
+        self._clock = clock
+        self.done = 0
+        self.finished = False
+        self._timer = None
+        self._started_at = None
+        self.elapsed_ms = None
+        self.slices = 0
+        self.max_slice_ms = 0.0
+        self.errors = 0
+
+    def start(self):
+        self._started_at = self._clock()
+        self._timer = self._schedule(0, self._run_slice)
+
+    def cancel(self):
+        """Stops after the current item; the remaining items are never processed."""
+        if self._timer is not None:
+            self._cancel(self._timer)
+            self._timer = None
+
+    def _run_slice(self):
+        self._timer = None
+        start = self._clock()
+        deadline = start + self.slice_ms / 1000
+        while self.done < len(self.items):
+            try:
+                self._process(self.items[self.done])
+            except Exception as e:
+                self.errors += 1
+                print(f"Time-sliced job item {self.items[self.done]!r} failed: {e}")
+            self.done += 1
+            if self._clock() >= deadline:
+                break
+        self.slices += 1
+        self.max_slice_ms = max(self.max_slice_ms, (self._clock() - start) * 1000)
+        if self._on_progress:
+            self._on_progress(self.done, len(self.items))
+        if self.done < len(self.items):
+            self._timer = self._schedule(self.gap_ms, self._run_slice)
+            return
+        self.finished = True
+        self.elapsed_ms = (self._clock() - self._started_at) * 1000
+        if self._on_done:
+            self._on_done()
+
+    def get_stats(self):
+        """Returns progress and slice timing for diagnostics."""
+        return {
+            'done': self.done,
+            'total': len(self.items),
+            'finished': self.finished,
+            'slices': self.slices,
+            'max_slice_ms': round(self.max_slice_ms, 3),
+            'elapsed_ms': round(self.elapsed_ms, 1) if self.elapsed_ms is not None else None,
+            'errors': self.errors,
+        }
 
-        if self.settings['manage_all_windows_dynamically']:
-            # If 'Manage ALL' is ON, all non-excluded, valid windows are managed.
-            self.managed_by_script_hwnds.add(hwnd)
-            return True
-        else:
-            # If 'Manage ALL' is OFF:
-            # 1. If 'Inactive Window Manual Update' is ON, and this window just became foreground,
-            #    it should be added to managed_by_script_hwnds.
-            if is_foreground and self.settings['inactive_window_auto_update']:
-                self.managed_by_script_hwnds.add(hwnd)
-                return True
-            # 2. Otherwise, it's only managed if it was ALREADY in managed_by_script_hwnds
-            #    (e.g., from 'apply_transparency_to_new_windows' or hotkey action).
-            return hwnd in self.managed_by_script_hwnds
+# --- Engine Loop ---
 
-    def _apply_dynamic_transparency(self, new_fg_hwnd, old_fg_hwnd):
-        """Applies active/inactive transparency based on foreground window change."""
-        # Handle minimization/restoration based on foreground window change (always run this)
-        self._restore_minimized_windows_on_focus_change(new_fg_hwnd, old_fg_hwnd)
+class EngineLoop:
+    """
+    The thread the engine runs on: timers with Tk's after/after_cancel signatures, plus run and stop.
+    after may be called from any thread; callbacks always run on the loop's thread.
+    """
+    name = "none"
+    pumps_window_messages = False # Whether WinEvent hooks installed on the loop's thread get delivered
 
-        # Only proceed with transparency logic if dynamic transparency is enabled
-        if not self.settings['dynamic_transparency_enabled']:
-            # If dynamic transparency is OFF, ensure any windows that were managed
-            # and are now *not* supposed to be managed (e.g., manage_all was turned off)
-            # are removed from the managed set. Do NOT restore transparency here.
-            # The _reapply_dynamic_transparency_on_all_windows handles the cleanup.
-            return
+    def after(self, ms, callback):
+        raise NotImplementedError
 
-        # Process the new foreground window for transparency
-        if self._should_window_be_dynamically_managed(new_fg_hwnd, is_foreground=True):
-            target_level = self.settings['active_window_transparency']
-            set_transparency_for_hwnd(new_fg_hwnd, target_level)
-            # self.show_message(f"Set {get_window_exe_name(new_fg_hwnd)} to ACTIVE ({target_level}%)", "purple")
-        elif new_fg_hwnd in self.managed_by_script_hwnds:
-            # If it was managed but now _should_window_be_dynamically_managed returned False
-            # (e.g., settings changed, or it's no longer foreground and not managed by other means)
-            # Restore to 100% and remove from managed set.
-            set_transparency_for_hwnd(new_fg_hwnd, 100)
-            self.managed_by_script_hwnds.discard(new_fg_hwnd)
+    def after_cancel(self, timer_id):
+        raise NotImplementedError
 
+    def run(self):
+        raise NotImplementedError
 
-        # Process the old foreground window (now inactive) for transparency
-        if old_fg_hwnd and old_fg_hwnd != new_fg_hwnd:
-            if self._should_window_be_dynamically_managed(old_fg_hwnd, is_foreground=False):
-                target_level = self.settings['inactive_window_transparency']
-                set_transparency_for_hwnd(old_fg_hwnd, target_level)
-                # self.show_message(f"Set {get_window_exe_name(old_fg_hwnd)} to INACTIVE ({target_level}%)", "purple")
-            elif old_fg_hwnd in self.managed_by_script_hwnds:
-                # If it was managed but now _should_window_be_dynamically_managed returned False
-                # Restore to 100% and remove from managed set.
-                set_transparency_for_hwnd(old_fg_hwnd, 100)
-                self.managed_by_script_hwnds.discard(old_fg_hwnd)
+    def stop(self):
+        raise NotImplementedError
 
-    def _reapply_dynamic_transparency_on_all_windows(self, force_all=False):
-        """
-        Re-evaluates and applies dynamic transparency to windows.
-        If force_all is True, it enumerates all visible windows and adds them to managed_by_script_hwnds
-        (if not excluded). Otherwise, it only processes windows already in managed_by_script_hwnds.
-        """
-        current_fg_hwnd = win32gui.GetForegroundWindow()
-        
-        windows_to_check = set()
-        if force_all or self.settings['manage_all_windows_dynamically'] or self.settings['inactive_window_auto_update']:
-            # Enumerate all visible windows if 'manage_all' is ON, or if 'manual update' is ON (to catch potential new ones), or if forced.
-            def enum_all_callback(hwnd, extra):
-                if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd) != "":
-                    # Skip our own UI
-                    if hwnd != self.root.winfo_id() and \
-                       hwnd != self.tooltip_window.winfo_id() and \
-                       not (self.changer_window and hwnd == self.changer_window.winfo_id()):
-                        windows_to_check.add(hwnd)
-                return True
-            win32gui.EnumWindows(enum_all_callback, None)
-        
-        # Also include any windows currently in managed_by_script_hwnds that might not be visible anymore
-        # but we need to process for removal.
-        windows_to_check.update(self.managed_by_script_hwnds)
+class TkEngineLoop(EngineLoop):
+    """Runs the engine on the Tk main loop, alongside the settings panel."""
+    name = "tk"
+    pumps_window_messages = True
 
-        # This set will hold HWNDs that are actually managed for dynamic transparency in this cycle.
-        current_cycle_dynamically_managed_hwnds = set()
-        
-        # Determine which windows should be managed dynamically in this cycle
-        for hwnd in list(windows_to_check):
-            # Check if it should be managed (this also updates self.managed_by_script_hwnds)
-            if self._should_window_be_dynamically_managed(hwnd, is_foreground=(hwnd == current_fg_hwnd)):
-                current_cycle_dynamically_managed_hwnds.add(hwnd)
-            elif hwnd in self.managed_by_script_hwnds:
-                # If it was managed but now _should_window_be_dynamically_managed returned False,
-                # remove it from the managed set. Do NOT restore transparency here,
-                # as per user request (unless dynamic_transparency_enabled is OFF, then
-                # it should retain its last transparency).
-                self.managed_by_script_hwnds.discard(hwnd)
+    def __init__(self, root):
+        self.root = root
 
-        # Apply dynamic transparency to the determined set of windows
-        if self.settings['dynamic_transparency_enabled']:
-            for hwnd in current_cycle_dynamically_managed_hwnds:
-                if hwnd == current_fg_hwnd:
-                    set_transparency_for_hwnd(hwnd, self.settings['active_window_transparency'])
-                else:
-                    set_transparency_for_hwnd(hwnd, self.settings['inactive_window_transparency'])
-        else:
-            # If dynamic transparency is OFF, we should not apply any transparency here.
-            # Windows should retain their last set transparency.
-            pass
+    def after(self, ms, callback):
+        return self.root.after(ms, callback)
 
-        # Final cleanup: Any windows that are still in `self.managed_by_script_hwnds` but
-        # were NOT in `current_cycle_dynamically_managed_hwnds` (meaning they are no longer
-        # considered managed by the current settings) should be removed from `self.managed_by_script_hwnds`.
-        # Their transparency should *not* be restored to 100% here if dynamic is off,
-        # unless `force_all` is true and it implies a full reset (e.g. from exclusion list change).
-        
-        # If dynamic_transparency_enabled is OFF, we just remove from tracking.
-        # If it's ON, but a window is no longer managed, we restore it to 100%.
-        hwnds_to_cleanup = self.managed_by_script_hwnds.difference(current_cycle_dynamically_managed_hwnds)
-        for hwnd in list(hwnds_to_cleanup):
-            if win32gui.IsWindow(hwnd) and not self._is_window_excluded(hwnd) and self.settings['dynamic_transparency_enabled']:
-                # Only restore to 100% if dynamic is ON and it's no longer managed.
-                set_transparency_for_hwnd(hwnd, 100)
-            self.managed_by_script_hwnds.discard(hwnd)
+    def after_cancel(self, timer_id):
+        self.root.after_cancel(timer_id)
 
-    def restore_all_managed_to_full_opacity(self): # NEW: Method for the button
-        """Restores all windows currently managed by the script to 100% opacity."""
-        self.show_message("Restoring all managed windows to 100% opacity.", "blue")
-        self._restore_managed_transparency_to_full_opacity() # Call the internal helper
-        self.show_tooltip("All managed windows restored to 100%.")
+    def run(self):
+        self.root.mainloop()
 
-    def _restore_managed_transparency_to_full_opacity(self):
-        """Restores all windows currently managed by the script to 100% opacity,
-        unless they are currently in the exclusion list. Excluded windows are simply
-        removed from the managed set without their transparency being altered by the script."""
-        
-        hwnds_to_remove = set()
-        for hwnd in list(self.managed_by_script_hwnds): # Iterate a copy for safe modification
-            if not win32gui.IsWindow(hwnd):
-                hwnds_to_remove.add(hwnd)
+    def stop(self):
+        self.root.destroy()
+
+class HeadlessEngineLoop(EngineLoop):
+    """
+    A timer heap on the thread that calls run(), for running without a GUI toolkit. It sleeps until the
+    earliest timer is due or another thread calls after(). Windows messages are not pumped, so the engine
+    polls instead of installing WinEvent hooks.
+    """
+    name = "headless"
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._heap = [] # (due, timer id); entries of cancelled timers are skipped when popped
+        self._callbacks = {}
+        self._next_id = 0
+        self._running = False
+        self.callbacks_run = 0
+        self.errors = 0
+
+    def after(self, ms, callback):
+        with self._condition:
+            self._next_id += 1
+            self._callbacks[self._next_id] = callback
+            heapq.heappush(self._heap, (self._clock() + ms / 1000, self._next_id))
+            self._condition.notify()
+            return self._next_id
+
+    def after_cancel(self, timer_id):
+        with self._condition:
+            self._callbacks.pop(timer_id, None)
+
+    def _pop_due(self):
+        """Returns (callback, 0) for a due timer, else (None, seconds until the next one or None). Caller holds the lock."""
+        while self._heap:
+            due, timer_id = self._heap[0]
+            if timer_id not in self._callbacks:
+                heapq.heappop(self._heap)
                 continue
+            wait = due - self._clock()
+            if wait > 0:
+                return None, wait
+            heapq.heappop(self._heap)
+            return self._callbacks.pop(timer_id), 0
+        return None, None
+
+    def _run_callback(self, callback):
+        self.callbacks_run += 1
+        try:
+            callback()
+        except Exception as e:
+            self.errors += 1
+            print(f"Engine loop callback failed: {e}")
+
+    def run_pending(self):
+        """Runs every callback that is due now, without waiting. Returns how many ran."""
+        ran = 0
+        while True:
+            with self._condition:
+                callback, _ = self._pop_due()
+            if callback is None:
+                return ran
+            self._run_callback(callback)
+            ran += 1
+
+    def run(self):
+        self._running = True
+        while self._running:
+            with self._condition:
+                callback, wait = self._pop_due()
+                if callback is None:
+                    self._condition.wait(wait)
+                    continue
+            self._run_callback(callback)
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def get_stats(self):
+        with self._condition:
+            return {'pending': len(self._callbacks), 'callbacks_run': self.callbacks_run, 'errors': self.errors}
+
+# --- Transparency Engine ---
+
+
+class TransparencyEngine:
+    """
+    The window policy, monitoring and hotkey logic, with no GUI toolkit in it. Everything runs on the
+    thread of loop (an EngineLoop); hotkey and worker threads only post commands to it. Run it on a
+    HeadlessEngineLoop for a background process, or use TransparencyControllerApp, which adds the
+    settings panel on top and overrides the UI hooks (show_tooltip, update_status_label, ...).
+    """
+    # If the engine thread has not picked up the kill hotkey within this long, the hotkey thread exits the process,
+    # after restoring windows for at most KILL_SCRIPT_RESTORE_TIMEOUT_S.
+    KILL_SCRIPT_FALLBACK_S = 3.0
+    KILL_SCRIPT_RESTORE_TIMEOUT_S = 2.0
+
+    def __init__(self, loop, win_event_source=None, modifier_state=None, hotkey_backend=None, window_system=None,
+                 brightness_backend=None, settings_file=SETTINGS_FILE):
+        self._created_at = time.perf_counter()
+        self.startup_timings = {} # phase -> ms after construction began, see _mark_startup
+        self.loop = loop
+        self.window_system = window_system or Win32WindowSystem()
+
+        self.settings_store = SettingsPersistence(settings_file)
+        self.load_settings()
+        self._mark_startup('settings_loaded')
 
-            # This function is explicitly for restoring to full opacity.
-            # If a window is excluded, we still remove it from managed_by_script_hwnds,
-            # but we don't attempt to set its transparency.
-            if not self._is_window_excluded(hwnd):
-                set_transparency_for_hwnd(hwnd, 100)
-            hwnds_to_remove.add(hwnd) # Always remove from tracking after processing
+        self.current_transparency_level = self.settings['transparency_levels']['initial']
+        self.script_enabled = self.settings['script_enabled']
+        self.focus_mode_active = self.settings['focus_mode_active']
+        self.last_processed_hwnd = None
 
-        # Remove all processed HWNDs from the managed set
-        self.managed_by_script_hwnds.difference_update(hwnds_to_remove)
+        # NEW: Brightness control state
+        self.current_brightness_level = self.settings['brightness_levels']['initial']
+        self.is_brightness_scrolling = False
+        self.last_brightness_hotkey_press_time = 0 # NEW: For tracking hotkey presses for reset_on_scroll_start
 
+        # NEW: Transparency scrolling state
+        self.is_transparency_scrolling = False # NEW
+        self.last_transparency_hotkey_press_time = 0 # NEW
 
-    def _reset_inactivity_tracking_state(self):
-        """
-        Resets the internal state related to window inactivity tracking.
-        Clears tracking data, but does NOT force restore previously minimized windows.
-        Restoration will happen naturally if a minimized window gains focus.
-        Re-initializes window_last_active_time for all currently visible, non-excluded windows.
-        """
-        self.show_message("Resetting window inactivity tracking state...", "blue")
-        
-        # 1. Clear windows minimized by the script from tracking, but do NOT restore them.
-        self.minimized_by_script_hwnds.clear()
-        
-        # 2. Clear all inactivity tracking data
-        self.window_last_active_time.clear()
+        self.last_foreground_hwnd = None
+        self.processed_new_windows = set()
+        self.managed_by_script_hwnds = set()
+        self.minimized_by_script_hwnds = set()
+        self.initial_script_start_hwnds = set()
 
-        # 3. Re-populate window_last_active_time for all currently visible, non-excluded windows
-        current_time_ms = time.time() * 1000
-        
-        def callback(hwnd, extra):
-            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd) != "":
-                # Skip our own UI and excluded windows
-                if hwnd != self.root.winfo_id() and \
-                   hwnd != self.tooltip_window.winfo_id() and \
-                   not (self.changer_window and hwnd == self.changer_window.winfo_id()) and \
-                   not self._is_window_excluded(hwnd):
-                    self.window_last_active_time[hwnd] = current_time_ms
-            return True
-        win32gui.EnumWindows(callback, None)
+        # Event-driven window tracking. Falls back to polling if the hooks cannot be installed.
+        self.win_event_source = win_event_source
+        self.window_registry = WindowRegistry(self._is_trackable_window, self._on_window_appeared, self._on_window_closed)
+        self.safe_win32 = SafeWin32(self.settings['win32_call_timeout_ms'], window_system=self.window_system)
+        self.window_snapshots = WindowSnapshotService(self.settings['window_snapshot_max_age_ms'],
+                                                      scanner=WindowScanner(self.window_system, self.safe_win32),
+                                                      max_stale_ms=self.settings['window_snapshot_max_stale_ms'])
+        self._window_list_changed = False
+        self.window_metadata = WindowMetadataCache(self.settings['window_metadata_revalidate_ms'], self.window_system)
+        self.exclusion_matcher = ExclusionMatcher(self.settings['global_transparency_exclusions'])
+        self.transparency = TransparencyReconciler(self.safe_win32, self.window_metadata.get_exe_name)
+        self.inactivity = InactivityScheduler(self.loop.after, self.loop.after_cancel, self._minimize_expired_windows,
+                                              self.settings['minimize_inactive_delay_ms'])
+        self.inactivity.set_enabled(self.settings['minimize_inactive_windows'])
+        self.modifier_state = modifier_state or Win32ModifierState()
+        self.input_aggregator = InputAggregator(None, self._apply_aggregated_input)
+        self.commands = CommandQueue(self.loop.after, self.settings['input_coalesce_interval_ms'],
+                                     on_drained=self.input_aggregator.flush)
+        # Windows are enumerated on a worker thread; snapshots come back through the command queue.
+        self.window_scan_worker = WindowScanWorker(self.window_snapshots.scanner, self._post_window_snapshot,
+                                                   self.settings['window_snapshot_max_age_ms'])
+        self.window_snapshots.attach_worker(self.window_scan_worker)
+        self.startup_pass = None # TimeSlicedJob for 'Apply on Script Start', see _on_initial_snapshot()
+        self._initial_snapshot_pending = False
+        self._kill_fallback_timer = None # Started by kill_script, see KILL_SCRIPT_FALLBACK_S
+        self._kill_handled = threading.Event()
+        self.foreground_hook_active = False
+        self.window_events_active = False
+        self.foreground_poll_count = 0
+        self.foreground_event_count = 0
+
+        # All polling loops share one timer; checks that see no change back off until something happens.
+        max_backoff = self.settings['idle_poll_max_backoff']
+        self.periodic = PeriodicScheduler(self.loop.after, self.loop.after_cancel)
+        self.periodic.add_task('foreground', self._check_foreground_window, self._get_foreground_poll_interval_ms,
+                               enabled=lambda: self.script_enabled, max_backoff=max_backoff)
+        self.periodic.add_task('new_windows', self._check_for_new_windows, self._get_new_window_poll_interval_ms,
+                               enabled=lambda: not self._is_new_window_processing_paused(), max_backoff=max_backoff)
+
+        self.hotkey_backend = hotkey_backend or create_hotkey_backend(self.settings, self.modifier_state)
 
-        # Also ensure the current foreground window is marked active
-        fg_hwnd = win32gui.GetForegroundWindow()
-        if fg_hwnd and win32gui.IsWindow(fg_hwnd) and not self._is_window_excluded(fg_hwnd):
-            self.window_last_active_time[fg_hwnd] = current_time_ms
-            
-        self.show_message("Inactivity tracking state reset.", "blue")
+        self._initialize_hotkey_maps()
+        self.hotkey_bindings = HotkeyBindings(self.hotkey_backend.add_hotkey, self.hotkey_backend.remove_hotkey,
+                                              self.hotkey_backend.begin_update, self.hotkey_backend.end_update)
 
-    def _start_window_monitoring(self):
-        """Starts the periodic checks for foreground window changes, new windows, and inactive windows."""
-        self._check_foreground_window()
-        self._check_for_new_windows()
-        self._check_for_inactive_windows() # NEW: Start inactive window monitoring
+        # screen_brightness_control is imported on the first brightness change, not here
+        self.brightness_worker = BrightnessWorker(brightness_backend or PlatformBrightnessBackend(), self._on_brightness_error)
+        self._mark_startup('components_ready')
 
-    def _check_for_inactive_windows(self):
-        """Periodically checks for inactive windows and minimizes them based on settings."""
-        if not self.settings['minimize_inactive_windows']:
-            self.window_monitor_inactivity_timer = self.root.after(self.settings['window_monitor_interval_ms'], self._check_for_inactive_windows)
-            return
+    def start(self):
+        """
+        Starts hotkeys and window monitoring and asks the scan worker for the first window snapshot; the
+        startup settings are applied when it arrives (_on_initial_snapshot). Call once, on the loop's thread.
+        """
+        self.hotkey_backend.start_hotkeys()
+        self._mark_startup('hotkey_backend_started')
 
-        current_time_ms = time.time() * 1000
-        current_fg_hwnd = win32gui.GetForegroundWindow()
-        
-        # Clean up window_last_active_time for invalid HWNDs
-        for hwnd in list(self.window_last_active_time.keys()):
-            if not win32gui.IsWindow(hwnd):
-                del self.window_last_active_time[hwnd]
-                self.minimized_by_script_hwnds.discard(hwnd)
-                self.managed_by_script_hwnds.discard(hwnd) # Also remove from managed if invalid
-                self.processed_new_windows.discard(hwnd)
-                self.initial_script_start_hwnds.discard(hwnd)
-                continue
+        self.register_hotkeys()
+        self._mark_startup('hotkeys_live')
+        self.update_status_label()
 
-        # Update last active time for foreground window
-        if current_fg_hwnd and win32gui.IsWindow(current_fg_hwnd):
-            self.window_last_active_time[current_fg_hwnd] = current_time_ms
+        # Enumerating every window (and reading its metadata) is the slow part of startup: leave it to the worker.
+        self._initial_snapshot_pending = True
+        self.window_snapshots.request_refresh()
 
-        inactive_candidates = []
-        for hwnd in list(self.initial_script_start_hwnds.union(self.processed_new_windows)): # Consider all known windows
-            if not win32gui.IsWindow(hwnd) or not win32gui.IsWindowVisible(hwnd) or not win32gui.GetWindowText(hwnd):
-                # Clean up invalid/invisible windows
-                self.initial_script_start_hwnds.discard(hwnd)
-                self.processed_new_windows.discard(hwnd)
-                self.managed_by_script_hwnds.discard(hwnd)
-                self.minimized_by_script_hwnds.discard(hwnd)
-                if hwnd in self.window_last_active_time:
-                    del self.window_last_active_time[hwnd]
-                continue
+        self._start_window_monitoring()
+        self._mark_startup('monitoring_started')
 
-            # Skip our own UI, foreground window, and excluded windows
-            if hwnd == self.root.winfo_id() or \
-               hwnd == self.tooltip_window.winfo_id() or \
-               (self.changer_window and hwnd == self.changer_window.winfo_id()) or \
-               hwnd == current_fg_hwnd or \
-               self._is_window_excluded(hwnd):
-                continue
+        fg_hwnd = self.window_system.get_foreground_window()
+        if fg_hwnd:
+            self.inactivity.touch(fg_hwnd)
+        self._mark_startup('engine_started')
+        self.show_message(f"Hotkeys live {self.startup_timings['hotkeys_live']:.0f} ms after startup.", "blue")
 
-            # NEW: Explicitly exclude Electricsheep from minimization if crash protection is enabled
-            if self.settings['enable_hotkey_passthrough']:
-                exe_name = get_window_exe_name(hwnd)
-                window_class = get_window_class_name(hwnd)
-                if (exe_name and exe_name.lower() == 'es') or \
-                   (window_class and window_class.lower() == 'electricsheepwndclass'):
-                    # self.show_message(f"Skipping inactive minimization for Electricsheep (HWND: {hwnd}) due to crash protection.", "yellow")
-                    continue # Skip Electricsheep
+    def _on_initial_snapshot(self, snapshot):
+        """
+        Takes the windows open at startup from the first background snapshot and starts tracking their
+        inactivity, then handles each of them (_handle_startup_window): the foreground window at once,
+        the rest in time slices between frames.
+        """
+        self._initial_snapshot_pending = False
+        hwnds = [hwnd for hwnd in snapshot.visible_titled_hwnds() if not self._is_own_ui_window(hwnd)]
+        self.initial_script_start_hwnds.update(hwnds)
+        # The startup pass gives them the new-window handling, instead of _reconcile_window_list all at once.
+        self.processed_new_windows.update(hwnds)
+        self._mark_startup('initial_windows_listed')
+        for hwnd in hwnds:
+            self.inactivity.track(hwnd)
 
-            # If already minimized by the script, keep it minimized
-            if hwnd in self.minimized_by_script_hwnds:
-                continue
+        if self.settings['apply_on_script_start']:
+            self.show_message(f"Applying initial settings based on 'Apply on Script Start' to {len(hwnds)} windows.", "blue")
+        fg_hwnd = self.window_system.get_foreground_window()
+        if fg_hwnd in self.initial_script_start_hwnds:
+            self._handle_startup_window(fg_hwnd)
+        self._mark_startup('foreground_applied')
+        self.startup_pass = TimeSlicedJob(self.loop.after, self.loop.after_cancel, [hwnd for hwnd in hwnds if hwnd != fg_hwnd],
+                                          self._handle_startup_window,
+                                          self.settings['startup_pass_slice_ms'], self.settings['startup_pass_gap_ms'],
+                                          on_progress=self._on_startup_pass_progress, on_done=self._on_startup_pass_done)
+        self.startup_pass.start()
+        self.update_status_label()
 
-            last_active = self.window_last_active_time.get(hwnd, current_time_ms) # Default to current time if not tracked yet
-            if (current_time_ms - last_active) > self.settings['minimize_inactive_delay_ms']:
-                inactive_candidates.append((last_active, hwnd))
-        
-        # Sort candidates by last active time (oldest first)
-        inactive_candidates.sort()
+    def _handle_startup_window(self, hwnd):
+        """
+        One window open at startup: the 'Apply on Script Start' settings (if enabled), then the new-window
+        handling the first window-list reconcile used to give it.
+        """
+        if hwnd not in self.processed_new_windows:
+            return # Closed before the pass got to it
+        # NEW: Apply settings on script start if enabled
+        if self.settings['apply_on_script_start']:
+            self._apply_startup_settings_to_window(hwnd)
+        if not self._is_new_window_processing_paused():
+            self._process_newly_found_window(hwnd)
 
-        # Minimize all but the 'ignore_count' most recently active (still inactive) windows
+    @property
+    def startup_finished(self):
+        """True once the startup windows are known and the 'Apply on Script Start' pass (if any) is done."""
+        return not self._initial_snapshot_pending and (self.startup_pass is None or self.startup_pass.finished)
+
+    def _apply_startup_settings_to_window(self, hwnd):
+        """
+        The 'Apply on Script Start' work for one window: manage it (if manage-all or dynamic transparency
+        is on), give it its active/inactive level, and center it if it is not managed.
+        """
+        if not self.window_system.is_window(hwnd) or self._is_own_ui_window(hwnd):
+            return
+        excluded = self._is_window_excluded(hwnd)
+        if not excluded and (self.settings['manage_all_windows_dynamically'] or self.settings['dynamic_transparency_enabled']):
+            self.managed_by_script_hwnds.add(hwnd)
+        if self.settings['dynamic_transparency_enabled']:
+            # Asked per window: the user may switch windows while the pass is still running.
+            is_foreground = hwnd == self.window_system.get_foreground_window()
+            if self._should_window_be_dynamically_managed(hwnd, is_foreground=is_foreground):
+                self.transparency.apply(hwnd, self.settings['active_window_transparency' if is_foreground else 'inactive_window_transparency'])
+        if self.settings['center_on_first_launch'] and not excluded and hwnd not in self.managed_by_script_hwnds:
+            self._center_window(hwnd, show_tooltip=False)
+
+    def _on_startup_pass_progress(self, done, total):
+        self.update_status_label()
+
+    def _on_startup_pass_done(self):
+        self._mark_startup('startup_pass_done')
+        stats = self.startup_pass.get_stats()
+        self.show_message(f"Startup windows handled: the other {stats['total']} in {stats['elapsed_ms']:.0f} ms "
+                          f"({stats['slices']} slices, longest {stats['max_slice_ms']:.1f} ms).", "green")
+
+    def _mark_startup(self, phase):
+        """Records how long after construction began a startup phase finished, in ms."""
+        self.startup_timings[phase] = round((time.perf_counter() - self._created_at) * 1000, 1)
+
+    # UI hooks. Headless they do nothing (messages still go to the console); the settings panel overrides them.
+
+    def show_tooltip(self, text, x_offset=None, y_offset=None):
+        pass
+
+    def hide_tooltip(self):
+        pass
+
+    def update_status_label(self):
+        pass
+
+    def _is_own_ui_window(self, hwnd):
+        """True for the controller's own windows, which are never made transparent, centered or minimized."""
+        return False
+
+    def open_settings_ui(self):
+        """Shows the settings panel. Headless, this relaunches the controller with its panel."""
+        self.show_message("Opening the settings panel...", "blue")
+        self.on_closing()
+
+        os.execv(sys.executable, ['python'] + [arg for arg in sys.argv if arg != '--headless'])
+
+    def load_settings(self):
+        """Loads settings from file, or uses defaults if file is not found/corrupt."""
+        try:
+            with open(self.settings_store.path, 'rb') as f:
+                self.settings = pickle.load(f)
+            def merge_dicts(source, destination):
+                for key, value in source.items():
+                    if key not in destination:
+                        destination[key] = value
+                    elif isinstance(value, dict) and isinstance(destination[key], dict):
+                        merge_dicts(value, destination[key])
+            merge_dicts(DEFAULT_SETTINGS, self.settings)
+
+            # Remove deprecated settings
+            if 'hotkey_capture_settings' in self.settings:
+                del self.settings['hotkey_capture_settings']
+            if 'ui_topmost_checkbox_x' in self.settings:
+                del self.settings['ui_topmost_checkbox_x']
+            if 'show_mouse_pos_checkbox_x' in self.settings:
+                del self.settings['show_mouse_pos_checkbox_x']
+            if 'new_window_transparency_exclusions' in self.settings:
+                del self.settings['new_window_transparency_exclusions']
+            if 'dynamic_transparency_exclusions' in self.settings:
+                del self.settings['dynamic_transparency_exclusions']
+            if 'manage_existing_windows_dynamically' in self.settings:
+                del self.settings['manage_existing_windows_dynamically']
+            # REMOVED DELETION OF THESE KEYS as they are being restored
+            # if 'inactive_window_auto_update' in self.settings:
+            #     del self.settings['inactive_window_auto_update']
+            if 'brightness_levels' in self.settings and 'scroll_stop_delay_ms' in self.settings['brightness_levels']:
+                del self.settings['brightness_levels']['scroll_stop_delay_ms']
+
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.settings = DEFAULT_SETTINGS.copy()
+        self.settings['hotkeys'] = DEFAULT_SETTINGS['hotkeys'].copy() # Reset hotkeys for test
+        self.original_hotkeys = self.settings['hotkeys'].copy()
+
+    def save_settings(self):
+        """Marks settings dirty; the write-behind store persists them after a quiet period."""
+        self.settings_store.mark_dirty(self.settings)
+
+    def _populate_initial_script_hwnds(self):
+        """Populates the set of HWNDs that exist when the script starts."""
+        # Ensure our own UI windows are not added to initial_script_start_hwnds
+        self.initial_script_start_hwnds.update(self._get_visible_titled_hwnds())
+        # print(f"DEBUG: Initial script HWNDs: {len(self.initial_script_start_hwnds)}")
+
+    def _create_win_event_source(self):
+        """Creates the WinEvent hook source used for event-driven window tracking."""
+        # Our own Tk windows are never tracked, so skip their object events at the source.
+        return Win32WinEventSource(skip_own_process_events=WindowRegistry.APPEAR_EVENTS + WindowRegistry.CLOSE_EVENTS)
+
+    def _start_window_event_hooks(self):
+        """Subscribes to window events and starts the event source. Returns True if hooks are live."""
+        if not self.settings['use_window_event_hooks']:
+            return False
+        if self.win_event_source is None and not self.loop.pumps_window_messages:
+            return False # Out-of-context hooks are delivered through the message loop, which this loop lacks
+        if self.win_event_source is None:
+            self.win_event_source = self._create_win_event_source()
+        self.win_event_source.subscribe(EVENT_SYSTEM_FOREGROUND, self._on_foreground_event)
+        self.window_registry.attach(self.win_event_source)
+        hooks_active = self.win_event_source.start()
+        self.foreground_hook_active = hooks_active
+        self.window_events_active = hooks_active
+        if not hooks_active:
+            self.show_message("Could not install window event hooks. Falling back to polling.", "orange")
+        return hooks_active
+
+    def _on_foreground_event(self, event_id, hwnd):
+        """Handles EVENT_SYSTEM_FOREGROUND: applies the focus change immediately."""
+        self.foreground_event_count += 1
+        if not self.script_enabled:
+            return
+        self._handle_foreground_hwnd(hwnd or self.window_system.get_foreground_window())
+
+    def _get_foreground_poll_interval_ms(self):
+        """Returns the poll interval for _check_foreground_window, or 0 if polling is not needed."""
+        if self.foreground_hook_active:
+            return self.settings['foreground_fallback_poll_ms']
+        return self.settings['window_monitor_interval_ms']
+
+    def _check_foreground_window(self):
+        """Periodic task: checks the foreground window and applies dynamic transparency.
+        While WinEvent hooks are active this only runs as a slow safety net. Returns True if the foreground changed."""
+        self.foreground_poll_count += 1
+        current_fg_hwnd = self.window_system.get_foreground_window()
+        changed = current_fg_hwnd != self.last_foreground_hwnd
+        self._handle_foreground_hwnd(current_fg_hwnd)
+        return changed
+
+    def _handle_foreground_hwnd(self, current_fg_hwnd):
+        """Applies dynamic transparency and activity tracking for the given foreground window."""
+        # Update last active time for the current foreground window
+        if current_fg_hwnd and self.window_system.is_window(current_fg_hwnd):
+            self.inactivity.touch(current_fg_hwnd)
+
+        if self._is_own_ui_window(current_fg_hwnd):
+            if self.settings['dynamic_transparency_enabled'] and self.last_foreground_hwnd:
+                self._apply_dynamic_transparency(current_fg_hwnd, self.last_foreground_hwnd)
+            self.last_foreground_hwnd = current_fg_hwnd
+            return
+
+        if current_fg_hwnd != self.last_foreground_hwnd:
+            if self.settings['dynamic_transparency_enabled']:
+                self._apply_dynamic_transparency(current_fg_hwnd, self.last_foreground_hwnd)
+            self.last_foreground_hwnd = current_fg_hwnd
+
+    def _get_visible_titled_hwnds(self):
+        """Returns the visible, titled windows (excluding our own UI) from the shared window snapshot."""
+        return [hwnd for hwnd in self.window_snapshots.get().visible_titled_hwnds()
+                if not self._is_own_ui_window(hwnd)]
+
+    def _is_trackable_window(self, hwnd):
+        """Returns True for visible, titled top-level windows that are not our own UI."""
+        return self.window_system.is_window(hwnd) and \
+               self.window_system.get_root(hwnd) == hwnd and \
+               self.window_system.is_visible(hwnd) and \
+               self.safe_win32.get_window_text(hwnd) != "" and \
+               not self._is_own_ui_window(hwnd)
+
+    def _is_new_window_processing_paused(self):
+        """Mirrors the gate of the new-window poll: nothing to do while the script and both features are off."""
+        return not self.script_enabled and \
+               not self.settings['apply_transparency_to_new_windows'] and \
+               not self.settings['center_on_first_launch']
+
+    def _on_window_appeared(self, hwnd):
+        """Called by the window registry the moment a titled window becomes visible."""
+        self.window_snapshots.invalidate()
+        if self._is_new_window_processing_paused():
+            return
+        if hwnd not in self.processed_new_windows:
+            self._process_newly_found_window(hwnd)
+
+    def _on_window_closed(self, hwnd):
+        """Removes a closed (or hidden) window from all tracking sets."""
+        self.window_snapshots.forget(hwnd)
+        self.window_metadata.forget(hwnd)
+        self.transparency.forget(hwnd)
+        self.processed_new_windows.discard(hwnd)
+        self.managed_by_script_hwnds.discard(hwnd)
+        self.minimized_by_script_hwnds.discard(hwnd)
+        self.inactivity.forget(hwnd)
+        self.safe_win32.forget(hwnd)
+        self.initial_script_start_hwnds.discard(hwnd)
+
+    def _tracked_hwnds(self):
+        """Returns every window the engine keeps state for, whether it was open at startup or found later."""
+        return (self.processed_new_windows | self.initial_script_start_hwnds
+                | self.managed_by_script_hwnds | self.minimized_by_script_hwnds)
+
+    def _get_new_window_poll_interval_ms(self):
+        """Returns the interval for _check_for_new_windows, or 0 if polling is not needed."""
+        if self.window_events_active:
+            return self.settings['new_window_fallback_poll_ms']
+        return self.settings['new_window_check_interval_ms']
+
+    def _check_for_new_windows(self):
+        """Periodic task: asks the scan worker for a fresh snapshot; newly opened and closed windows are
+        processed when it arrives (_on_window_snapshot). While window event hooks are active this only runs
+        once at startup and then as a slow safety net. Returns True if the last snapshot changed the window list."""
+        changed, self._window_list_changed = self._window_list_changed, False
+        self.window_snapshots.request_refresh()
+        return changed
+
+    def _post_window_snapshot(self, snapshot):
+        """Called on the scan worker thread: hands the snapshot to the engine thread."""
+        self.commands.post('window_snapshot', self._on_window_snapshot, snapshot)
+
+    def _on_window_snapshot(self, snapshot):
+        """Publishes a background snapshot (engine thread) and reconciles the window list against it."""
+        if not self.window_snapshots.publish(snapshot):
+            return
+        self.window_metadata.prime(snapshot)
+        if self._initial_snapshot_pending:
+            self._on_initial_snapshot(snapshot)
+        if not self._is_new_window_processing_paused() and self._reconcile_window_list(snapshot):
+            self._window_list_changed = True
+
+    def _reconcile_window_list(self, snapshot):
+        """Processes windows that opened or closed since the last snapshot. Returns True if any did."""
+        current_visible_hwnds = {hwnd for hwnd in snapshot.visible_titled_hwnds() if not self._is_own_ui_window(hwnd)}
+        tracked_hwnds = self._tracked_hwnds()
+        # The snapshot was taken off-thread, so a window that appeared since may be missing from it.
+        closed_hwnds = {hwnd for hwnd in tracked_hwnds.difference(current_visible_hwnds)
+                        if not self.window_snapshots.is_visible_titled(hwnd)}
+        self.window_registry.reset(current_visible_hwnds | tracked_hwnds.difference(closed_hwnds))
+        self.window_metadata.prune(snapshot.windows)
+
+        # Remove closed windows from tracking sets
+        for hwnd in closed_hwnds:
+            self._on_window_closed(hwnd)
+
+        # Now, identify genuinely new windows (not in processed_new_windows)
+        new_hwnds = current_visible_hwnds.difference(self.processed_new_windows)
+        for hwnd in new_hwnds:
+            self._process_newly_found_window(hwnd)
+        return bool(closed_hwnds or new_hwnds)
+
+    def _process_newly_found_window(self, hwnd):
+        """Applies transparency and/or centers a newly found window if enabled and not excluded."""
+        # Mark as processed immediately to prevent re-processing by this specific check
+        self.processed_new_windows.add(hwnd)
+        self.inactivity.track(hwnd)
+
+        # Ensure our own UI windows are not processed as new windows
+        if self._is_own_ui_window(hwnd):
+            return
+
+        # If window is in the exclusion list, DO NOT ATTEMPT TO SET TRANSPARENCY OR CENTER.
+        # Just ensure it's not in the managed set.
+        if self._is_window_excluded(hwnd):
+            if hwnd in self.managed_by_script_hwnds:
+                self.managed_by_script_hwnds.discard(hwnd)
+            return
+
+        # Center on first launch (only if not excluded)
+        if self.settings['center_on_first_launch']:
+            # Only center if it's a truly new window not already managed by script
+            if hwnd not in self.managed_by_script_hwnds:
+                self._center_window(hwnd, show_tooltip=False) # No tooltip for auto-center
+
+        # Apply transparency to new windows (only if not excluded)
+        if self.settings['apply_transparency_to_new_windows']:
+            # Only apply if it's a truly new window not already managed by script
+            if hwnd not in self.managed_by_script_hwnds:
+                target_level = self.settings['new_window_transparency_level']
+                
+                # If dynamic transparency is also enabled, and it's the foreground window,
+                # apply the active level immediately. Otherwise, apply the new_window_transparency_level.
+                # The dynamic transparency monitor will take over from here.
+                if self.settings['dynamic_transparency_enabled'] and \
+                   hwnd == self.window_system.get_foreground_window():
+                    target_level = self.settings['active_window_transparency']
+
+                self.transparency.apply(hwnd, target_level)
+                self.managed_by_script_hwnds.add(hwnd) # Add to managed set
+                # self.show_message(f"Applied new window transparency ({target_level}%) to {self.window_metadata.get_exe_name(hwnd)}", "blue")
+
+    def _set_screen_brightness(self, level):
+        """
+        Requests the screen brightness (0-100). The level is applied by the brightness worker thread,
+        so slow backends (DDC/CI monitors) never block the GUI; only the latest request is applied.
+        """
+        if not 0 <= level <= 100:
+            self.show_message("Error: Brightness level must be between 0 and 100.", "red")
+            return
+        self.brightness_worker.request(level)
+
+    def _on_brightness_error(self, message, color):
+        """Reports a brightness backend error (called on the worker thread)."""
+        self.loop.after(0, lambda: self.show_message(message, color))
+
+    def _update_brightness_gui(self, new_level=None, step=0):
+        """
+        Updates the screen brightness and shows a tooltip.
+        new_level sets an absolute level; step (already scaled by the scroll increment) is added on top.
+        This function is called on the main GUI thread by the input aggregator.
+        """
+        if not self.script_enabled:
+            return
+
+        current_brightness_config = self.settings['brightness_levels']
+
+        # Determine new brightness level
+        if new_level is not None:
+            self.current_brightness_level = new_level
+        self.current_brightness_level += step
+
+        self.current_brightness_level = max(current_brightness_config['min'],
+                                            min(current_brightness_config['max'],
+                                                self.current_brightness_level))
+
+        # Apply brightness immediately
+        self._set_screen_brightness(self.current_brightness_level)
+
+        # Show tooltip immediately
+        self.show_tooltip(f"Brightness: {self.current_brightness_level}%")
+
+    def _ahk_brightness_callback(self, action):
+        """
+        Generic callback for AHK hotkeys that modify brightness.
+        This function runs in the hotkey thread, so it only checks modifiers and queues a command.
+        """
+        if not self.script_enabled:
+            return
+
+        hotkey_config_str = self.settings['hotkeys'][action]
+
+        if not self.check_modifiers_match(action):
+            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
+                print(f"DEBUG: Modifiers mismatch for {action} with hotkey '{hotkey_config_str}'. Current modifier mask: {self.modifier_state.read():#x}")
+            return
+
+        self.commands.post(action, self._handle_brightness_hotkey, action, time.time() * 1000)
+
+    def _handle_brightness_hotkey(self, action, current_hotkey_time):
+        """Runs a brightness hotkey on the engine thread. current_hotkey_time is when the hotkey fired (ms)."""
+        current_brightness_config = self.settings['brightness_levels']
+
+        # Check if this is the start of a new scrolling sequence AND if reset is enabled
+        time_since_last_hotkey = current_hotkey_time - self.last_brightness_hotkey_press_time
+        
+        # A longer timeout to detect end of scroll sequence
+        if time_since_last_hotkey > SCROLL_SEQUENCE_TIMEOUT_MS:
+            self.is_brightness_scrolling = False
+
+        if not self.is_brightness_scrolling and current_brightness_config['reset_on_scroll_start']:
+            self.current_brightness_level = current_brightness_config['initial']
+            self.is_brightness_scrolling = True
+        elif not self.is_brightness_scrolling and not current_brightness_config['reset_on_scroll_start']:
+            self.is_brightness_scrolling = True
+        
+        self.last_brightness_hotkey_press_time = current_hotkey_time # Update last hotkey press time for next check
+
+        if action == 'increase_brightness':
+            self.input_aggregator.submit_delta('brightness', 1, current_brightness_config, current_hotkey_time)
+        elif action == 'decrease_brightness':
+            self.input_aggregator.submit_delta('brightness', -1, current_brightness_config, current_hotkey_time)
+        elif action == 'set_80_percent_brightness':
+            self.input_aggregator.submit_preset('brightness', current_brightness_config['preset_xbutton2'])
+            self.is_brightness_scrolling = False # Presets are not part of a scroll sequence
+        elif action == 'set_0_percent_brightness':
+            self.input_aggregator.submit_preset('brightness', current_brightness_config['preset_xbutton1'])
+            self.is_brightness_scrolling = False # Presets are not part of a scroll sequence
+        else:
+            self.show_message(f"Unhandled AHK hotkey action for brightness: {action}", "orange")
+
+    def _should_window_be_dynamically_managed(self, hwnd, is_foreground):
+        """
+        Determines if a given window should be actively managed for dynamic transparency
+        based on current settings and its foreground status.
+        If it should be managed, it's added to self.managed_by_script_hwnds.
+        """
+        if not self.settings['dynamic_transparency_enabled']:
+            return False
+
+        if not self.window_snapshots.is_visible_titled(hwnd):
+            # Invalid or invisible windows should not be managed
+            if hwnd in self.managed_by_script_hwnds:
+                self.managed_by_script_hwnds.discard(hwnd)
+            return False
+
+        if self._is_window_excluded(hwnd):
+            # Excluded windows are never dynamically managed
+            if hwnd in self.managed_by_script_hwnds:
+                self.managed_by_script_hwnds.discard(hwnd)
+            return False
+
+        if self.settings['manage_all_windows_dynamically']:
+            # If 'Manage ALL' is ON, all non-excluded, valid windows are managed.
+            self.managed_by_script_hwnds.add(hwnd)
+            return True
+        else:
+            # If 'Manage ALL' is OFF:
+            # 1. If 'Inactive Window Manual Update' is ON, and this window just became foreground,
+            #    it should be added to managed_by_script_hwnds.
+            if is_foreground and self.settings['inactive_window_auto_update']:
+                self.managed_by_script_hwnds.add(hwnd)
+                return True
+            # 2. Otherwise, it's only managed if it was ALREADY in managed_by_script_hwnds
+            #    (e.g., from 'apply_transparency_to_new_windows' or hotkey action).
+            return hwnd in self.managed_by_script_hwnds
+
+    def _apply_dynamic_transparency(self, new_fg_hwnd, old_fg_hwnd):
+        """Applies active/inactive transparency based on foreground window change."""
+        # Handle minimization/restoration based on foreground window change (always run this)
+        self._restore_minimized_windows_on_focus_change(new_fg_hwnd, old_fg_hwnd)
+
+        # Only proceed with transparency logic if dynamic transparency is enabled
+        if not self.settings['dynamic_transparency_enabled']:
+            # If dynamic transparency is OFF, ensure any windows that were managed
+            # and are now *not* supposed to be managed (e.g., manage_all was turned off)
+            # are removed from the managed set. Do NOT restore transparency here.
+            # The _reapply_dynamic_transparency_on_all_windows handles the cleanup.
+            return
+
+        # Process the new foreground window for transparency
+        if self._should_window_be_dynamically_managed(new_fg_hwnd, is_foreground=True):
+            target_level = self.settings['active_window_transparency']
+            self.transparency.apply(new_fg_hwnd, target_level)
+            # self.show_message(f"Set {self.window_metadata.get_exe_name(new_fg_hwnd)} to ACTIVE ({target_level}%)", "purple")
+        elif new_fg_hwnd in self.managed_by_script_hwnds:
+            # If it was managed but now _should_window_be_dynamically_managed returned False
+            # (e.g., settings changed, or it's no longer foreground and not managed by other means)
+            # Restore to 100% and remove from managed set.
+            self.transparency.apply(new_fg_hwnd, 100)
+            self.managed_by_script_hwnds.discard(new_fg_hwnd)
+
+
+        # Process the old foreground window (now inactive) for transparency
+        if old_fg_hwnd and old_fg_hwnd != new_fg_hwnd:
+            if self._should_window_be_dynamically_managed(old_fg_hwnd, is_foreground=False):
+                target_level = self.settings['inactive_window_transparency']
+                self.transparency.apply(old_fg_hwnd, target_level)
+                # self.show_message(f"Set {self.window_metadata.get_exe_name(old_fg_hwnd)} to INACTIVE ({target_level}%)", "purple")
+            elif old_fg_hwnd in self.managed_by_script_hwnds:
+                # If it was managed but now _should_window_be_dynamically_managed returned False
+                # Restore to 100% and remove from managed set.
+                self.transparency.apply(old_fg_hwnd, 100)
+                self.managed_by_script_hwnds.discard(old_fg_hwnd)
+
+    def _reapply_dynamic_transparency_on_all_windows(self, force_all=False):
+        """
+        Re-evaluates and applies dynamic transparency to windows.
+        If force_all is True, it enumerates all visible windows and adds them to managed_by_script_hwnds
+        (if not excluded). Otherwise, it only processes windows already in managed_by_script_hwnds.
+        """
+        current_fg_hwnd = self.window_system.get_foreground_window()
+        
+        windows_to_check = set()
+        if force_all or self.settings['manage_all_windows_dynamically'] or self.settings['inactive_window_auto_update']:
+            # Enumerate all visible windows if 'manage_all' is ON, or if 'manual update' is ON (to catch potential new ones), or if forced.
+            windows_to_check.update(self._get_visible_titled_hwnds())
+        
+        # Also include any windows currently in managed_by_script_hwnds that might not be visible anymore
+        # but we need to process for removal.
+        windows_to_check.update(self.managed_by_script_hwnds)
+
+        # This set will hold HWNDs that are actually managed for dynamic transparency in this cycle.
+        current_cycle_dynamically_managed_hwnds = set()
+        
+        # Determine which windows should be managed dynamically in this cycle
+        for hwnd in list(windows_to_check):
+            # Check if it should be managed (this also updates self.managed_by_script_hwnds)
+            if self._should_window_be_dynamically_managed(hwnd, is_foreground=(hwnd == current_fg_hwnd)):
+                current_cycle_dynamically_managed_hwnds.add(hwnd)
+            elif hwnd in self.managed_by_script_hwnds:
+                # If it was managed but now _should_window_be_dynamically_managed returned False,
+                # remove it from the managed set. Do NOT restore transparency here,
+                # as per user request (unless dynamic_transparency_enabled is OFF, then
+                # it should retain its last transparency).
+                self.managed_by_script_hwnds.discard(hwnd)
+
+        # Apply dynamic transparency to the determined set of windows.
+        # The reconciler only touches windows whose alpha actually changes.
+        if self.settings['dynamic_transparency_enabled']:
+            desired_levels = {}
+            for hwnd in current_cycle_dynamically_managed_hwnds:
+                if hwnd == current_fg_hwnd:
+                    desired_levels[hwnd] = self.settings['active_window_transparency']
+                else:
+                    desired_levels[hwnd] = self.settings['inactive_window_transparency']
+            self.transparency.reconcile(desired_levels)
+        else:
+            # If dynamic transparency is OFF, we should not apply any transparency here.
+            # Windows should retain their last set transparency.
+            pass
+
+        # Final cleanup: Any windows that are still in `self.managed_by_script_hwnds` but
+        # were NOT in `current_cycle_dynamically_managed_hwnds` (meaning they are no longer
+        # considered managed by the current settings) should be removed from `self.managed_by_script_hwnds`.
+        # Their transparency should *not* be restored to 100% here if dynamic is off,
+        # unless `force_all` is true and it implies a full reset (e.g. from exclusion list change).
+        
+        # If dynamic_transparency_enabled is OFF, we just remove from tracking.
+        # If it's ON, but a window is no longer managed, we restore it to 100%.
+        hwnds_to_cleanup = self.managed_by_script_hwnds.difference(current_cycle_dynamically_managed_hwnds)
+        for hwnd in list(hwnds_to_cleanup):
+            if self.window_system.is_window(hwnd) and not self._is_window_excluded(hwnd) and self.settings['dynamic_transparency_enabled']:
+                # Only restore to 100% if dynamic is ON and it's no longer managed.
+                self.transparency.apply(hwnd, 100)
+            self.managed_by_script_hwnds.discard(hwnd)
+
+    def restore_all_managed_to_full_opacity(self): # NEW: Method for the button
+        """Restores all windows currently managed by the script to 100% opacity."""
+        self.show_message("Restoring all managed windows to 100% opacity.", "blue")
+        self._restore_managed_transparency_to_full_opacity() # Call the internal helper
+        self.show_tooltip("All managed windows restored to 100%.")
+
+    def _restore_managed_transparency_to_full_opacity(self):
+        """Restores all windows currently managed by the script to 100% opacity,
+        unless they are currently in the exclusion list. Excluded windows are simply
+        removed from the managed set without their transparency being altered by the script."""
+        
+        hwnds_to_remove = set()
+        for hwnd in list(self.managed_by_script_hwnds): # Iterate a copy for safe modification
+            if not self.window_system.is_window(hwnd):
+                hwnds_to_remove.add(hwnd)
+                continue
+
+            # This function is explicitly for restoring to full opacity.
+            # If a window is excluded, we still remove it from managed_by_script_hwnds,
+            # but we don't attempt to set its transparency.
+            if not self._is_window_excluded(hwnd):
+                self.transparency.apply(hwnd, 100)
+            hwnds_to_remove.add(hwnd) # Always remove from tracking after processing
+
+        # Remove all processed HWNDs from the managed set
+        self.managed_by_script_hwnds.difference_update(hwnds_to_remove)
+
+
+    def _reset_inactivity_tracking_state(self):
+        """
+        Resets the internal state related to window inactivity tracking.
+        Clears tracking data, but does NOT force restore previously minimized windows.
+        Restoration will happen naturally if a minimized window gains focus.
+        Restarts inactivity tracking for all currently visible, non-excluded windows.
+        """
+        self.show_message("Resetting window inactivity tracking state...", "blue")
+        
+        # 1. Clear windows minimized by the script from tracking, but do NOT restore them.
+        self.minimized_by_script_hwnds.clear()
+        
+        # 2. Clear all inactivity tracking data (and pick up a changed delay)
+        self.inactivity.reset()
+        self.inactivity.set_delay_ms(self.settings['minimize_inactive_delay_ms'])
+
+        # 3. Restart tracking for all currently visible, non-excluded windows
+        for hwnd in self._get_visible_titled_hwnds():
+            # Skip excluded windows
+            if not self._is_window_excluded(hwnd):
+                self.inactivity.touch(hwnd)
+
+        # Also ensure the current foreground window is marked active
+        fg_hwnd = self.window_system.get_foreground_window()
+        if fg_hwnd and self.window_system.is_window(fg_hwnd) and not self._is_window_excluded(fg_hwnd):
+            self.inactivity.touch(fg_hwnd)
+            
+        self.show_message("Inactivity tracking state reset.", "blue")
+
+    def _start_window_monitoring(self):
+        """Starts the periodic tasks (foreground and new-window checks, plus any the UI added).
+        Inactive windows are handled by the inactivity scheduler, which wakes on its own deadlines."""
+        self._start_window_event_hooks()
+        self.periodic.refresh()
+
+    def _minimize_expired_windows(self, expired):
+        """
+        Called by the inactivity scheduler with the windows whose inactivity deadline has passed,
+        as [(last_active, hwnd)] oldest first. Minimizes all but the 'ignore_count' most recently active.
+        """
+        current_fg_hwnd = self.window_system.get_foreground_window()
+        snapshot = self.window_snapshots.get(fresh=True) # Minimizing acts on what is on screen now
+        known_hwnds = self.initial_script_start_hwnds | self.processed_new_windows # Consider all known windows
+
+        inactive_candidates = []
+        for last_active, hwnd in expired:
+            info = snapshot.get(hwnd)
+            if info is None and self.window_snapshots.is_visible_titled(hwnd):
+                continue # Newer than the snapshot; it will be seen by the next one
+            if info is None or not info.visible or not info.title:
+                # Clean up invalid/invisible windows
+                self.initial_script_start_hwnds.discard(hwnd)
+                self.processed_new_windows.discard(hwnd)
+                self.managed_by_script_hwnds.discard(hwnd)
+                self.minimized_by_script_hwnds.discard(hwnd)
+                self.inactivity.forget(hwnd)
+                continue
+
+            # The foreground window is active by definition
+            if hwnd == current_fg_hwnd:
+                self.inactivity.touch(hwnd)
+                continue
+
+            # Skip windows we do not manage, our own UI, and excluded windows
+            if hwnd not in known_hwnds or self._is_own_ui_window(hwnd) or self._is_window_excluded(hwnd):
+                continue
+
+            # NEW: Explicitly exclude Electricsheep from minimization if crash protection is enabled
+            if self.settings['enable_hotkey_passthrough']:
+                exe_name = self.window_metadata.get_exe_name(hwnd)
+                window_class = info.class_name
+                if (exe_name and exe_name.lower() == 'es') or \
+                   (window_class and window_class.lower() == 'electricsheepwndclass'):
+                    continue # Skip Electricsheep
+
+            # If already minimized by the script, keep it minimized
+            if hwnd in self.minimized_by_script_hwnds:
+                continue
+
+            inactive_candidates.append((last_active, hwnd, info))
+
+        # Minimize all but the 'ignore_count' most recently active (still inactive) windows
         num_to_minimize = max(0, len(inactive_candidates) - self.settings['minimize_inactive_ignore_count'])
 
-        for i in range(num_to_minimize):
-            _, hwnd_to_minimize = inactive_candidates[i]
-            if win32gui.IsWindow(hwnd_to_minimize) and win32gui.IsWindowVisible(hwnd_to_minimize) and not win32gui.IsIconic(hwnd_to_minimize):
-                try:
-                    win32gui.ShowWindow(hwnd_to_minimize, win32con.SW_MINIMIZE)
-                    self.minimized_by_script_hwnds.add(hwnd_to_minimize)
-                    # self.show_message(f"Minimized inactive window: {get_window_exe_name(hwnd_to_minimize)}", "yellow")
-                except Exception as e:
-                    self.show_message(f"Failed to minimize HWND {hwnd_to_minimize}: {e}", "orange")
+        for i in range(num_to_minimize):
+            _, hwnd_to_minimize, info = inactive_candidates[i]
+            if not info.iconic:
+                try:
+                    if self.safe_win32.show_window(hwnd_to_minimize, SW_MINIMIZE):
+                        self.minimized_by_script_hwnds.add(hwnd_to_minimize)
+                except Exception as e:
+                    self.show_message(f"Failed to minimize HWND {hwnd_to_minimize}: {e}", "orange")
+        if num_to_minimize:
+            self.window_snapshots.invalidate()
+
+    def _restore_managed_windows_to_full_opacity(self):
+        """Restores all windows currently managed by the script to 100% opacity,
+        unless they are currently in the exclusion list. Excluded windows are simply
+        removed from the managed set without their transparency being altered by the script."""
+        
+        hwnds_to_remove = set()
+        for hwnd in list(self.managed_by_script_hwnds): # Iterate a copy for safe modification
+            if not self.window_system.is_window(hwnd):
+                hwnds_to_remove.add(hwnd)
+                continue
+
+            if self._is_window_excluded(hwnd):
+                # If currently excluded, just remove from managed set, DO NOT touch transparency.
+                hwnds_to_remove.add(hwnd)
+                # print(f"DEBUG: _restore_managed: Excluded window '{self.window_metadata.get_exe_name(hwnd) or self.window_metadata.get_class_name(hwnd)}' (HWND: {hwnd}) not restored to 100% opacity (removed from managed set).")
+            else:
+                # If not excluded, restore to 100%
+                self.transparency.apply(hwnd, 100)
+                hwnds_to_remove.add(hwnd) # Mark for removal after restoration
+
+        # Remove all processed HWNDs from the managed set
+        self.managed_by_script_hwnds.difference_update(hwnds_to_remove)
+
+    def _center_window(self, hwnd, show_tooltip=True):
+        """
+        Centers the specified window on its primary monitor.
+        If show_tooltip is True, displays a tooltip message.
+        """
+        if not self.window_system.is_window(hwnd) or not self.window_system.is_visible(hwnd) or not self.safe_win32.get_window_text(hwnd):
+            if show_tooltip:
+                self.show_message("Cannot center window: not visible or invalid.", "red")
+            self.show_message(f"Could not center HWND {hwnd}: not visible or invalid.", "red")
+            return False
+
+        # IMPORTANT: If Electricsheep is in global_transparency_exclusions, this check will prevent centering.
+        # It has been removed from DEFAULT_SETTINGS for this purpose.
+        if self._is_window_excluded(hwnd):
+            if show_tooltip:
+                self.show_message("Cannot center excluded window.", "red")
+            self.show_message(f"Could not center HWND {hwnd}: window is excluded.", "red")
+            return False
+
+        try:
+            monitor_info = self.window_system.get_monitor_info(hwnd)
+            # 'Monitor' gives the physical screen bounds. 'Work' gives the usable area (excluding taskbar).
+            # For Electricsheep, we want to size it to the *physical* screen width, but position it relative to the work area.
+            monitor_rect = monitor_info['Monitor'] # (left, top, right, bottom) - physical screen
+            work_area = monitor_info['Work']     # (left, top, right, bottom) - usable area
+
+            physical_monitor_left = monitor_rect[0]
+            physical_monitor_top = monitor_rect[1]
+            physical_monitor_width = monitor_rect[2] - monitor_rect[0]
+            physical_monitor_height = monitor_rect[3] - monitor_rect[1]
+
+            work_area_left = work_area[0]
+            work_area_top = work_area[1]
+            work_area_width = work_area[2] - work_area[0]
+            work_area_height = work_area[3] - work_area[1]
+
+            # NEW: Special handling for Electricsheep
+            if self.settings['center_electricsheep_special']:
+                exe_name = self.window_metadata.get_exe_name(hwnd)
+                window_class = self.window_metadata.get_class_name(hwnd)
+                if (exe_name and exe_name.lower() == 'es') or \
+                   (window_class and window_class.lower() == 'electricsheepwndclass'):
+                    
+                    # Based on user's provided metrics for Electricsheep for a 1920x1200 monitor with 23px taskbar:
+                    # Desired Client area: (1920, 1177) which matches work_area_width, work_area_height
+                    # Desired Window area: (1936, 1216)
+                    # Desired Window position: (-8, -31)
+                    
+                    # New window dimensions (including borders and title bar)
+                    # The goal is for the client area to fill the work area, with the window title bar hidden above.
+                    # This means the window's total width should be physical_monitor_width (1920) + 16 (borders) = 1936
+                    # The window's total height should be physical_monitor_height (1200) + 16 (borders) = 1216
+                    # (assuming 31px for title bar + 8px for bottom border, client height = 1200 - 31 - 8 = 1161, which is not 1177)
+                    # Let's re-evaluate based on the desired "Screen: x: -8 y: -31 w: 1936 h: 1216" for a 1920x1200 screen.
+
+                    # To achieve a screen position of (-8, -31) and size (1936, 1216):
+                    # The width should be physical_monitor_width + 16 (for 8px borders on each side)
+                    new_width = physical_monitor_width + 16 
+                    # The height should be physical_monitor_height + 16 (for 8px bottom border and 31px title bar, 1200 + 16 = 1216)
+                    new_height = physical_monitor_height + 16 # This assumes 31px title bar + 8px bottom border.
+                    
+                    # Position it such that its left border is 8px left of the monitor's physical left edge
+                    new_x = physical_monitor_left - 8
+                    # Position it such that its top border is 31px above the monitor's physical top edge
+                    new_y = physical_monitor_top - 31
+
+                    self.safe_win32.move_window(hwnd, new_x, new_y, new_width, new_height)
+                    if show_tooltip:
+                        self.show_tooltip("Electricsheep Centered (Title bar hidden)!")
+                    return True # Handled, exit function
+
+            # Original centering logic if not Electricsheep or special centering is off
+            # Get current window dimensions for standard centering
+            left, top, right, bottom = self.window_system.get_rect(hwnd)
+            window_width = right - left
+            window_height = bottom - top
+
+            # Calculate new centered position relative to work area
+            new_x = work_area_left + (work_area_width - window_width) // 2
+            new_y = work_area_top + (work_area_height - window_height) // 2
+
+            # Apply 'prevent_window_edges_off_screen' logic
+            if self.settings['prevent_window_edges_off_screen']:
+                new_x = max(work_area_left, new_x)
+                new_y = max(work_area_top, new_y) # Ensure top is not off-screen
+                # Also ensure it doesn't go off the right/bottom if window is larger than screen
+                # Only apply if the window is smaller than the monitor in that dimension
+                new_x = min(new_x, work_area_left + work_area_width - window_width) if window_width < work_area_width else new_x
+                new_y = min(new_y, work_area_top + work_area_height - window_height) if window_height < work_area_height else new_y
+
+            # Move the window
+            self.safe_win32.move_window(hwnd, new_x, new_y, window_width, window_height)
+
+            if show_tooltip:
+                self.show_tooltip("Window Centered!")
+            return True
+        except Exception as e:
+            if show_tooltip:
+                self.show_message(f"Failed to center window: {e}", "red")
+            self.show_message(f"Error centering window HWND {hwnd}: {e}", "red")
+            return False
+
+    def show_message(self, message, color="white"):
+        """Prints a message (can be expanded to a GUI message box/label)."""
+        print(f"[{color}] {message}")
+
+    def get_diagnostics(self):
+        """Collects runtime counters from the monitoring components."""
+        return {
+            'startup_ms': dict(self.startup_timings),
+            'startup_pass': self.startup_pass.get_stats() if self.startup_pass else None,
+            'foreground_tracking': {
+                'hook_active': self.foreground_hook_active,
+                'events': self.foreground_event_count,
+                'polls': self.foreground_poll_count,
+                'poll_interval_ms': self._get_foreground_poll_interval_ms(),
+            },
+            'window_registry': dict(self.window_registry.get_stats(),
+                                    events_active=self.window_events_active,
+                                    poll_interval_ms=self._get_new_window_poll_interval_ms()),
+            'win_events': self.win_event_source.get_stats() if self.win_event_source else None,
+            'window_system': self.window_system.get_stats(),
+            'window_snapshots': self.window_snapshots.get_stats(),
+            'window_scans': self.window_scan_worker.get_stats(),
+            'window_metadata': self.window_metadata.get_stats(),
+            'transparency_ops': self.transparency.get_stats(),
+            'transparency_failures': self.transparency.failure_cache.get_stats(),
+            'win32_safety': self.safe_win32.get_stats(),
+            'input_aggregator': self.input_aggregator.get_stats(),
+            'commands': self.commands.get_stats(),
+            'inactivity': self.inactivity.get_stats(),
+            'periodic_tasks': self.periodic.get_stats(),
+            'settings_store': self.settings_store.get_stats(),
+            'brightness': self.brightness_worker.get_stats(),
+            'modifier_state': self.modifier_state.get_stats(),
+            'hotkey_bindings': self.hotkey_bindings.get_stats(),
+            'hotkey_backend': self.hotkey_backend.get_stats(),
+        }
+
+    def print_diagnostics(self):
+        """Prints runtime counters (see get_diagnostics)."""
+        for section, values in self.get_diagnostics().items():
+            self.show_message(f"{section}: {values}", "blue")
+
+    def print_startup_profile(self, preamble=()):
+        """
+        Prints import times (this module and every module loaded through optional_import) and the
+        startup phases: each mark's time since construction began and its own duration. preamble is
+        [(label, ms)] for work done before the engine was constructed.
+        """
+        print("Imports (ms):")
+        print(f"  {'this module (total)':<32} {MODULE_LOAD_MS:>8.1f}")
+        for name, ms in sorted(IMPORT_TIMINGS.items(), key=lambda item: -item[1]):
+            print(f"  {name + ('' if _OPTIONAL_MODULES.get(name) else ' (missing)'):<32} {ms:>8.1f}")
+        if preamble:
+            print("Before the engine (ms):")
+            for label, ms in preamble:
+                print(f"  {label:<32} {ms:>8.1f}")
+        print(f"Startup phases (ms): {'at':>8} {'took':>8}")
+        previous_ms = 0.0
+        for phase, at_ms in self.startup_timings.items():
+            print(f"  {phase:<32} {at_ms:>8.1f} {at_ms - previous_ms:>8.1f}")
+            previous_ms = at_ms
+
+    def _is_window_excluded(self, hwnd):
+        """Checks if a window's executable name or class name is in the global exclusion list.
+        Returns True if excluded, False otherwise. Verdicts are cached per window until the list changes."""
+        # Invalid windows are reported as not excluded by the cache.
+        return self.window_metadata.is_excluded(hwnd, self._matches_exclusion_list)
+
+    def _on_exclusion_list_changed(self):
+        """Recompiles the exclusion matcher and drops cached verdicts."""
+        self.exclusion_matcher = ExclusionMatcher(self.settings['global_transparency_exclusions'])
+        self.window_metadata.reset_verdicts()
+
+    def _matches_exclusion_list(self, exe_name, window_class):
+        """Returns True if the given executable name or class name is in the global exclusion list."""
+        return self.exclusion_matcher.matches(exe_name, window_class)
+
+    def _restore_minimized_windows_on_focus_change(self, new_fg_hwnd, old_fg_hwnd):
+        """Restores windows that were minimized by the script if they gain focus,
+        unless they are currently in the exclusion list."""
+        if not self.settings['minimize_inactive_windows']:
+            # If minimize inactive is off, ensure any windows previously minimized by us are restored if they become foreground.
+            # This handles cases where the setting is toggled off, but a window was still minimized.
+            if new_fg_hwnd in self.minimized_by_script_hwnds:
+                if not self._is_window_excluded(new_fg_hwnd):
+                    if self.window_system.is_window(new_fg_hwnd):
+                        self.safe_win32.show_window(new_fg_hwnd, SW_RESTORE)
+                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
+            return
+
+        # If the new foreground window was minimized by our script, attempt to restore it
+        if new_fg_hwnd in self.minimized_by_script_hwnds:
+            if not self._is_window_excluded(new_fg_hwnd): # Only restore if NOT excluded
+                if self.window_system.is_window(new_fg_hwnd):
+                    self.safe_win32.show_window(new_fg_hwnd, SW_RESTORE)
+                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
+            else:
+                # If new_fg_hwnd is in minimized_by_script_hwnds but is now excluded,
+                # it should not be restored by us, just remove from tracking.
+                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
+        
+        # If an old foreground window was minimized by us and is now excluded,
+        # we should stop tracking it and NOT restore it.
+        if old_fg_hwnd in self.minimized_by_script_hwnds and self._is_window_excluded(old_fg_hwnd):
+            self.minimized_by_script_hwnds.discard(old_fg_hwnd)
+
+    def restart_app(self):
+        """Restarts the entire application."""
+        self.show_message("Restarting application...", "yellow")
+        self.save_settings()
+
+        self.on_closing()
+
+        os.execv(sys.executable, ['python'] + sys.argv)
+
+    def register_hotkeys(self):
+        """
+        Registers hotkeys based on current settings and script enabled state using AHK.
+        Hotkeys for transparency, brightness, centering, and minimizing others are
+        conditionally non-suppressing based on the 'enable_hotkey_passthrough' setting.
+        Only bindings that changed since the last call are added or removed.
+        """
+        self._compile_hotkey_specs()
+
+        # Hotkeys that are always non-suppressing by design (toggle script, focus mode)
+        # Kill script hotkey should always be non-suppressing to ensure it works even if other hotkeys are suppressed.
+        callbacks = {
+            'kill_script_failsafe': self.kill_script,
+            'toggle_script': self.toggle_script_from_hotkey,
+            'toggle_focus_mode': self._ahk_toggle_focus_mode_callback,
+            'focus_mode_alt_tab': self._ahk_focus_mode_alt_tab_callback,
+            'open_settings': self._ahk_open_settings_callback,
+        }
+
+        if self.script_enabled:
+            # Hotkeys that might interact with sensitive applications
+            transparency_actions = [
+                'increase_transparency', 'decrease_transparency',
+                'set_86_percent', 'set_100_percent', 'set_30_percent'
+            ]
+            for action in transparency_actions:
+                callbacks[action] = functools.partial(self._ahk_transparency_callback, action)
+
+            callbacks['center_window'] = self._ahk_center_window_callback
+            callbacks['minimize_others'] = self._ahk_minimize_others_callback
+
+            brightness_actions = [
+                'increase_brightness', 'decrease_brightness',
+                'set_80_percent_brightness', 'set_0_percent_brightness'
+            ]
+            for action in brightness_actions:
+                callbacks[action] = functools.partial(self._ahk_brightness_callback, action)
+
+        desired = {}
+        for action, callback in callbacks.items():
+            ahk_hotkey = self.hotkey_specs[action].ahk_syntax
+            if ahk_hotkey:
+                desired[ahk_hotkey] = (action, callback)
+        self.hotkey_bindings.update(desired, priority_actions=('kill_script_failsafe', 'toggle_script'))
+
+        if not self.script_enabled:
+            self.show_message("Script is disabled. Only kill switch, toggle hotkey, and Focus Mode hotkeys are active.", "orange")
+
+    # Actions that are always registered non-suppressing (kill switch, toggle, focus mode, settings) so they
+    # work even when other hotkeys are suppressed.
+    _ALWAYS_PASSTHROUGH_ACTIONS = ('kill_script_failsafe', 'toggle_script', 'toggle_focus_mode', 'focus_mode_alt_tab',
+                                   'open_settings')
+
+    def _compile_hotkey_specs(self):
+        """Compiles every configured hotkey into a HotkeySpec. Called whenever hotkey settings change."""
+        passthrough = self.settings['enable_hotkey_passthrough']
+        self.hotkey_specs = {
+            action: self.hotkey_compiler.compile(action, hotkey_str,
+                                                 suppress=not (passthrough or action in self._ALWAYS_PASSTHROUGH_ACTIONS))
+            for action, hotkey_str in self.settings['hotkeys'].items()
+        }
+
+    def _map_hotkey_to_ahk_syntax(self, hotkey_str, non_suppressing=False):
+        """Maps a hotkey string (e.g., 'ctrl+wheelup') to AHK syntax (e.g., '^WheelUp')."""
+        return self.hotkey_compiler.compile(None, hotkey_str, suppress=not non_suppressing).ahk_syntax
+
+    def _ahk_transparency_callback(self, action):
+        """
+        Generic callback for AHK hotkeys that modify transparency.
+        This function runs in the hotkey thread, so it only checks modifiers and queues a command.
+        """
+        if not self.script_enabled:
+            return
+
+        hotkey_config_str = self.settings['hotkeys'][action]
+
+        if not self.check_modifiers_match(action):
+            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
+                print(f"DEBUG: Modifiers mismatch for {action} with hotkey '{hotkey_config_str}'. Current modifier mask: {self.modifier_state.read():#x}")
+            return
+
+        self.commands.post(action, self._handle_transparency_hotkey, action, time.time() * 1000)
+
+    def _handle_transparency_hotkey(self, action, current_hotkey_time):
+        """Runs a transparency hotkey on the engine thread. current_hotkey_time is when the hotkey fired (ms)."""
+        current_transparency_config = self.settings['transparency_levels'] # NEW: Get transparency config
+
+        # NEW: Check if this is the start of a new scrolling sequence AND if reset is enabled
+        time_since_last_hotkey = current_hotkey_time - self.last_transparency_hotkey_press_time
+        
+        # A longer timeout to detect end of scroll sequence
+        if time_since_last_hotkey > SCROLL_SEQUENCE_TIMEOUT_MS:
+            self.is_transparency_scrolling = False
+
+        if not self.is_transparency_scrolling and current_transparency_config['reset_on_scroll_start']:
+            # Set internal transparency level to initial
+            self.current_transparency_level = current_transparency_config['initial']
+            # FIX: Ensure active_window_transparency (used by dynamic logic) is also reset here
+            if self.settings['dynamic_transparency_enabled']:
+                self.settings['active_window_transparency'] = current_transparency_config['initial']
+                self.save_settings() # Persist this reset
+            self.is_transparency_scrolling = True
+        elif not self.is_transparency_scrolling and not current_transparency_config['reset_on_scroll_start']:
+            self.is_transparency_scrolling = True
+        
+        self.last_transparency_hotkey_press_time = current_hotkey_time # Update last hotkey press time for next check
+
+
+        if action == 'increase_transparency':
+            self.input_aggregator.submit_delta('transparency', 1, current_transparency_config, current_hotkey_time)
+        elif action == 'decrease_transparency':
+            self.input_aggregator.submit_delta('transparency', -1, current_transparency_config, current_hotkey_time)
+        elif action == 'set_86_percent':
+            self.input_aggregator.submit_preset('transparency', current_transparency_config['preset_xbutton2'])
+            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
+        elif action == 'set_100_percent':
+            self.input_aggregator.submit_preset('transparency', current_transparency_config['preset_xbutton2_shift'])
+            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
+        elif action == 'set_30_percent':
+            self.input_aggregator.submit_preset('transparency', current_transparency_config['preset_xbutton1'])
+            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
+        else:
+            self.show_message(f"Unhandled AHK hotkey action: {action}", "orange")
+
+    def _ahk_center_window_callback(self):
+        """
+        Callback for AHK hotkey to center the active window.
+        Captures the foreground window and queues the centering logic for the main GUI thread.
+        """
+        if not self.script_enabled:
+            return
+        
+        hotkey_config_str = self.settings['hotkeys']['center_window']
+        if not self.check_modifiers_match('center_window'):
+            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
+                print(f"DEBUG: Modifiers mismatch for center_window with hotkey '{hotkey_config_str}'. Current modifier mask: {self.modifier_state.read():#x}")
+            return
+
+        self.commands.post('center_window', self._handle_center_window_hotkey, self.window_system.get_foreground_window())
+
+    def _handle_center_window_hotkey(self, hwnd):
+        """Centers hwnd (the foreground window when the hotkey fired) on the engine thread."""
+        if not hwnd or self._is_own_ui_window(hwnd):
+            self.show_message("Cannot center UI window.", "red")
+            return
+        
+        # Corrected: Use _is_window_excluded - this is now handled inside _center_window.
+        # if self._is_window_excluded(hwnd):
+        #     self.show_message("Cannot center excluded window.", "red")
+        #     return
+
+        self._center_window(hwnd, show_tooltip=True)
+
+    def _ahk_minimize_others_callback(self):
+        """
+        Callback for AHK hotkey to minimize all windows except the clicked one.
+        Captures the cursor position and queues the minimization logic for the main GUI thread.
+        """
+        if not self.script_enabled:
+            return
+
+        hotkey_config_str = self.settings['hotkeys']['minimize_others']
+        if not self.check_modifiers_match('minimize_others'):
+            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
+                print(f"DEBUG: Modifiers mismatch for minimize_others with hotkey '{hotkey_config_str}'. Current modifier mask: {self.modifier_state.read():#x}")
+            return
+
+        self.commands.post('minimize_others', self._handle_minimize_others_hotkey, self.window_system.get_cursor_pos())
+
+    def _handle_minimize_others_hotkey(self, cursor_pos):
+        """Minimizes everything except the top-level window under cursor_pos, on the engine thread."""
+        mouse_x, mouse_y = cursor_pos
+        clicked_hwnd_at_point = self.window_system.window_from_point((mouse_x, mouse_y)) # Get the window at the mouse point
+
+        # Get the top-level parent window for the clicked HWND
+        # This ensures we are working with a top-level window that EnumWindows will find.
+        keep_hwnd = self.window_system.get_root(clicked_hwnd_at_point)
+
+        if not keep_hwnd or not self.window_system.is_visible(keep_hwnd) or not self.safe_win32.get_window_text(keep_hwnd):
+            self.show_message("No valid top-level window found under cursor to keep open.", "red")
+            return
+
+        if self._is_own_ui_window(keep_hwnd):
+            self.show_message("Cannot minimize others based on UI window.", "red")
+            return
+
+        self._minimize_all_except_one(keep_hwnd, "Minimized others!")
+
+    def _minimize_all_except_one(self, keep_hwnd, tooltip_message, use_active_window=False):
+        """
+        Minimizes all visible windows except the specified keep_hwnd.
+        If use_active_window is True, keep_hwnd is ignored and foreground window is used.
+        """
+        if use_active_window:
+            keep_hwnd = self.window_system.get_foreground_window()
+
+        if not keep_hwnd or not self.window_system.is_window(keep_hwnd) or not self.window_system.is_visible(keep_hwnd) or not self.safe_win32.get_window_text(keep_hwnd):
+            self.show_message("No valid window to keep open.", "red")
+            return
+
+        snapshot = self.window_snapshots.get(fresh=True) # An explicit action: include windows opened since the last scan
+        for hwnd in snapshot.visible_titled_hwnds(): # Skip invisible or nameless windows
+            if hwnd == keep_hwnd:
+                continue # Don't minimize the target window
+
+            if self._is_own_ui_window(hwnd):
+                continue # Skip script's own windows
+
+            # NEW: Explicitly exclude Electricsheep from minimization if crash protection is enabled
+            if self.settings['enable_hotkey_passthrough']:
+                exe_name = self.window_metadata.get_exe_name(hwnd)
+                window_class = snapshot.get(hwnd).class_name
+                if (exe_name and exe_name.lower() == 'es') or \
+                   (window_class and window_class.lower() == 'electricsheepwndclass'):
+                    self.show_message(f"Skipping minimization for Electricsheep (HWND: {hwnd}) due to crash protection.", "yellow")
+                    continue # Skip Electricsheep
+
+            # Original exclusion check (for general exclusions)
+            if self._is_window_excluded(hwnd):
+                continue # Skip generally excluded windows
+
+            # Check if already minimized
+            if snapshot.get(hwnd).iconic:
+                continue # Already minimized, skip
+
+            try:
+                self.safe_win32.show_window(hwnd, SW_MINIMIZE)
+            except Exception as e:
+                self.show_message(f"Failed to minimize HWND {hwnd}: {e}", "orange")
+
+        self.window_snapshots.invalidate()
+        self.show_tooltip(tooltip_message, x_offset=self.settings['focus_tooltip_x_position'], y_offset=self.settings['focus_tooltip_y_position'])
+
+
+    def toggle_focus_mode(self):
+        """Toggles the script's focus mode enabled state."""
+        self.focus_mode_active = not self.focus_mode_active
+        self.settings['focus_mode_active'] = self.focus_mode_active
+        self.save_settings()
+        
+        if self.focus_mode_active:
+            tooltip_text = "Focus Mode ON"
+        else:
+            tooltip_text = "Focus Mode OFF"
+            # When turning off focus mode, ensure all previously minimized windows are restored if desired.
+            # The AHK script doesn't restore, it just stops minimizing. We will follow that.
+
+        self.show_tooltip(tooltip_text, x_offset=self.settings['focus_tooltip_x_position'], y_offset=self.settings['focus_tooltip_y_position'])
+        self.show_message(f"Focus Mode state changed to: {self.focus_mode_active}", "blue")
+        self.register_hotkeys() # Re-register hotkeys to reflect focus mode state for Alt+Tab
+
+    def _ahk_toggle_focus_mode_callback(self):
+        """Called when the toggle focus mode hotkey is pressed. Queues the UI update for the main thread."""
+        self.commands.post('toggle_focus_mode', self.toggle_focus_mode)
+
+    def _ahk_focus_mode_alt_tab_callback(self):
+        """
+        Callback for AHK hotkey Alt+Tab when focus mode is active.
+        Queues the minimization logic for the main GUI thread (which runs it after a delay).
+        """
+        hotkey_config_str = self.settings['hotkeys']['focus_mode_alt_tab']
+        if not self.check_modifiers_match('focus_mode_alt_tab'):
+            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
+                print(f"DEBUG: Modifiers mismatch for focus_mode_alt_tab with hotkey '{hotkey_config_str}'. Current modifier mask: {self.modifier_state.read():#x}")
+            return
+
+        self.commands.post('focus_mode_alt_tab', self._handle_focus_mode_alt_tab_hotkey)
+
+    def _handle_focus_mode_alt_tab_hotkey(self):
+        """Schedules the focus-mode minimization after the Alt+Tab delay (engine thread)."""
+        if self.focus_mode_active:
+            delay = self.settings['focus_mode_alt_tab_delay_ms']
+            self.loop.after(delay, lambda: self._minimize_all_except_one(None, "Focus Mode: Minimized others!", use_active_window=True))
+        else:
+            # If focus mode is off, the Alt+Tab hotkey still triggers but does nothing.
+            # This matches the AHK script's behavior where the `if (is_focus_mode_active)` check is inside the hotkey.
+            pass
+
+    def toggle_script_from_hotkey(self):
+        """Called when the toggle hotkey is pressed. Queues the UI update for the main thread."""
+        self.commands.post('toggle_script', self._handle_toggle_script_hotkey)
+
+    def _handle_toggle_script_hotkey(self):
+        """Toggles the script from the hotkey (engine thread)."""
+        self.show_message("Toggle script hotkey pressed.", "blue")
+        self.toggle_script()
+
+    def _ahk_open_settings_callback(self):
+        """Callback for the open-settings hotkey; runs in the hotkey thread."""
+        self.commands.post('open_settings', self.open_settings_ui)
+
+    def toggle_script(self):
+        """Toggles the script's enabled state."""
+        self.script_enabled = not self.script_enabled
+        self.settings['script_enabled'] = self.script_enabled
+        self.save_settings()
+        self.update_status_label()
+        self.register_hotkeys()
+        self.periodic.refresh() # Pauses or resumes the foreground check
+        if not self.script_enabled:
+            self.hide_tooltip()
+        self.show_message(f"Script enabled state changed to: {self.script_enabled}", "green")
+
+    def _initialize_hotkey_maps(self):
+        """Initializes internal and display mappings for hotkeys, compatible with AHK and custom order."""
+        self.internal_to_display_map, self.display_to_internal_map = build_hotkey_key_maps()
+        self.hotkey_compiler = HotkeyCompiler(self.internal_to_display_map)
+
+    def check_modifiers_match(self, action):
+        """
+        Checks if the currently pressed modifiers (Win, Ctrl, Shift, Alt)
+        exactly match the modifiers of the compiled hotkey for action, using the modifier state bitmask.
+        """
+        return self.modifier_state.read() == self.hotkey_specs[action].modifiers
+
+    def _apply_aggregated_input(self, channel, new_level, step):
+        """Applies one coalesced batch of wheel/preset input (called by InputAggregator on the GUI thread)."""
+        if channel == 'transparency':
+            self.update_transparency_gui(new_level=new_level, step=step)
+        elif channel == 'brightness':
+            self._update_brightness_gui(new_level=new_level, step=step)
+
+    def update_transparency_gui(self, new_level=None, step=0):
+        """
+        Updates the transparency of the foreground window and shows a tooltip.
+        new_level sets an absolute level; step (already scaled by the scroll increment) is added on top.
+        This function is called on the main GUI thread by the input aggregator.
+        """
+        if not self.script_enabled:
+            return
+
+        hwnd = self.window_system.get_foreground_window()
+        if not hwnd or self._is_own_ui_window(hwnd):
+            return
+
+        # Corrected: Use _is_window_excluded
+        if self._is_window_excluded(hwnd):
+            # If the foreground window is excluded, do not apply transparency changes via hotkey.
+            self.show_tooltip(f"'{self.window_metadata.get_exe_name(hwnd) or self.window_metadata.get_class_name(hwnd)}' is excluded from transparency changes.")
+            self.show_message(f"Attempted to change transparency for excluded window '{self.window_metadata.get_exe_name(hwnd) or self.window_metadata.get_class_name(hwnd)}'. Ignored.", "yellow")
+            return
+
+        # If dynamic transparency is enabled, hotkeys should modify the 'active' level
+        if self.settings['dynamic_transparency_enabled']:
+            # Hotkeys should always be able to change transparency of the foreground window
+            # if dynamic transparency is enabled, regardless of 'manage_all' or 'manual update' settings.
+            # The foreground window is explicitly targeted by the user.
+
+            current_active_level = self.settings['active_window_transparency']
+            calculated_new_active_level = current_active_level # Initialize with current for cases where new_level is None
+
+            if new_level is not None:
+                calculated_new_active_level = new_level
+            calculated_new_active_level += step
+
+            calculated_new_active_level = max(self.settings['transparency_levels']['min'],
+                                   min(self.settings['transparency_levels']['max'],
+                                       calculated_new_active_level))
+            self.settings['active_window_transparency'] = calculated_new_active_level # THIS LINE IS KEY FOR THE NUANCE
+            self.current_transparency_level = calculated_new_active_level # Keep for tooltip display consistency
+            
+            # Crucially, add the window to managed_by_script_hwnds if hotkey was successful
+            self.managed_by_script_hwnds.add(hwnd) # Ensure it's now dynamically managed
+            self.save_settings() # Save the updated active level
+            
+            # Reapply dynamic transparency to ensure all windows are updated, especially the foreground one
+            # and potentially other inactive ones.
+            self._reapply_dynamic_transparency_on_all_windows(force_all=self.settings['manage_all_windows_dynamically'])
+
+        else: # Dynamic transparency is NOT enabled, use the old logic for direct transparency
+            # Hotkey changes should directly apply to the foreground window if dynamic is OFF.
+            if new_level is not None:
+                self.current_transparency_level = new_level
+            self.current_transparency_level += step
+
+            self.current_transparency_level = max(self.settings['transparency_levels']['min'],
+                                                  min(self.settings['transparency_levels']['max'],
+                                                      self.current_transparency_level))
+            # Apply transparency to the current foreground window
+            success = self.transparency.apply(hwnd, self.current_transparency_level)
+            if success:
+                # If not dynamically managed, hotkey changes add it to managed for potential future restoration
+                # or if dynamic mode is later enabled.
+                self.managed_by_script_hwnds.add(hwnd)
+            else:
+                if self.last_processed_hwnd != hwnd:
+                    self.show_tooltip(f"Failed to set transparency for window.", "red")
+                    reason = self.transparency.failure_reason(hwnd) or FAILURE_UNRESPONSIVE
+                    self.show_message(f"Could not set transparency for HWND {hwnd} ({reason}). It might not support layering or require elevated privileges.", "red")
+                self.last_processed_hwnd = hwnd
+
+
+        self.show_tooltip(f"Transparency: {self.current_transparency_level}%")
+        self.last_processed_hwnd = hwnd # Update last processed HWND regardless of success for message suppression
+
+    def kill_script(self):
+        """
+        Failsafe hotkey to initiate a clean shutdown (runs on the engine thread via the command queue).
+        A timer on the hotkey thread's side exits the process outright if the engine thread is wedged.
+        """
+        self.commands.post('kill_script', self._handle_kill_script_hotkey)
+        if self._kill_fallback_timer is None:
+            self._kill_fallback_timer = threading.Timer(self.KILL_SCRIPT_FALLBACK_S, self._kill_script_fallback)
+            self._kill_fallback_timer.daemon = True
+            self._kill_fallback_timer.start()
+
+    def _kill_script_fallback(self):
+        """
+        Runs on the fallback timer thread if the queued shutdown never started: restores windows directly
+        (on another thread, in case a hung window blocks a call) and exits.
+        """
+        if self._kill_handled.is_set():
+            return
+        print(f"Kill hotkey not handled within {self.KILL_SCRIPT_FALLBACK_S:.0f} s (engine thread unresponsive). Forcing exit.")
+        restorer = threading.Thread(target=self._emergency_restore, name="EmergencyRestore", daemon=True)
+        restorer.start()
+        restorer.join(self.KILL_SCRIPT_RESTORE_TIMEOUT_S)
+        os._exit(1)
+
+    def _emergency_restore(self):
+        """
+        Best-effort version of the restore in on_closing, safe off the engine thread: every window left
+        transparent goes back to full opacity and windows we minimized are restored, with plain window
+        system calls that bypass the engine's reconciler and SafeWin32 pool.
+        """
+        restored = 0
+        for hwnd in self.transparency.transparent_hwnds():
+            try:
+                if self.window_system.apply_layered_alpha(hwnd, None, 255)[0]:
+                    restored += 1
+            except Exception:
+                pass
+        try:
+            minimized = list(self.minimized_by_script_hwnds)
+        except RuntimeError: # Changed size while copying
+            minimized = []
+        for hwnd in minimized:
+            try:
+                self.window_system.show_window_async(hwnd, SW_RESTORE)
+            except Exception:
+                pass
+        print(f"Restored {restored} windows to full opacity and {len(minimized)} minimized windows.")
+
+    def _handle_kill_script_hotkey(self):
+        """Shuts down from the kill hotkey (engine thread)."""
+        self._kill_handled.set()
+        self.show_message("Kill hotkey pressed. Exiting script.", "red")
+        self.on_closing()
+
+    def on_closing(self):
+        """Stops hotkeys and monitoring, restores managed windows, saves settings and stops the loop."""
+        self.hotkey_backend.stop_hotkeys()
+        if self.startup_pass:
+            self.startup_pass.cancel()
+
+        self.periodic.stop()
+        self.inactivity.stop() # NEW: Cancel inactivity timer
+
+        if self.win_event_source:
+            self.win_event_source.stop()
+
+        self.brightness_worker.stop()
+        self.window_scan_worker.stop()
+
+        # Restore any dynamically transparent windows to full opacity before closing
+        self._restore_managed_transparency_to_full_opacity()
+
+        # NEW: Restore any windows minimized by the script to full size before closing
+        for hwnd in list(self.minimized_by_script_hwnds):
+            if self.window_system.is_window(hwnd) and not self._is_window_excluded(hwnd): # Only restore if NOT excluded
+                self.safe_win32.show_window(hwnd, SW_RESTORE)
+        self.minimized_by_script_hwnds.clear() # Clear the set after restoring/ignoring
+
+        self.save_settings()
+        self.settings_store.close()
+        self.safe_win32.close()
+        self.loop.stop()
+
+# --- Settings Panel Sections ---
+
+class LazySection:
+    """
+    A collapsible group in the settings panel. Only the header button exists until the group is first
+    expanded; then build(content_frame) creates its widgets, once. Collapsing just hides them.
+    """
+    def __init__(self, parent, title, build, on_toggle=None):
+        self.title = title
+        self._build = build
+        self._on_toggle = on_toggle
+        self.content = None
+        self.expanded = False
+        self.build_ms = None
+        self.frame = customtkinter.CTkFrame(parent)
+        self.frame.pack(pady=10, padx=10, anchor="center")
+        self.header = customtkinter.CTkButton(self.frame, text=f"\u25B8 {title}", command=self.toggle,
+                                              fg_color="transparent", font=customtkinter.CTkFont(weight="bold"))
+        self.header.pack(pady=5, anchor="center")
+
+    @property
+    def built(self):
+        return self.content is not None
+
+    def ensure_built(self):
+        """Builds the section's widgets if that has not happened yet."""
+        if self.content is None:
+            start = time.perf_counter()
+            self.content = customtkinter.CTkFrame(self.frame, fg_color="transparent")
+            self._build(self.content)
+            self.build_ms = (time.perf_counter() - start) * 1000
+
+    def expand(self):
+        self.ensure_built()
+        self.content.pack(anchor="center")
+        self.expanded = True
+        self.header.configure(text=f"\u25BE {self.title}")
+
+    def collapse(self):
+        if self.content is not None:
+            self.content.pack_forget()
+        self.expanded = False
+        self.header.configure(text=f"\u25B8 {self.title}")
+
+    def toggle(self):
+        if self.expanded:
+            self.collapse()
+        else:
+            self.expand()
+        if self._on_toggle:
+            self._on_toggle(self)
+
+class TransparencyControllerApp(TransparencyEngine):
+    """The settings panel: a customtkinter window over a TransparencyEngine running on the Tk main loop."""
+    _CUSTOM_KEY_DISPLAY_ORDER = [
+        'None',
+        'Backspace', 'Tab', 'Enter', 'Esc', 'Space', 'Page Up', 'Page Down', 'End', 'Home',
+        'Left', 'Up', 'Right', 'Down', 'Ins', 'Del',
+        '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+        'Numpad 0', 'Numpad 1', 'Numpad 2', 'Numpad 3', 'Numpad 4', 'Numpad 5', 'Numpad 6', 'Numpad 7', 'Numpad 8', 'Numpad 9',
+        'Num *', 'Num +', 'Num -', 'Num .', 'Num /',
+        'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'F9', 'F10', 'F11', 'F12',
+        'Mouse Left Click', 'Mouse Right Click', 'Mouse Middle Click', 'Mouse XButton1', 'Mouse XButton2', 'Mouse Wheel Up', 'Mouse Wheel Down',
+        '~', '-', '=', '[', ']', ';', "'", ',', '.', '\\', '/'
+    ]
+    
+    _CHROMA_KEY_COLOR_HEX = "#00FF00"
+
+    def __init__(self, root, win_event_source=None, modifier_state=None, hotkey_backend=None, window_system=None):
+        load_gui_toolkit()
+        self.root = root
+        self.tooltip_timer = None
+        self.hotkey_capture_active = False
+        self.changer_window = None # Ensure changer_window is initialized to None early
+        self.setting_entries = {}
+        self.exclusion_list_entries = {}
+
+        self._last_mouse_label_pos = None
+
+        self.tooltip_following = False
+        self._last_tooltip_cursor_pos = None
+
+        self.status_label = None # Built with the panel, after the engine has started
+        self.hotkey_labels = {}
+        self.settings_sections = {}
+
+        super().__init__(TkEngineLoop(root), win_event_source, modifier_state, hotkey_backend, window_system)
+
+        # Fix for clicking out of variable boxes
+        self.root.bind_all("<Button-1>", self._on_click_anywhere)
+        self.apply_theme_settings()
+
+        self.root.title("Transparency Controller")
+        self.root.geometry(INITIAL_WINDOW_SIZE)
+        self.root.resizable(True, True)
+        self.root.attributes('-topmost', self.settings['ui_always_on_top'])
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        max_backoff = self.settings['idle_poll_max_backoff']
+        self.periodic.add_task('mouse_position', self.update_mouse_position_label, 100,
+                               enabled=lambda: self.settings['show_mouse_position_ui'], max_backoff=max_backoff)
+        self.periodic.add_task('tooltip_follow', self._update_tooltip_position, 20,
+                               enabled=lambda: self.tooltip_following, max_backoff=3) # Keep the tooltip responsive
+
+        # --- FIX: Create tooltip window BEFORE populating initial HWNDs ---
+        self.setup_tooltip_window() 
+        # --- END FIX ---
+        self._mark_startup('panel_window_ready')
+
+        # Hotkeys and monitoring go live before any panel widget is built.
+        self.start()
+
+        self.scrollable_frame = customtkinter.CTkScrollableFrame(self.root)
+        self.scrollable_frame.pack(pady=10, padx=10, fill="both", expand=True)
+        self.create_widgets(self.scrollable_frame) # create_widgets will now use the existing tooltip_window
+        self.update_status_label()
+        self._mark_startup('panel_built')
+        self.show_message(f"Settings panel built {self.startup_timings['panel_built']:.0f} ms after startup.", "blue")
+
+    def _on_click_anywhere(self, event):
+        """Handles click events globally to clear focus from entry widgets."""
+        # If the clicked widget is NOT an entry, focus the root window (clearing entry focus)
+        if not isinstance(event.widget, (customtkinter.CTkEntry, tk.Entry)):
+            self.root.focus_set()
+
+    def apply_theme_settings(self):
+        """Applies CustomTkinter theme and appearance mode based on settings."""
+        customtkinter.set_appearance_mode(self.settings['appearance_mode'])
+        customtkinter.set_default_color_theme(self.settings['theme_color'])
+
+    def create_widgets(self, parent_frame):
+        """
+        Creates the panel: a collapsible LazySection per settings group, plus the always-visible controls.
+        Each group's widgets are built by its _build_*_section method the first time it is expanded.
+        """
+        self.settings_sections = {}
+        for name, title, build in (
+            ('appearance', "Appearance Settings", self._build_appearance_section),
+            ('hotkeys', "Hotkey Configuration", self._build_hotkeys_section),
+            ('transparency', "Transparency Settings", self._build_transparency_section),
+            ('tooltip', "Tooltip Settings", self._build_tooltip_section),
+            ('brightness', "Brightness Settings", self._build_brightness_section),
+            ('advanced', "Advanced Window Management", self._build_advanced_section),
+            ('focus_mode', "Focus Mode Settings", self._build_focus_mode_section),
+        ):
+            self.settings_sections[name] = LazySection(parent_frame, title, build, on_toggle=self._on_settings_section_toggled)
+        # Sections left open last time are built after the window first paints, one per idle slot.
+        for name in self.settings['expanded_settings_sections']:
+            if name in self.settings_sections:
+                self.root.after_idle(self.settings_sections[name].expand)
+
+        # CHANGED: Removed fill="x"
+        control_frame = customtkinter.CTkFrame(parent_frame)
+        control_frame.pack(pady=10, padx=10, anchor="center")
+        self.status_label = customtkinter.CTkLabel(control_frame, text="Status: Initializing...")
+        self.status_label.pack(pady=5, anchor="center")
+
+        self.toggle_button = customtkinter.CTkButton(control_frame, text="Toggle Script (Alt+W)", command=self.toggle_script)
+        self.toggle_button.pack(pady=5, anchor="center")
+
+        # NEW: Restore All Managed Windows to 100% button
+        restore_button = customtkinter.CTkButton(control_frame, text="Restore All Managed Windows to 100%", command=self.restore_all_managed_to_full_opacity)
+        restore_button.pack(pady=5, anchor="center")
+
+        reset_button = customtkinter.CTkButton(control_frame, text="Reset to Defaults", command=self.reset_to_defaults)
+        reset_button.pack(pady=5, anchor="center")
+
+        diagnostics_button = customtkinter.CTkButton(control_frame, text="Print Diagnostics", command=self.print_diagnostics)
+        diagnostics_button.pack(pady=5, anchor="center")
+
+        self.mouse_pos_label = customtkinter.CTkLabel(self.root, text="")
+        self.mouse_pos_label.pack(side="bottom", anchor="s", padx=10, pady=5)
+
+    def _on_settings_section_toggled(self, section):
+        """Remembers which sections are open, so the panel reopens the same way."""
+        self.settings['expanded_settings_sections'] = [name for name, s in self.settings_sections.items() if s.expanded]
+        self.save_settings()
+
+    def _build_appearance_section(self, appearance_frame):
+        """Builds the Appearance Settings widgets (on first expand)."""
+        # --- Theme Color and Appearance Mode on one line ---
+        theme_mode_row_frame = customtkinter.CTkFrame(appearance_frame, fg_color="transparent")
+        theme_mode_row_frame.pack(pady=2, anchor="center")
+
+        theme_col_frame = customtkinter.CTkFrame(theme_mode_row_frame, fg_color="transparent")
+        theme_col_frame.pack(side="left", padx=10, pady=2, expand=True)
+        customtkinter.CTkLabel(theme_col_frame, text="Theme Color:").pack(pady=(0,2), anchor="center")
+        self.theme_menu_var = customtkinter.StringVar(value=self.settings['theme_color'])
+        self.theme_menu = customtkinter.CTkOptionMenu(theme_col_frame, values=['green', 'blue', 'dark-blue'],
+                                                 variable=self.theme_menu_var,
+                                                 command=self.change_theme_color)
+        self.theme_menu.pack(pady=(2,0), anchor="center")
+
+        appearance_mode_col_frame = customtkinter.CTkFrame(theme_mode_row_frame, fg_color="transparent")
+        appearance_mode_col_frame.pack(side="left", padx=10, pady=2, expand=True)
+        customtkinter.CTkLabel(appearance_mode_col_frame, text="Mode:").pack(pady=(0,2), anchor="center")
+        self.appearance_menu_var = customtkinter.StringVar(value=self.settings['appearance_mode'])
+        self.appearance_menu = customtkinter.CTkOptionMenu(appearance_mode_col_frame, values=['System', 'Dark', 'Light'],
+                                                      variable=self.appearance_menu_var,
+                                                      command=self.change_appearance_mode)
+        self.appearance_menu.pack(pady=(2,0), anchor="center")
+        # --- End Theme Color and Appearance Mode ---
+
+        # --- Always On Top and Mouse Position on one line ---
+        checkbox_row_frame = customtkinter.CTkFrame(appearance_frame, fg_color="transparent")
+        checkbox_row_frame.pack(pady=5, anchor="center", fill="x")
+
+        # Frame for "Always On Top" checkbox
+        ui_topmost_col_frame = customtkinter.CTkFrame(checkbox_row_frame, fg_color="transparent")
+        ui_topmost_col_frame.pack(side="left", padx=10, expand=True, fill="x")
+        self.ui_topmost_checkbox = customtkinter.CTkCheckBox(ui_topmost_col_frame,
+                                                             text="Always On Top",
+                                                             command=self.toggle_ui_topmost)
+        self.ui_topmost_checkbox.pack(anchor="center") # Centered within its column frame
+        if self.settings['ui_always_on_top']:
+            self.ui_topmost_checkbox.select()
+        else:
+            self.ui_topmost_checkbox.deselect()
+
+        # Frame for "Mouse Position" checkbox
+        show_mouse_pos_col_frame = customtkinter.CTkFrame(checkbox_row_frame, fg_color="transparent")
+        show_mouse_pos_col_frame.pack(side="left", padx=10, expand=True, fill="x")
+        self.show_mouse_pos_checkbox = customtkinter.CTkCheckBox(show_mouse_pos_col_frame,
+                                                                 text="Mouse Position",
+                                                                 command=self.toggle_show_mouse_position_ui)
+        self.show_mouse_pos_checkbox.pack(anchor="center") # Centered within its column frame
+        if self.settings['show_mouse_position_ui']:
+            self.show_mouse_pos_checkbox.select()
+        else:
+            self.show_mouse_pos_checkbox.deselect()
+        # --- End Always On Top and Mouse Position ---
+
+        self.restart_warning_label = customtkinter.CTkLabel(appearance_frame,
+                                                            text="Warning: Restart needed for full theme changes. Click to restart.",
+                                                            text_color="yellow",
+                                                            cursor="hand2",
+                                                            wraplength=300)
+        self.restart_warning_label.pack(pady=5, anchor="center")
+        self.restart_warning_label.pack_forget()
+        self.restart_warning_label.bind("<Button-1>", lambda event: self.restart_app())
 
-        self.window_monitor_inactivity_timer = self.root.after(self.settings['window_monitor_interval_ms'], self._check_for_inactive_windows)
+    def _build_hotkeys_section(self, hotkey_frame):
+        """Builds the Hotkey Configuration widgets (on first expand)."""
+        self.hotkey_labels = {}
+        for action, hotkey in self.settings['hotkeys'].items():
+            row_frame = customtkinter.CTkFrame(hotkey_frame, fg_color="transparent")
+            # CHANGED: anchor="w" to align rows left within the centered block
+            row_frame.pack(pady=2, anchor="w")
 
-    def _restore_managed_windows_to_full_opacity(self):
-        """Restores all windows currently managed by the script to 100% opacity,
-        unless they are currently in the exclusion list. Excluded windows are simply
-        removed from the managed set without their transparency being altered by the script."""
+            customtkinter.CTkLabel(row_frame, text=f"{action.replace('_', ' ').title()}:", width=150, anchor="w").pack(side="left", padx=5)
+
+            display_text = self._get_hotkey_display_text(action, hotkey)
+            self.hotkey_labels[action] = customtkinter.CTkLabel(row_frame, text=display_text, width=120, anchor="w")
+            self.hotkey_labels[action].pack(side="left", padx=5)
+
+            change_button = customtkinter.CTkButton(row_frame, text="Change", width=60,
+                                                    command=lambda a=action: self.open_manual_hotkey_changer(a))
+            change_button.pack(side="right", padx=5)
+
+    def _build_transparency_section(self, transparency_settings_frame):
+        """Builds the Transparency Settings widgets (on first expand)."""
+        self.create_setting_entry(transparency_settings_frame, "Initial Level (%):", 'transparency_levels', 'initial')
+        self.create_setting_entry(transparency_settings_frame, "Min Level (%):", 'transparency_levels', 'min')
+        self.create_setting_entry(transparency_settings_frame, "Max Level (%):", 'transparency_levels', 'max')
+        self.create_setting_entry(transparency_settings_frame, "Slow Scroll Inc:", 'transparency_levels', 'scroll_increment_slow')
+        self.create_setting_entry(transparency_settings_frame, "Fast Scroll Inc:", 'transparency_levels', 'scroll_increment_fast')
+        self.create_setting_entry(transparency_settings_frame, "Fast Scroll Threshold (ms):", 'transparency_levels', 'fast_scroll_threshold_ms')
+        self.create_setting_entry(transparency_settings_frame, "XButton2 Preset (%):", 'transparency_levels', 'preset_xbutton2')
+        self.create_setting_entry(transparency_settings_frame, "Ctrl+Shift+XButton2 Preset (%):", 'transparency_levels', 'preset_xbutton2_shift')
+        self.create_setting_entry(transparency_settings_frame, "XButton1 Preset (%):", 'transparency_levels', 'preset_xbutton1')
         
-        hwnds_to_remove = set()
-        for hwnd in list(self.managed_by_script_hwnds): # Iterate a copy for safe modification
-            if not win32gui.IsWindow(hwnd):
-                hwnds_to_remove.add(hwnd)
-                continue
+        # NEW: Reset Transparency on Scroll Start checkbox
+        self.transparency_reset_on_scroll_checkbox = customtkinter.CTkCheckBox(transparency_settings_frame,
+                                                                          text="Reset Transparency on Scroll Start",
+                                                                          command=lambda: self._update_setting_from_checkbox('reset_on_scroll_start', self.transparency_reset_on_scroll_checkbox, category='transparency_levels'))
+        self.transparency_reset_on_scroll_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['transparency_levels']['reset_on_scroll_start']:
+            self.transparency_reset_on_scroll_checkbox.select()
+        else:
+            self.transparency_reset_on_scroll_checkbox.deselect()
+
+    def _build_tooltip_section(self, tooltip_settings_frame):
+        """Builds the Tooltip Settings widgets (on first expand)."""
+        self.create_setting_entry(tooltip_settings_frame, "Tooltip X Offset:", 'tooltip_x_position', None, is_top_level=True)
+        self.create_setting_entry(tooltip_settings_frame, "Tooltip Y Offset:", 'tooltip_y_position', None, is_top_level=True)
+        self.create_setting_entry(tooltip_settings_frame, "Tooltip Alpha (0.0-1.0):", 'tooltip_alpha', None, is_top_level=True, value_type=float, increment=0.01)
+
+    def _build_brightness_section(self, brightness_settings_frame):
+        """Builds the Brightness Settings widgets (on first expand)."""
+        self.create_setting_entry(brightness_settings_frame, "Initial Level (%):", 'brightness_levels', 'initial')
+        self.create_setting_entry(brightness_settings_frame, "Min Level (%):", 'brightness_levels', 'min')
+        self.create_setting_entry(brightness_settings_frame, "Max Level (%):", 'brightness_levels', 'max')
+        self.create_setting_entry(brightness_settings_frame, "Slow Scroll Inc:", 'brightness_levels', 'scroll_increment_slow')
+        self.create_setting_entry(brightness_settings_frame, "Fast Scroll Inc:", 'brightness_levels', 'scroll_increment_fast')
+        self.create_setting_entry(brightness_settings_frame, "Fast Scroll Threshold (ms):", 'brightness_levels', 'fast_scroll_threshold_ms')
+        self.create_setting_entry(brightness_settings_frame, "XButton2 Preset (%):", 'brightness_levels', 'preset_xbutton2')
+        self.create_setting_entry(brightness_settings_frame, "XButton1 Preset (%):", 'brightness_levels', 'preset_xbutton1')
+
+        self.brightness_reset_on_scroll_checkbox = customtkinter.CTkCheckBox(brightness_settings_frame,
+                                                                          text="Reset Brightness on Scroll Start",
+                                                                          command=lambda: self._update_setting_from_checkbox('reset_on_scroll_start', self.brightness_reset_on_scroll_checkbox, category='brightness_levels'))
+        self.brightness_reset_on_scroll_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['brightness_levels']['reset_on_scroll_start']:
+            self.brightness_reset_on_scroll_checkbox.select()
+        else:
+            self.brightness_reset_on_scroll_checkbox.deselect()
+
+    def _build_advanced_section(self, advanced_transparency_frame):
+        """Builds the Advanced Window Management widgets (on first expand)."""
+        self.new_window_transparency_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                          text="Apply transparency to new windows (once)",
+                                                                          command=self.toggle_apply_transparency_to_new_windows)
+        self.new_window_transparency_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['apply_transparency_to_new_windows']:
+            self.new_window_transparency_checkbox.select()
+        else:
+            self.new_window_transparency_checkbox.deselect()
+
+        self.create_setting_entry(advanced_transparency_frame, "New Window Level (%):", 'new_window_transparency_level', None, is_top_level=True)
+
+        self.dynamic_transparency_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                       text="Dynamic Transparency Active/Inactive Manual Update",
+                                                                       command=self.toggle_dynamic_transparency)
+        self.dynamic_transparency_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['dynamic_transparency_enabled']:
+            self.dynamic_transparency_checkbox.select()
+        else:
+            self.dynamic_transparency_checkbox.deselect()
+
+        # New: Controls for granular behavior when "Manage ALL Windows" is OFF
+
+        self.inactive_window_auto_update_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                                                  text="Inactive Window Auto Update",
+                                                                                                  command=lambda: self._update_setting_from_checkbox('inactive_window_auto_update', self.inactive_window_auto_update_checkbox))
+        self.inactive_window_auto_update_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['inactive_window_auto_update']:
+            self.inactive_window_auto_update_checkbox.select()
+        else:
+            self.inactive_window_auto_update_checkbox.deselect()
+
+        self.create_setting_entry(advanced_transparency_frame, "Active Window Level (%):", 'active_window_transparency', None, is_top_level=True)
+        self.create_setting_entry(advanced_transparency_frame, "Inactive Window Level (%):", 'inactive_window_transparency', None, is_top_level=True)
+
+        # NEW: Manage ALL Windows Switch
+        self.manage_all_windows_dynamically_switch = customtkinter.CTkSwitch(advanced_transparency_frame,
+                                                                          text="Manage ALL Windows (Existing & New)",
+                                                                          command=self.toggle_manage_all_windows_dynamically,
+                                                                          onvalue=True, offvalue=False)
+        self.manage_all_windows_dynamically_switch.pack(pady=5, anchor="w", padx=10)
+        if self.settings['manage_all_windows_dynamically']:
+            self.manage_all_windows_dynamically_switch.select()
+        else:
+            self.manage_all_windows_dynamically_switch.deselect()
+
+        # New: Center on First Launch Checkbox
+        self.center_on_first_launch_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                         text="Center new windows (once)", # Changed text
+                                                                         command=self.toggle_center_on_first_launch)
+        self.center_on_first_launch_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['center_on_first_launch']:
+            self.center_on_first_launch_checkbox.select()
+        else:
+            self.center_on_first_launch_checkbox.deselect()
+
+        # New: Prevent Window Edges Off Screen Checkbox
+        self.prevent_edges_off_screen_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                           text="Prevent centered window edges off screen",
+                                                                           command=self.toggle_prevent_window_edges_off_screen)
+        self.prevent_edges_off_screen_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['prevent_window_edges_off_screen']:
+            self.prevent_edges_off_screen_checkbox.select()
+        else:
+            self.prevent_edges_off_screen_checkbox.deselect()
+
+        # NEW: Electricsheep Special Centering Checkbox
+        self.center_electricsheep_special_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                               text="Center Electricsheep (es.exe) with title bar hidden",
+                                                                               command=self.toggle_center_electricsheep_special)
+        self.center_electricsheep_special_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['center_electricsheep_special']:
+            self.center_electricsheep_special_checkbox.select()
+        else:
+            self.center_electricsheep_special_checkbox.deselect()
+
+        # NEW: Electricsheep Crash Protection Checkbox
+        self.enable_hotkey_passthrough_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                                 text="""Enable Hotkey Passthrough Non-Suppressing Exception
+Fixes Electricsheep Hotkey Compatibility """,
+                                                                                 command=self.toggle_enable_hotkey_passthrough)
+        self.enable_hotkey_passthrough_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['enable_hotkey_passthrough']:
+            self.enable_hotkey_passthrough_checkbox.select()
+        else:
+            self.enable_hotkey_passthrough_checkbox.deselect()
+
+        self.native_hotkeys_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                 text="Use in-process hotkey hooks instead of AutoHotkey (restart required)",
+                                                                 command=self.toggle_native_hotkeys)
+        self.native_hotkeys_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['hotkey_backend'] == 'native':
+            self.native_hotkeys_checkbox.select()
+        else:
+            self.native_hotkeys_checkbox.deselect()
+
+        # NEW: Minimize Inactive Windows Checkbox
+        self.minimize_inactive_windows_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                          text="Minimize inactive windows",
+                                                                          command=self.toggle_minimize_inactive_windows)
+        self.minimize_inactive_windows_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['minimize_inactive_windows']:
+            self.minimize_inactive_windows_checkbox.select()
+        else:
+            self.minimize_inactive_windows_checkbox.deselect()
+
+        # NEW: Minimize Inactive Windows settings entries
+        self.create_setting_entry(advanced_transparency_frame, "Minimize after inactive for (ms):", 'minimize_inactive_delay_ms', None, is_top_level=True)
+        self.create_setting_entry(advanced_transparency_frame, "Ignore X oldest inactive windows:", 'minimize_inactive_ignore_count', None, is_top_level=True)
+
+        # NEW: Apply on Script Start checkbox
+        self.apply_on_script_start_checkbox = customtkinter.CTkCheckBox(advanced_transparency_frame,
+                                                                        text="Apply settings on script start",
+                                                                        command=lambda: self._update_setting_from_checkbox('apply_on_script_start', self.apply_on_script_start_checkbox))
+        self.apply_on_script_start_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['apply_on_script_start']:
+            self.apply_on_script_start_checkbox.select()
+        else:
+            self.apply_on_script_start_checkbox.deselect()
+
+        self.create_exclusion_list_entry(advanced_transparency_frame, "Global Exclusions (exe/class, wildcards, re:regex):", 'global_transparency_exclusions')
+
+    def _build_focus_mode_section(self, focus_mode_frame):
+        """Builds the Focus Mode Settings widgets (on first expand)."""
+        self.focus_mode_checkbox = customtkinter.CTkCheckBox(focus_mode_frame,
+                                                             text="Enable Focus Mode",
+                                                             command=self.toggle_focus_mode)
+        self.focus_mode_checkbox.pack(pady=5, anchor="w", padx=10)
+        if self.settings['focus_mode_active']:
+            self.focus_mode_checkbox.select()
+        else:
+            self.focus_mode_checkbox.deselect()
+
+        self.create_setting_entry(focus_mode_frame, "Focus Tooltip X Offset:", 'focus_tooltip_x_position', None, is_top_level=True)
+        self.create_setting_entry(focus_mode_frame, "Focus Tooltip Y Offset:", 'focus_tooltip_y_position', None, is_top_level=True)
+        self.create_setting_entry(focus_mode_frame, "Alt+Tab Delay (ms):", 'focus_mode_alt_tab_delay_ms', None, is_top_level=True)
+
+    def create_setting_entry(self, parent_frame, label_text, category, key, is_top_level=False, value_type=int, increment=1):
+        """Helper to create a label, entry, and apply button for a setting, with scroll/arrow key support."""
+        frame = customtkinter.CTkFrame(parent_frame, fg_color="transparent")
+        # CHANGED: anchor="w" to align rows left within the centered block
+        frame.pack(pady=2, anchor="w")
+
+        customtkinter.CTkLabel(frame, text=label_text, width=200, anchor="w").pack(side="left")
+
+        if is_top_level:
+            initial_value = self.settings[category]
+        else:
+            initial_value = self.settings[category][key]
+
+        entry = customtkinter.CTkEntry(frame, width=80)
+        if value_type == float:
+            entry.insert(0, f"{initial_value:.2f}")
+        else:
+            entry.insert(0, str(initial_value))
+        entry.pack(side="left", padx=5)
+
+        if is_top_level:
+            self.setting_entries[(category,)] = (entry, value_type, increment)
+        else:
+            self.setting_entries[(category, key)] = (entry, value_type, increment)
+
+        entry.bind("<MouseWheel>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_scroll(event, e, c, k, i_tl, vt, inc))
+        entry.bind("<Up>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_arrow_key(event, e, c, k, i_tl, 1, vt, inc))
+        entry.bind("<Down>", lambda event, e=entry, c=category, k=key, i_tl=is_top_level, vt=value_type, inc=increment: self._on_entry_arrow_key(event, e, c, k, i_tl, -1, vt, inc))
+
+        save_button = customtkinter.CTkButton(frame, text="Apply", width=60,
+                                              command=lambda: self.apply_setting(entry, category, key, is_top_level, value_type))
+        save_button.pack(side="left", padx=5)
+
+    def create_exclusion_list_entry(self, parent_frame, label_text, setting_key):
+        """Helper to create a label, entry for an exclusion list, and apply button."""
+        # Separate label onto its own line
+        # CHANGED: anchor="w" to align label left within the centered block
+        customtkinter.CTkLabel(parent_frame, text=label_text, anchor="w").pack(pady=(5, 2), padx=5, anchor="w")
 
-            if self._is_window_excluded(hwnd):
-                # If currently excluded, just remove from managed set, DO NOT touch transparency.
-                hwnds_to_remove.add(hwnd)
-                # print(f"DEBUG: _restore_managed: Excluded window '{get_window_exe_name(hwnd) or get_window_class_name(hwnd)}' (HWND: {hwnd}) not restored to 100% opacity (removed from managed set).")
-            else:
-                # If not excluded, restore to 100%
-                set_transparency_for_hwnd(hwnd, 100)
-                hwnds_to_remove.add(hwnd) # Mark for removal after restoration
+        frame = customtkinter.CTkFrame(parent_frame, fg_color="transparent")
+        # CHANGED: anchor="w" to align entry left within the centered block
+        frame.pack(pady=2, anchor="w", fill="x")
 
-        # Remove all processed HWNDs from the managed set
-        self.managed_by_script_hwnds.difference_update(hwnds_to_remove)
+        initial_value = self.settings[setting_key]
+        entry = customtkinter.CTkEntry(frame)
+        entry.insert(0, str(initial_value))
+        entry.pack(side="left", padx=5, fill="x", expand=True)
 
-    def _center_window(self, hwnd, show_tooltip=True):
-        """
-        Centers the specified window on its primary monitor.
-        If show_tooltip is True, displays a tooltip message.
-        """
-        if not win32gui.IsWindow(hwnd) or not win32gui.IsWindowVisible(hwnd) or not win32gui.GetWindowText(hwnd):
-            if show_tooltip:
-                self.show_message("Cannot center window: not visible or invalid.", "red")
-            self.show_message(f"Could not center HWND {hwnd}: not visible or invalid.", "red")
-            return False
+        self.exclusion_list_entries[setting_key] = entry
 
-        # IMPORTANT: If Electricsheep is in global_transparency_exclusions, this check will prevent centering.
-        # It has been removed from DEFAULT_SETTINGS for this purpose.
-        if self._is_window_excluded(hwnd):
-            if show_tooltip:
-                self.show_message("Cannot center excluded window.", "red")
-            self.show_message(f"Could not center HWND {hwnd}: window is excluded.", "red")
-            return False
+        save_button = customtkinter.CTkButton(frame, text="Apply", width=60,
+                                              command=lambda: self.apply_exclusion_list_setting(entry, setting_key))
+        save_button.pack(side="left", padx=5)
 
+    def apply_exclusion_list_setting(self, entry_widget, setting_key):
+        """Applies an exclusion list setting from an entry widget."""
         try:
-            monitor_info = win32api.GetMonitorInfo(win32api.MonitorFromWindow(hwnd, win32con.MONITOR_DEFAULTTOPRIMARY))
-            # 'Monitor' gives the physical screen bounds. 'Work' gives the usable area (excluding taskbar).
-            # For Electricsheep, we want to size it to the *physical* screen width, but position it relative to the work area.
-            monitor_rect = monitor_info['Monitor'] # (left, top, right, bottom) - physical screen
-            work_area = monitor_info['Work']     # (left, top, right, bottom) - usable area
+            value_str = entry_widget.get()
+            cleaned_list = split_exclusion_list(value_str)
+            self.settings[setting_key] = ", ".join(cleaned_list)
+            self._on_exclusion_list_changed()
+            self.save_settings()
+            self.show_message(f"Applied {setting_key.replace('_', ' ').title()}: {self.settings[setting_key]}", "green")
+            if self.exclusion_matcher.invalid_entries:
+                self.show_message(f"Ignoring invalid regex exclusions: {', '.join(self.exclusion_matcher.invalid_entries)}", "orange")
+            
+            # NEW: Trigger re-evaluation for all managed windows and reset inactivity tracking
+            # Crucially, we need to make sure that if an item is removed from the list, it is no longer considered excluded immediately.
+            self._reapply_dynamic_transparency_on_all_windows(force_all=True) # Forces re-evaluation of all windows
+            self._reset_inactivity_tracking_state() # Re-evaluates for minimization based on new exclusions
+            
+        except Exception as e:
+            self.show_message(f"Error applying exclusion list setting: {e}", "red")
 
-            physical_monitor_left = monitor_rect[0]
-            physical_monitor_top = monitor_rect[1]
-            physical_monitor_width = monitor_rect[2] - monitor_rect[0]
-            physical_monitor_height = monitor_rect[3] - monitor_rect[1]
+    def toggle_apply_transparency_to_new_windows(self):
+        """Toggles the 'apply_transparency_to_new_windows' setting."""
+        new_state = self.new_window_transparency_checkbox.get() == 1
+        self.settings['apply_transparency_to_new_windows'] = new_state
+        self.save_settings()
+        self.periodic.refresh() # Resumes or pauses the new-window check
+        self.show_message(f"'Apply transparency to new windows' set to: {new_state}", "blue")
 
-            work_area_left = work_area[0]
-            work_area_top = work_area[1]
-            work_area_width = work_area[2] - work_area[0]
-            work_area_height = work_area[3] - work_area[1]
+    def toggle_dynamic_transparency(self):
+        """Toggles the 'dynamic_transparency_enabled' setting and applies changes."""
+        new_state = self.dynamic_transparency_checkbox.get() == 1
+        self.settings['dynamic_transparency_enabled'] = new_state
+        self.save_settings()
+        self.show_message(f"'Dynamic transparency for active/inactive windows' set to: {new_state}", "blue")
 
-            # NEW: Special handling for Electricsheep
-            if self.settings['center_electricsheep_special']:
-                exe_name = get_window_exe_name(hwnd)
-                window_class = get_window_class_name(hwnd)
-                if (exe_name and exe_name.lower() == 'es') or \
-                   (window_class and window_class.lower() == 'electricsheepwndclass'):
-                    
-                    # Based on user's provided metrics for Electricsheep for a 1920x1200 monitor with 23px taskbar:
-                    # Desired Client area: (1920, 1177) which matches work_area_width, work_area_height
-                    # Desired Window area: (1936, 1216)
-                    # Desired Window position: (-8, -31)
-                    
-                    # New window dimensions (including borders and title bar)
-                    # The goal is for the client area to fill the work area, with the window title bar hidden above.
-                    # This means the window's total width should be physical_monitor_width (1920) + 16 (borders) = 1936
-                    # The window's total height should be physical_monitor_height (1200) + 16 (borders) = 1216
-                    # (assuming 31px for title bar + 8px for bottom border, client height = 1200 - 31 - 8 = 1161, which is not 1177)
-                    # Let's re-evaluate based on the desired "Screen: x: -8 y: -31 w: 1936 h: 1216" for a 1920x1200 screen.
+        # Reapply dynamic transparency to current windows based on the new state.
+        # The _reapply_dynamic_transparency_on_all_windows function will now correctly
+        # handle whether to apply transparency or just remove from managed set without restoring.
+        self._reapply_dynamic_transparency_on_all_windows(force_all=True) # Force re-evaluation of all windows
 
-                    # To achieve a screen position of (-8, -31) and size (1936, 1216):
-                    # The width should be physical_monitor_width + 16 (for 8px borders on each side)
-                    new_width = physical_monitor_width + 16 
-                    # The height should be physical_monitor_height + 16 (for 8px bottom border and 31px title bar, 1200 + 16 = 1216)
-                    new_height = physical_monitor_height + 16 # This assumes 31px title bar + 8px bottom border.
-                    
-                    # Position it such that its left border is 8px left of the monitor's physical left edge
-                    new_x = physical_monitor_left - 8
-                    # Position it such that its top border is 31px above the monitor's physical top edge
-                    new_y = physical_monitor_top - 31
+    def toggle_manage_all_windows_dynamically(self):
+        """
+        Toggles the 'manage_all_windows_dynamically' setting (the switch).
+        When enabled, the script will manage transparency for ALL open windows (if not excluded).
+        When disabled, it will only manage windows that open *after* the script started
+        and were initially processed by 'apply_transparency_to_new_windows' (if respective sub-settings allow).
+        """
+        new_state = self.manage_all_windows_dynamically_switch.get() # CTkSwitch uses .get() directly
+        self.settings['manage_all_windows_dynamically'] = new_state
+        self.save_settings()
+        self.show_message(f"'Manage ALL Windows' set to: {new_state}", "blue")
 
-                    win32gui.MoveWindow(hwnd, new_x, new_y, new_width, new_height, True)
-                    if show_tooltip:
-                        self.show_tooltip("Electricsheep Centered (Title bar hidden)!")
-                    return True # Handled, exit function
+        if new_state: # If switch is ON
+            if self.settings['dynamic_transparency_enabled']:
+                self.show_message("Applying dynamic transparency to all currently open windows.", "blue")
+                # Add all initial non-excluded windows to the managed set
+                for hwnd in self.initial_script_start_hwnds:
+                    if not self._is_window_excluded(hwnd):
+                        self.managed_by_script_hwnds.add(hwnd)
+                self._reapply_dynamic_transparency_on_all_windows(force_all=True)
+            else:
+                self.show_message("Dynamic transparency is off, 'Manage ALL Windows' switch has limited effect.", "orange")
+                # Even if dynamic is off, if 'Manage ALL Windows' is ON, we might still want to track them.
+                # But for transparency, no action is taken.
+        else: # If switch is OFF
+            self.show_message("Stopping automatic dynamic management for windows opened before script started.", "blue")
+            # When manage_all is OFF, we don't automatically restore.
+            # The _reapply_dynamic_transparency_on_all_windows will handle removing
+            # windows from managed_by_script_hwnds that no longer meet criteria,
+            # and restoring their transparency if they were managed by this specific setting.
+            self._reapply_dynamic_transparency_on_all_windows(force_all=False)
 
-            # Original centering logic if not Electricsheep or special centering is off
-            # Get current window dimensions for standard centering
-            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
-            window_width = right - left
-            window_height = bottom - top
+    def toggle_center_on_first_launch(self):
+        """Toggles the 'center_on_first_launch' setting."""
+        new_state = self.center_on_first_launch_checkbox.get() == 1
+        self.settings['center_on_first_launch'] = new_state
+        self.save_settings()
+        self.periodic.refresh() # Resumes or pauses the new-window check
+        self.show_message(f"'Center new windows (once)' set to: {new_state}", "blue")
 
-            # Calculate new centered position relative to work area
-            new_x = work_area_left + (work_area_width - window_width) // 2
-            new_y = work_area_top + (work_area_height - window_height) // 2
+    def toggle_prevent_window_edges_off_screen(self):
+        """Toggles the 'prevent_window_edges_off_screen' setting."""
+        new_state = self.prevent_edges_off_screen_checkbox.get() == 1
+        self.settings['prevent_window_edges_off_screen'] = new_state
+        self.save_settings()
+        self.show_message(f"'Prevent centered window edges off screen' set to: {new_state}", "blue")
 
-            # Apply 'prevent_window_edges_off_screen' logic
-            if self.settings['prevent_window_edges_off_screen']:
-                new_x = max(work_area_left, new_x)
-                new_y = max(work_area_top, new_y) # Ensure top is not off-screen
-                # Also ensure it doesn't go off the right/bottom if window is larger than screen
-                # Only apply if the window is smaller than the monitor in that dimension
-                new_x = min(new_x, work_area_left + work_area_width - window_width) if window_width < work_area_width else new_x
-                new_y = min(new_y, work_area_top + work_area_height - window_height) if window_height < work_area_height else new_y
+    def toggle_center_electricsheep_special(self):
+        """Toggles the 'center_electricsheep_special' setting."""
+        new_state = self.center_electricsheep_special_checkbox.get() == 1
+        self.settings['center_electricsheep_special'] = new_state
+        self.save_settings()
+        self.show_message(f"'Center Electricsheep (es.exe) with title bar hidden' set to: {new_state}", "blue")
 
-            # Move the window
-            win32gui.MoveWindow(hwnd, new_x, new_y, window_width, window_height, True)
+    def toggle_enable_hotkey_passthrough(self):
+        """Toggles the 'enable_hotkey_passthrough' setting and re-registers hotkeys."""
+        new_state = self.enable_hotkey_passthrough_checkbox.get() == 1
+        self.settings['enable_hotkey_passthrough'] = new_state
+        self.save_settings()
+        self.show_message(f"'Electricsheep Crash Protection' set to: {new_state}. Re-registering hotkeys.", "blue")
+        self.register_hotkeys() # Re-register hotkeys to apply new suppression logic
+        self._reset_inactivity_tracking_state() # Reset state for minimization exclusion
 
-            if show_tooltip:
-                self.show_tooltip("Window Centered!")
-            return True
-        except Exception as e:
-            if show_tooltip:
-                self.show_message(f"Failed to center window: {e}", "red")
-            self.show_message(f"Error centering window HWND {hwnd}: {e}", "red")
-            return False
+    def toggle_native_hotkeys(self):
+        """Switches the 'hotkey_backend' setting between 'native' and 'ahk'. Takes effect on restart."""
+        self.settings['hotkey_backend'] = 'native' if self.native_hotkeys_checkbox.get() == 1 else 'ahk'
+        self.save_settings()
+        self.show_message(f"Hotkey backend set to '{self.settings['hotkey_backend']}'. Restart to apply.", "yellow")
+
+    def _is_own_ui_window(self, hwnd):
+        """Returns True if hwnd belongs to one of this script's own windows."""
+        return hwnd == self.root.winfo_id() or \
+               hwnd == self.tooltip_window.winfo_id() or \
+               bool(self.changer_window and hwnd == self.changer_window.winfo_id())
 
     def _get_hotkey_display_text(self, action, hotkey_str):
         """Generates the display text for a hotkey, including percentage if applicable."""
@@ -1546,16 +5596,13 @@ Fixes Electricsheep Hotkey Compatibility """,
                 if category == 'transparency_levels':
                     if key == 'preset_xbutton2':
                         action = 'set_86_percent'
-                        new_display_text = self._get_hotkey_display_text(action, self.settings['hotkeys'][action])
-                        self.hotkey_labels[action].configure(text=new_display_text)
+                        self._refresh_hotkey_label(action)
                     elif key == 'preset_xbutton2_shift':
                         action = 'set_100_percent'
-                        new_display_text = self._get_hotkey_display_text(action, self.settings['hotkeys'][action])
-                        self.hotkey_labels[action].configure(text=new_display_text)
+                        self._refresh_hotkey_label(action)
                     elif key == 'preset_xbutton1':
                         action = 'set_30_percent'
-                        new_display_text = self._get_hotkey_display_text(action, self.settings['hotkeys'][action])
-                        self.hotkey_labels[action].configure(text=new_display_text)
+                        self._refresh_hotkey_label(action)
                     # NEW: If any transparency setting changes, reset the transparency scrolling state
                     if key in ['initial', 'min', 'max', 'scroll_increment_slow', 'scroll_increment_fast', 'fast_scroll_threshold_ms', 'reset_on_scroll_start']:
                         self.is_transparency_scrolling = False
@@ -1564,12 +5611,10 @@ Fixes Electricsheep Hotkey Compatibility """,
                     # Update hotkey labels for brightness presets
                     if key == 'preset_xbutton2':
                         action = 'set_80_percent_brightness'
-                        new_display_text = self._get_hotkey_display_text(action, self.settings['hotkeys'][action])
-                        self.hotkey_labels[action].configure(text=new_display_text)
+                        self._refresh_hotkey_label(action)
                     elif key == 'preset_xbutton1':
                         action = 'set_0_percent_brightness'
-                        new_display_text = self._get_hotkey_display_text(action, self.settings['hotkeys'][action])
-                        self.hotkey_labels[action].configure(text=new_display_text)
+                        self._refresh_hotkey_label(action)
                     # If any brightness setting changes, reset the brightness scrolling state
                     if key in ['initial', 'min', 'max', 'scroll_increment_slow', 'scroll_increment_fast', 'fast_scroll_threshold_ms', 'reset_on_scroll_start']:
                         self.is_brightness_scrolling = False
@@ -1583,15 +5628,18 @@ Fixes Electricsheep Hotkey Compatibility """,
             # FIX: Removed 'minimize_inactive_ignore_count' from reset trigger to prevent mass popups when changing count
             if is_top_level and category in ['minimize_inactive_delay_ms']: 
                 self._reset_inactivity_tracking_state()
+            elif is_top_level and category == 'minimize_inactive_ignore_count':
+                self.inactivity.evaluate() # Apply the new count to windows that are already inactive
 
         except ValueError as e:
             self.show_message(f"Invalid input for {category.replace('_', ' ').title()}{' ' + key.replace('_', ' ').title() if key else ''}: {e}", "red")
         except Exception as e:
             self.show_message(f"Error applying setting: {e}", "red")
 
-    def show_message(self, message, color="white"):
-        """Prints a message (can be expanded to a GUI message box/label)."""
-        print(f"[{color}] {message}")
+    def _refresh_hotkey_label(self, action):
+        """Updates the hotkey row's text, if the hotkey section has been built."""
+        if action in self.hotkey_labels:
+            self.hotkey_labels[action].configure(text=self._get_hotkey_display_text(action, self.settings['hotkeys'][action]))
 
     def change_theme_color(self, new_theme):
         """Changes CustomTkinter theme color and shows restart warning."""
@@ -1621,13 +5669,11 @@ Fixes Electricsheep Hotkey Compatibility """,
         new_state = self.show_mouse_pos_checkbox.get() == 1
         self.settings['show_mouse_position_ui'] = new_state
         self.save_settings()
+        self._last_mouse_label_pos = None
+        self.periodic.refresh()
         if new_state:
-            self.update_mouse_position_label()
             self.show_message("Showing mouse position in UI.", "blue")
         else:
-            if self.mouse_pos_timer:
-                self.root.after_cancel(self.mouse_pos_timer)
-                self.mouse_pos_timer = None
             self.mouse_pos_label.configure(text="")
             self.show_message("Hiding mouse position in UI.", "blue")
 
@@ -1637,103 +5683,41 @@ Fixes Electricsheep Hotkey Compatibility """,
         if category:
             self.settings[category][setting_key] = new_state
             self.show_message(f"'{category.replace('_', ' ').title()} - {setting_key.replace('_', ' ').title()}' set to: {new_state}", "blue")
-            # Specific logic for transparency reset on scroll
-            if category == 'transparency_levels' and setting_key == 'reset_on_scroll_start':
-                self.is_transparency_scrolling = False
-                self.last_transparency_hotkey_press_time = 0
-        else:
-            self.settings[setting_key] = new_state
-            self.show_message(f"'{setting_key.replace('_', ' ').title()}' set to: {new_state}", "blue")
-        self.save_settings()
-
-    def _is_window_excluded(self, hwnd):
-        """Checks if a window's executable name or class name is in the global exclusion list.
-        Returns True if excluded, False otherwise."""
-        if not win32gui.IsWindow(hwnd):
-            # print(f"DEBUG: _is_window_excluded: HWND {hwnd} is not a valid window.")
-            return False
-
-        exe_name = get_window_exe_name(hwnd)
-        window_class = get_window_class_name(hwnd)
-        # window_text = win32gui.GetWindowText(hwnd) # Uncomment for more verbose debugging
-
-        exclusion_list = [e.strip().lower() for e in self.settings['global_transparency_exclusions'].split(',') if e.strip()]
-        
-        # Uncomment for extensive debugging of exclusions
-        # print(f"DEBUG: _is_window_excluded for HWND {hwnd} (EXE: '{exe_name}', Class: '{window_class}'). Exclusions: {exclusion_list}")
-
-        if exe_name and exe_name in exclusion_list:
-            # print(f"DEBUG: _is_window_excluded: Matched EXE '{exe_name}'. Returning True.")
-            return True
-        if window_class and window_class.lower() in exclusion_list:
-            # print(f"DEBUG: _is_window_excluded: Matched Class '{window_class}'. Returning True.")
-            return True
-        
-        return False
-
-    def toggle_minimize_inactive_windows(self):
-        """Toggles the 'minimize_inactive_windows' setting and applies changes."""
-        new_state = self.minimize_inactive_windows_checkbox.get() == 1
-        self.settings['minimize_inactive_windows'] = new_state
-        self.save_settings()
-        self.show_message(f"'Minimize inactive windows' set to: {new_state}", "blue")
-
-        # Always reset inactivity tracking state when this setting is toggled.
-        # This clears internal tracking. Windows previously minimized by the script
-        # will NOT be automatically restored here. They will be restored when they gain focus.
-        self._reset_inactivity_tracking_state()
-        # The periodic _check_for_inactive_windows timer will handle subsequent minimization
-        # based on the new setting state and reset timers.
-
-    def _restore_minimized_windows_on_focus_change(self, new_fg_hwnd, old_fg_hwnd):
-        """Restores windows that were minimized by the script if they gain focus,
-        unless they are currently in the exclusion list."""
-        if not self.settings['minimize_inactive_windows']:
-            # If minimize inactive is off, ensure any windows previously minimized by us are restored if they become foreground.
-            # This handles cases where the setting is toggled off, but a window was still minimized.
-            if new_fg_hwnd in self.minimized_by_script_hwnds:
-                if not self._is_window_excluded(new_fg_hwnd):
-                    if win32gui.IsWindow(new_fg_hwnd):
-                        win32gui.ShowWindow(new_fg_hwnd, win32con.SW_RESTORE)
-                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
-            return
-
-        # If the new foreground window was minimized by our script, attempt to restore it
-        if new_fg_hwnd in self.minimized_by_script_hwnds:
-            if not self._is_window_excluded(new_fg_hwnd): # Only restore if NOT excluded
-                if win32gui.IsWindow(new_fg_hwnd):
-                    win32gui.ShowWindow(new_fg_hwnd, win32con.SW_RESTORE)
-                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
-            else:
-                # If new_fg_hwnd is in minimized_by_script_hwnds but is now excluded,
-                # it should not be restored by us, just remove from tracking.
-                self.minimized_by_script_hwnds.discard(new_fg_hwnd)
-        
-        # If an old foreground window was minimized by us and is now excluded,
-        # we should stop tracking it and NOT restore it.
-        if old_fg_hwnd in self.minimized_by_script_hwnds and self._is_window_excluded(old_fg_hwnd):
-            self.minimized_by_script_hwnds.discard(old_fg_hwnd)
-
-    def update_mouse_position_label(self):
-        """Updates the mouse position label in the UI."""
-        if self.settings['show_mouse_position_ui']:
-            x, y = win32api.GetCursorPos() # Using win32api.GetCursorPos() for consistency
-            self.mouse_pos_label.configure(text=f"Mouse: X={x}, Y={y}")
-            self.mouse_pos_timer = self.root.after(100, self.update_mouse_position_label)
+            # Specific logic for transparency reset on scroll
+            if category == 'transparency_levels' and setting_key == 'reset_on_scroll_start':
+                self.is_transparency_scrolling = False
+                self.last_transparency_hotkey_press_time = 0
         else:
-            if self.mouse_pos_timer:
-                self.root.after_cancel(self.mouse_pos_timer)
-                self.mouse_pos_timer = None
-            self.mouse_pos_label.configure(text="") # Clear text when disabled
+            self.settings[setting_key] = new_state
+            self.show_message(f"'{setting_key.replace('_', ' ').title()}' set to: {new_state}", "blue")
+        self.save_settings()
 
-    def restart_app(self):
-        """Restarts the entire application."""
-        self.show_message("Restarting application...", "yellow")
+    def toggle_minimize_inactive_windows(self):
+        """Toggles the 'minimize_inactive_windows' setting and applies changes."""
+        new_state = self.minimize_inactive_windows_checkbox.get() == 1
+        self.settings['minimize_inactive_windows'] = new_state
         self.save_settings()
+        self.show_message(f"'Minimize inactive windows' set to: {new_state}", "blue")
 
-        self.on_closing()
+        # Always reset inactivity tracking state when this setting is toggled.
+        # This clears internal tracking. Windows previously minimized by the script
+        # will NOT be automatically restored here. They will be restored when they gain focus.
+        # While the setting is off the scheduler has no timer at all.
+        self.inactivity.set_enabled(new_state)
+        self._reset_inactivity_tracking_state()
 
-        os.execv(sys.executable, ['python'] + sys.argv)
+    def update_mouse_position_label(self):
+        """Periodic task: updates the mouse position label in the UI. Returns True if the cursor moved."""
+        if not self.settings['show_mouse_position_ui']:
+            self.mouse_pos_label.configure(text="") # Clear text when disabled
+            return False
+        position = self.window_system.get_cursor_pos()
+        if position == self._last_mouse_label_pos:
+            return False
+        self._last_mouse_label_pos = position
+        x, y = position
+        self.mouse_pos_label.configure(text=f"Mouse: X={x}, Y={y}")
+        return True
 
     def setup_tooltip_window(self):
         """Initializes the custom semi-transparent tooltip window with rounded edges and transparent background."""
@@ -1756,457 +5740,85 @@ Fixes Electricsheep Hotkey Compatibility """,
         # Apply Windows API layered window attributes for smoother transparency and chroma key
         hwnd_tooltip = self.tooltip_window.winfo_id()
         # Convert 0.0-1.0 alpha to 1-100 percentage for the helper function
-        initial_alpha_percentage = self.settings['tooltip_alpha'] * 100
-        set_layered_window_colorkey_and_alpha(hwnd_tooltip, 0x00FF00, initial_alpha_percentage)
-
-        self.tooltip_window.withdraw()
-
-    def show_tooltip(self, text, x_offset=None, y_offset=None):
-        """Displays the tooltip near the mouse cursor with the given text and starts continuous following."""
-        self.tooltip_label.configure(text=text)
-        #self.tooltip_window.update_idletasks() # Force update of label content immediately
-        #self.tooltip_window.deiconify()
-        
-        #self.tooltip_window.attributes('-alpha', self.settings['tooltip_alpha'])
-
-        self.tooltip_window.update_idletasks() # Force update of label content immediately
-        self.tooltip_window.deiconify()
-        
-        # Re-apply Windows API layered window attributes when showing tooltip
-        hwnd_tooltip = self.tooltip_window.winfo_id()
-        current_alpha_percentage = self.settings['tooltip_alpha'] * 100
-        set_layered_window_colorkey_and_alpha(hwnd_tooltip, 0x00FF00, current_alpha_percentage)
-
-        if self.tooltip_timer:
-            self.root.after_cancel(self.tooltip_timer)
-        self.tooltip_timer = self.root.after(self.settings['tooltip_display_time_ms'], self.hide_tooltip)
-        
-        # Store offsets for the loop
-        self._current_tooltip_x_offset = x_offset if x_offset is not None else self.settings['tooltip_x_position']
-        self._current_tooltip_y_offset = y_offset if y_offset is not None else self.settings['tooltip_y_position']
-
-        self._start_tooltip_follow()
-
-    def hide_tooltip(self):
-        """Hides the tooltip window and stops continuous following."""
-        self.tooltip_window.withdraw()
-        self.tooltip_timer = None
-        self._stop_tooltip_follow()
-
-    def _start_tooltip_follow(self):
-        """Starts the continuous loop to make the tooltip follow the mouse cursor."""
-        if not self.tooltip_following:
-            self.tooltip_following = True
-            self._update_tooltip_position_loop()
-
-    def _stop_tooltip_follow(self):
-        """Stops the continuous tooltip following loop."""
-        self.tooltip_following = False
-        if self.tooltip_follow_timer:
-            self.root.after_cancel(self.tooltip_follow_timer)
-            self.tooltip_follow_timer = None
-
-    def _update_tooltip_position_loop(self):
-        """Continuously updates the tooltip's position to follow the mouse cursor, centered."""
-        if self.tooltip_following and self.tooltip_window.winfo_exists():
-            x, y = win32api.GetCursorPos()
-
-            self.tooltip_window.update_idletasks()
-
-            tooltip_width = self.tooltip_window.winfo_width()
-            tooltip_height = self.tooltip_window.winfo_height()
-
-            # Use stored offsets
-            target_x = x + self._current_tooltip_x_offset - (tooltip_width // 2)
-            target_y = y + self._current_tooltip_y_offset - (tooltip_height // 2)
-
-            self.tooltip_window.wm_geometry(f"+{int(target_x)}+{int(target_y)}")
-            self.tooltip_follow_timer = self.root.after(20, self._update_tooltip_position_loop)
-        elif self.tooltip_follow_timer:
-            self.root.after_cancel(self.tooltip_follow_timer)
-            self.tooltip_follow_timer = None
-
-    def update_status_label(self):
-        """Updates the status label in the main GUI."""
-        status_text = "Enabled" if self.script_enabled else "Disabled"
-        self.status_label.configure(text=f"Status: {status_text}")
-        self.toggle_button.configure(text=f"Toggle Script (Alt+W) - {'Disable' if self.script_enabled else 'Enable'}")
-
-    def register_hotkeys(self):
-        """
-        Registers hotkeys based on current settings and script enabled state using AHK.
-        Hotkeys for transparency, brightness, centering, and minimizing others are
-        conditionally non-suppressing based on the 'enable_hotkey_passthrough' setting.
-        """
-        self.ahk.clear_hotkeys()
-
-        # Hotkeys that are always non-suppressing by design (toggle script, focus mode)
-        # Kill script hotkey should always be non-suppressing to ensure it works even if other hotkeys are suppressed.
-        ahk_kill_hotkey = self._map_hotkey_to_ahk_syntax(self.settings['hotkeys']['kill_script_failsafe'], non_suppressing=True)
-        if ahk_kill_hotkey:
-            self.ahk.add_hotkey(ahk_kill_hotkey, self.kill_script)
-
-        ahk_toggle_hotkey = self._map_hotkey_to_ahk_syntax(self.settings['hotkeys']['toggle_script'], non_suppressing=True)
-        if ahk_toggle_hotkey:
-            self.ahk.add_hotkey(ahk_toggle_hotkey, self.toggle_script_from_hotkey)
-
-        ahk_toggle_focus_mode_hotkey = self._map_hotkey_to_ahk_syntax(self.settings['hotkeys']['toggle_focus_mode'], non_suppressing=True)
-        if ahk_toggle_focus_mode_hotkey:
-            self.ahk.add_hotkey(ahk_toggle_focus_mode_hotkey, self._ahk_toggle_focus_mode_callback)
-
-        ahk_focus_mode_alt_tab_hotkey = self._map_hotkey_to_ahk_syntax(self.settings['hotkeys']['focus_mode_alt_tab'], non_suppressing=True)
-        if ahk_focus_mode_alt_tab_hotkey:
-            self.ahk.add_hotkey(ahk_focus_mode_alt_tab_hotkey, self._ahk_focus_mode_alt_tab_callback)
-
-        if not self.script_enabled:
-            self.show_message("Script is disabled. Only kill switch, toggle hotkey, and Focus Mode hotkeys are active.", "orange")
-            return
-
-        # Determine if problematic hotkeys should be non-suppressing
-        use_non_suppressing_for_problematic = self.settings['enable_hotkey_passthrough']
-
-        # Hotkeys that might interact with sensitive applications
-        transparency_actions = [
-            'increase_transparency', 'decrease_transparency',
-            'set_86_percent', 'set_100_percent', 'set_30_percent'
-        ]
-
-        for action in transparency_actions:
-            hotkey_str = self.settings['hotkeys'][action]
-            ahk_hotkey = self._map_hotkey_to_ahk_syntax(hotkey_str, non_suppressing=use_non_suppressing_for_problematic)
-            if ahk_hotkey:
-                self.ahk.add_hotkey(ahk_hotkey, functools.partial(self._ahk_transparency_callback, action))
-        
-        center_hotkey_str = self.settings['hotkeys']['center_window']
-        ahk_center_hotkey = self._map_hotkey_to_ahk_syntax(center_hotkey_str, non_suppressing=use_non_suppressing_for_problematic)
-        if ahk_center_hotkey:
-            self.ahk.add_hotkey(ahk_center_hotkey, self._ahk_center_window_callback)
-
-        minimize_others_hotkey_str = self.settings['hotkeys']['minimize_others']
-        ahk_minimize_others_hotkey = self._map_hotkey_to_ahk_syntax(minimize_others_hotkey_str, non_suppressing=use_non_suppressing_for_problematic)
-        if ahk_minimize_others_hotkey:
-            self.ahk.add_hotkey(ahk_minimize_others_hotkey, self._ahk_minimize_others_callback)
-
-        brightness_actions = [
-            'increase_brightness', 'decrease_brightness',
-            'set_80_percent_brightness', 'set_0_percent_brightness'
-        ]
-        for action in brightness_actions:
-            hotkey_str = self.settings['hotkeys'][action]
-            ahk_hotkey = self._map_hotkey_to_ahk_syntax(hotkey_str, non_suppressing=use_non_suppressing_for_problematic)
-            if ahk_hotkey:
-                self.ahk.add_hotkey(ahk_hotkey, functools.partial(self._ahk_brightness_callback, action))
-
-    def _map_hotkey_to_ahk_syntax(self, hotkey_str, non_suppressing=False):
-        """Maps a hotkey string (e.g., 'ctrl+wheelup') to AHK syntax (e.g., '^WheelUp')."""
-        if hotkey_str == 'none' or not hotkey_str:
-            return None
-
-        parts = hotkey_str.split('+')
-        ahk_modifiers = []
-        ahk_main_key = ''
-
-        for part in parts:
-            part_lower = part.strip().lower()
-            if part_lower == 'ctrl':
-                ahk_modifiers.append('^')
-            elif part_lower == 'shift':
-                ahk_modifiers.append('+')
-            elif part_lower == 'alt':
-                ahk_modifiers.append('!')
-            elif part_lower in ['win', 'windows']:
-                ahk_modifiers.append('#')
-            else:
-                found_ahk_key = next((k for k, v in self.internal_to_display_map.items()
-                                      if k.lower() == part_lower or v.lower() == part_lower), None)
-                if found_ahk_key:
-                    ahk_main_key = found_ahk_key
-                else:
-                    if len(part) == 1 and (part.isalpha() or part.isdigit()):
-                        ahk_main_key = part
-                    else:
-                        ahk_main_key = part.title()
-
-        ahk_modifiers_str = "".join(sorted(ahk_modifiers, key=lambda x: ('^', '+', '!', '#').index(x)))
-
-        prefix = '~' if non_suppressing else ''
-
-        if ahk_main_key:
-            return f"{prefix}{ahk_modifiers_str}{ahk_main_key}"
-        elif ahk_modifiers_str and not non_suppressing:
-            return None
-        elif ahk_modifiers_str and non_suppressing:
-            return None
-        return None
-
-    def _ahk_transparency_callback(self, action):
-        """
-        Generic callback for AHK hotkeys that modify transparency.
-        This function runs in the AHK hotkey thread, so it schedules GUI updates.
-        """
-        if not self.script_enabled:
-            return
-
-        hotkey_config_str = self.settings['hotkeys'][action]
-
-        if not self.check_modifiers_match(hotkey_config_str):
-            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
-                print(f"DEBUG: Modifiers mismatch for {action} with hotkey '{hotkey_config_str}'. Current state: Ctrl={self.ahk.key_state('Ctrl')}, Shift={self.ahk.key_state('Shift')}, Alt={self.ahk.key_state('Alt')}, Win={self.ahk.key_state('LWin') or self.ahk.key_state('RWin')}")
-            return
-
-        current_transparency_config = self.settings['transparency_levels'] # NEW: Get transparency config
-
-        # NEW: Check if this is the start of a new scrolling sequence AND if reset is enabled
-        current_hotkey_time = time.time() * 1000
-        time_since_last_hotkey = current_hotkey_time - self.last_transparency_hotkey_press_time
-        
-        # A longer timeout to detect end of scroll sequence
-        if time_since_last_hotkey > SCROLL_SEQUENCE_TIMEOUT_MS:
-            self.is_transparency_scrolling = False
-
-        if not self.is_transparency_scrolling and current_transparency_config['reset_on_scroll_start']:
-            # Set internal transparency level to initial
-            self.current_transparency_level = current_transparency_config['initial']
-            # FIX: Ensure active_window_transparency (used by dynamic logic) is also reset here
-            if self.settings['dynamic_transparency_enabled']:
-                self.settings['active_window_transparency'] = current_transparency_config['initial']
-                self.save_settings() # Persist this reset
-            self.is_transparency_scrolling = True
-        elif not self.is_transparency_scrolling and not current_transparency_config['reset_on_scroll_start']:
-            self.is_transparency_scrolling = True
-        
-        self.last_transparency_hotkey_press_time = current_hotkey_time # Update last hotkey press time for next check
-
-
-        if action == 'increase_transparency':
-            self.root.after(0, lambda: self.update_transparency_gui(delta=1))
-        elif action == 'decrease_transparency':
-            self.root.after(0, lambda: self.update_transparency_gui(delta=-1))
-        elif action == 'set_86_percent':
-            self.root.after(0, lambda: self.update_transparency_gui(new_level=self.settings['transparency_levels']['preset_xbutton2']))
-            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
-        elif action == 'set_100_percent':
-            self.root.after(0, lambda: self.update_transparency_gui(new_level=self.settings['transparency_levels']['preset_xbutton2_shift']))
-            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
-        elif action == 'set_30_percent':
-            self.root.after(0, lambda: self.update_transparency_gui(new_level=self.settings['transparency_levels']['preset_xbutton1']))
-            self.is_transparency_scrolling = False # NEW: Presets are not part of a scroll sequence
-        else:
-            self.show_message(f"Unhandled AHK hotkey action: {action}", "orange")
-
-    def _ahk_center_window_callback(self):
-        """
-        Callback for AHK hotkey to center the active window.
-        Schedules the centering logic on the main GUI thread.
-        """
-        if not self.script_enabled:
-            return
-        
-        hotkey_config_str = self.settings['hotkeys']['center_window']
-        if not self.check_modifiers_match(hotkey_config_str):
-            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
-                print(f"DEBUG: Modifiers mismatch for center_window with hotkey '{hotkey_config_str}'. Current state: Ctrl={self.ahk.key_state('Ctrl')}, Shift={self.ahk.key_state('Shift')}, Alt={self.ahk.key_state('Alt')}, Win={self.ahk.key_state('LWin') or self.ahk.key_state('RWin')}")
-            return
-
-        hwnd = win32gui.GetForegroundWindow()
-        if not hwnd or hwnd == self.root.winfo_id() or hwnd == self.tooltip_window.winfo_id() or \
-           (self.changer_window and hwnd == self.changer_window.winfo_id()):
-            self.root.after(0, lambda: self.show_message("Cannot center UI window.", "red"))
-            return
-        
-        # Corrected: Use _is_window_excluded - this is now handled inside _center_window.
-        # if self._is_window_excluded(hwnd):
-        #     self.root.after(0, lambda: self.show_message("Cannot center excluded window.", "red"))
-        #     return
-
-        self.root.after(0, lambda: self._center_window(hwnd, show_tooltip=True))
-
-    def _ahk_minimize_others_callback(self):
-        """
-        Callback for AHK hotkey to minimize all windows except the clicked one.
-        Schedules the minimization logic on the main GUI thread.
-        """
-        if not self.script_enabled:
-            return
-
-        hotkey_config_str = self.settings['hotkeys']['minimize_others']
-        if not self.check_modifiers_match(hotkey_config_str):
-            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
-                print(f"DEBUG: Modifiers mismatch for minimize_others with hotkey '{hotkey_config_str}'. Current state: Ctrl={self.ahk.key_state('Ctrl')}, Shift={self.ahk.key_state('Shift')}, Alt={self.ahk.key_state('Alt')}, Win={self.ahk.key_state('LWin') or self.ahk.key_state('RWin')}")
-            return
-
-        mouse_x, mouse_y = win32api.GetCursorPos()
-        clicked_hwnd_at_point = win32gui.WindowFromPoint((mouse_x, mouse_y)) # Get the window at the mouse point
-
-        # Get the top-level parent window for the clicked HWND
-        # This ensures we are working with a top-level window that EnumWindows will find.
-        keep_hwnd = win32gui.GetAncestor(clicked_hwnd_at_point, win32con.GA_ROOT)
-
-        if not keep_hwnd or not win32gui.IsWindowVisible(keep_hwnd) or not win32gui.GetWindowText(keep_hwnd):
-            self.root.after(0, lambda: self.show_message("No valid top-level window found under cursor to keep open.", "red"))
-            return
-
-        if keep_hwnd == self.root.winfo_id() or keep_hwnd == self.tooltip_window.winfo_id() or \
-           (self.changer_window and keep_hwnd == self.changer_window.winfo_id()):
-            self.root.after(0, lambda: self.show_message("Cannot minimize others based on UI window.", "red"))
-            return
-
-        self.root.after(0, lambda: self._minimize_all_except_one(keep_hwnd, "Minimized others!"))
-
-    def _minimize_all_except_one(self, keep_hwnd, tooltip_message, use_active_window=False):
-        """
-        Minimizes all visible windows except the specified keep_hwnd.
-        If use_active_window is True, keep_hwnd is ignored and foreground window is used.
-        """
-        if use_active_window:
-            keep_hwnd = win32gui.GetForegroundWindow()
-
-        if not keep_hwnd or not win32gui.IsWindow(keep_hwnd) or not win32gui.IsWindowVisible(keep_hwnd) or not win32gui.GetWindowText(keep_hwnd):
-            self.show_message("No valid window to keep open.", "red")
-            return
-
-        def callback(hwnd, extra):
-            if hwnd == keep_hwnd:
-                return True # Don't minimize the target window
-
-            if not win32gui.IsWindowVisible(hwnd) or not win32gui.GetWindowText(hwnd):
-                return True # Skip invisible or nameless windows
-
-            if hwnd == self.root.winfo_id() or hwnd == self.tooltip_window.winfo_id() or \
-               (self.changer_window and hwnd == self.changer_window.winfo_id()):
-                return True # Skip script's own windows
-
-            # NEW: Explicitly exclude Electricsheep from minimization if crash protection is enabled
-            if self.settings['enable_hotkey_passthrough']:
-                exe_name = get_window_exe_name(hwnd)
-                window_class = get_window_class_name(hwnd)
-                if (exe_name and exe_name.lower() == 'es') or \
-                   (window_class and window_class.lower() == 'electricsheepwndclass'):
-                    self.show_message(f"Skipping minimization for Electricsheep (HWND: {hwnd}) due to crash protection.", "yellow")
-                    return True # Skip Electricsheep
-
-            # Original exclusion check (for general exclusions)
-            if self._is_window_excluded(hwnd):
-                return True # Skip generally excluded windows
-
-            # Check if already minimized
-            if win32gui.IsIconic(hwnd):
-                return True # Already minimized, skip
-
-            try:
-                win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)
-            except Exception as e:
-                self.show_message(f"Failed to minimize HWND {hwnd}: {e}", "orange")
-            return True
-
-        win32gui.EnumWindows(callback, None)
-        self.show_tooltip(tooltip_message, x_offset=self.settings['focus_tooltip_x_position'], y_offset=self.settings['focus_tooltip_y_position'])
-
-
-    def toggle_focus_mode_ui(self):
-        """Toggles the script's focus mode enabled state and updates the UI."""
-        self.focus_mode_active = not self.focus_mode_active
-        self.settings['focus_mode_active'] = self.focus_mode_active
-        self.save_settings()
-        
-        if self.focus_mode_active:
-            self.focus_mode_checkbox.select()
-            tooltip_text = "Focus Mode ON"
-        else:
-            self.focus_mode_checkbox.deselect()
-            tooltip_text = "Focus Mode OFF"
-            # When turning off focus mode, ensure all previously minimized windows are restored if desired.
-            # The AHK script doesn't restore, it just stops minimizing. We will follow that.
+        initial_alpha_percentage = self.settings['tooltip_alpha'] * 100
+        set_layered_window_colorkey_and_alpha(hwnd_tooltip, 0x00FF00, initial_alpha_percentage)
 
-        self.show_tooltip(tooltip_text, x_offset=self.settings['focus_tooltip_x_position'], y_offset=self.settings['focus_tooltip_y_position'])
-        self.show_message(f"Focus Mode state changed to: {self.focus_mode_active}", "blue")
-        self.register_hotkeys() # Re-register hotkeys to reflect focus mode state for Alt+Tab
+        self.tooltip_window.withdraw()
 
-    def _ahk_toggle_focus_mode_callback(self):
-        """Called when the toggle focus mode hotkey is pressed. Schedules UI update on main thread."""
-        self.root.after(0, self.toggle_focus_mode_ui)
+    def show_tooltip(self, text, x_offset=None, y_offset=None):
+        """Displays the tooltip near the mouse cursor with the given text and starts continuous following."""
+        self.tooltip_label.configure(text=text)
+        #self.tooltip_window.update_idletasks() # Force update of label content immediately
+        #self.tooltip_window.deiconify()
+        
+        #self.tooltip_window.attributes('-alpha', self.settings['tooltip_alpha'])
 
-    def _ahk_focus_mode_alt_tab_callback(self):
-        """
-        Callback for AHK hotkey Alt+Tab when focus mode is active.
-        Schedules the minimization logic on the main GUI thread after a delay.
-        """
-        hotkey_config_str = self.settings['hotkeys']['focus_mode_alt_tab']
-        if not self.check_modifiers_match(hotkey_config_str):
-            if DEBUG_PRINT_MODIFIER_STATE_ON_MOUSE_EVENT:
-                print(f"DEBUG: Modifiers mismatch for focus_mode_alt_tab with hotkey '{hotkey_config_str}'. Current state: Ctrl={self.ahk.key_state('Ctrl')}, Shift={self.ahk.key_state('Shift')}, Alt={self.ahk.key_state('Alt')}, Win={self.ahk.key_state('LWin') or self.ahk.key_state('RWin')}")
-            return
+        self.tooltip_window.update_idletasks() # Force update of label content immediately
+        self.tooltip_window.deiconify()
+        
+        # Re-apply Windows API layered window attributes when showing tooltip
+        hwnd_tooltip = self.tooltip_window.winfo_id()
+        current_alpha_percentage = self.settings['tooltip_alpha'] * 100
+        set_layered_window_colorkey_and_alpha(hwnd_tooltip, 0x00FF00, current_alpha_percentage)
 
-        if self.focus_mode_active:
-            delay = self.settings['focus_mode_alt_tab_delay_ms']
-            self.root.after(delay, lambda: self._minimize_all_except_one(None, "Focus Mode: Minimized others!", use_active_window=True))
-        else:
-            # If focus mode is off, the Alt+Tab hotkey still triggers but does nothing.
-            # This matches the AHK script's behavior where the `if (is_focus_mode_active)` check is inside the hotkey.
-            pass
+        if self.tooltip_timer:
+            self.root.after_cancel(self.tooltip_timer)
+        self.tooltip_timer = self.root.after(self.settings['tooltip_display_time_ms'], self.hide_tooltip)
+        
+        # Store offsets for the loop
+        self._current_tooltip_x_offset = x_offset if x_offset is not None else self.settings['tooltip_x_position']
+        self._current_tooltip_y_offset = y_offset if y_offset is not None else self.settings['tooltip_y_position']
 
-    def toggle_script_from_hotkey(self):
-        """Called when the toggle hotkey is pressed. Schedules UI update on main thread."""
-        self.root.after(0, self.toggle_script_ui)
-        self.show_message("Toggle script hotkey pressed.", "blue")
+        self._start_tooltip_follow()
 
-    def toggle_script_ui(self):
-        """Toggles the script's enabled state and updates the UI."""
-        self.script_enabled = not self.script_enabled
-        self.settings['script_enabled'] = self.script_enabled
-        self.save_settings()
-        self.update_status_label()
-        self.register_hotkeys()
-        if not self.script_enabled:
-            self.hide_tooltip()
-        self.show_message(f"Script enabled state changed to: {self.script_enabled}", "green")
+    def hide_tooltip(self):
+        """Hides the tooltip window and stops continuous following."""
+        self.tooltip_window.withdraw()
+        self.tooltip_timer = None
+        self._stop_tooltip_follow()
 
-    def _initialize_hotkey_maps(self):
-        """Initializes internal and display mappings for hotkeys, compatible with AHK and custom order."""
-        self.internal_to_display_map = {
-            'none': 'None',
-            'WheelUp': 'Mouse Wheel Up',
-            'WheelDown': 'Mouse Wheel Down',
-            'XButton1': 'Mouse XButton1',
-             'XButton2': 'Mouse XButton2',
-            'LButton': 'Mouse Left Click',
-            'RButton': 'Mouse Right Click', # Add RButton
-            'MButton': 'Mouse Middle Click',
-            'WheelUp': 'Mouse Wheel Up', # Ensure WheelUp/Down are here for Alt+Wheel
-            'WheelDown': 'Mouse Wheel Down',
-            'Ctrl': 'Ctrl', 'Shift': 'Shift', 'Alt': 'Alt', 'Win': 'Win',
-        }
+    def _start_tooltip_follow(self):
+        """Starts (or re-centers, after a text change) the tooltip following the mouse cursor."""
+        self.tooltip_following = True
+        self._last_tooltip_cursor_pos = None
+        self.periodic.wake('tooltip_follow')
 
-        ahk_key_mappings = {
-            'Backspace': 'Backspace', 'Tab': 'Tab', 'Enter': 'Enter', 'Escape': 'Esc', 'Space': 'Space',
-            'PgUp': 'Page Up', 'PgDn': 'Page Down', 'End': 'End', 'Home': 'Home',
-            'Left': 'Left', 'Up': 'Up', 'Right': 'Right', 'Down': 'Down',
-            'Insert': 'Ins', 'Delete': 'Del',
-            'Numpad0': 'Numpad 0', 'Numpad1': 'Numpad 1', 'Numpad2': 'Numpad 2', 'Numpad3': 'Numpad 3', 'Numpad4': 'Numpad 4',
-            'Numpad5': 'Numpad 5', 'Numpad6': 'Numpad 6', 'Numpad7': 'Numpad 7', 'Numpad8': 'Numpad 8', 'Numpad9': 'Numpad 9',
-            'NumpadMult': 'Num *', 'NumpadAdd': 'Num +', 'NumpadSub': 'Num -', 'NumpadDot': 'Num .', 'NumpadDiv': 'Num /',
-            'F1': 'F1', 'F2': 'F2', 'F3': 'F3', 'F4': 'F4', 'F5': 'F5', 'F6': 'F6', 'F7': 'F7', 'F8': 'F8', 'F9': 'F9', 'F10': 'F10', 'F11': 'F11', 'F12': 'F12',
-            '~': '~', '-': '-', '=': '=', '[': '[', ']': ']', ';': ';', '"': "'", ',': ',', '.': '.', '\\': '\\', '/': '/',
-        }
+    def _stop_tooltip_follow(self):
+        """Stops the tooltip following task."""
+        self.tooltip_following = False
+        self.periodic.refresh()
 
-        for i in range(10):
-            str_i = str(i)
-            ahk_key_mappings[str_i] = str_i
+    def _update_tooltip_position(self):
+        """Periodic task: keeps the tooltip centered on the mouse cursor. Returns True if the cursor moved."""
+        if not self.tooltip_window.winfo_exists():
+            self.tooltip_following = False
+            return False
+        x, y = self.window_system.get_cursor_pos()
+        if (x, y) == self._last_tooltip_cursor_pos:
+            return False
+        self._last_tooltip_cursor_pos = (x, y)
 
-        for char_code in range(ord('A'), ord('Z') + 1):
-            char_upper = chr(char_code)
-            ahk_key_mappings[char_upper] = char_upper
+        self.tooltip_window.update_idletasks()
 
-        for char_code in range(ord('a'), ord('z') + 1):
-            char_lower = chr(char_code)
-            ahk_key_mappings[char_lower] = char_lower.upper()
+        tooltip_width = self.tooltip_window.winfo_width()
+        tooltip_height = self.tooltip_window.winfo_height()
 
-        for ahk_name, display_name in ahk_key_mappings.items():
-            if ahk_name not in self.internal_to_display_map:
-                self.internal_to_display_map[ahk_name] = display_name
+        # Use stored offsets
+        target_x = x + self._current_tooltip_x_offset - (tooltip_width // 2)
+        target_y = y + self._current_tooltip_y_offset - (tooltip_height // 2)
+
+        self.tooltip_window.wm_geometry(f"+{int(target_x)}+{int(target_y)}")
+        return True
 
-        self.display_to_internal_map = {v: k for k, v in self.internal_to_display_map.items()
-                                        if k not in ['Ctrl', 'Shift', 'Alt', 'Win']}
+    def update_status_label(self):
+        """Updates the status label in the main GUI."""
+        if self.status_label is None:
+            return
+        status_text = "Enabled" if self.script_enabled else "Disabled"
+        if self.startup_pass and not self.startup_pass.finished:
+            status_text += f" (applying startup settings: {self.startup_pass.done}/{len(self.startup_pass.items)})"
+        self.status_label.configure(text=f"Status: {status_text}")
+        self.toggle_button.configure(text=f"Toggle Script (Alt+W) - {'Disable' if self.script_enabled else 'Enable'}")
 
     def _get_hotkey_dropdown_values(self):
             """Returns a sorted list of display names for the hotkey dropdown using custom order,
@@ -2405,126 +6017,6 @@ Fixes Electricsheep Hotkey Compatibility """,
         self.register_hotkeys()
         self.current_hotkey_action = None
 
-    def check_modifiers_match(self, hotkey_config_str):
-        """
-        Checks if the currently pressed modifiers (Win, Ctrl, Shift, Alt)
-        exactly match the modifiers specified in the hotkey_config_str using ahk.key_state().
-        """
-        modifier_parts = []
-        for part in hotkey_config_str.split('+'):
-            part_lower = part.strip().lower()
-            if part_lower in ['ctrl', 'shift', 'alt', 'win', 'windows']:
-                modifier_parts.append(part_lower.replace('windows', 'win'))
-
-        requires_win = 'win' in modifier_parts
-        requires_ctrl = 'ctrl' in modifier_parts
-        requires_shift = 'shift' in modifier_parts
-        requires_alt = 'alt' in modifier_parts
-
-        current_win_pressed = self.ahk.key_state('LWin') or self.ahk.key_state('RWin')
-        current_ctrl_pressed = self.ahk.key_state('LCtrl') or self.ahk.key_state('RCtrl')
-        current_shift_pressed = self.ahk.key_state('LShift') or self.ahk.key_state('RShift')
-        current_alt_pressed = self.ahk.key_state('LAlt') or self.ahk.key_state('RAlt')
-
-        if (current_win_pressed != requires_win or
-            current_ctrl_pressed != requires_ctrl or
-            current_shift_pressed != requires_shift or
-            current_alt_pressed != requires_alt):
-            return False
-
-        return True
-
-    def update_transparency_gui(self, new_level=None, delta=0):
-        """
-        Updates the transparency of the foreground window and shows a tooltip.
-        This function is scheduled to run on the main GUI thread.
-        """
-        if not self.script_enabled:
-            return
-
-        hwnd = win32gui.GetForegroundWindow()
-        if not hwnd or hwnd == self.root.winfo_id() or hwnd == self.tooltip_window.winfo_id() or \
-           (self.changer_window and hwnd == self.changer_window.winfo_id()):
-            return
-
-        # Corrected: Use _is_window_excluded
-        if self._is_window_excluded(hwnd):
-            # If the foreground window is excluded, do not apply transparency changes via hotkey.
-            self.show_tooltip(f"'{get_window_exe_name(hwnd) or get_window_class_name(hwnd)}' is excluded from transparency changes.")
-            self.show_message(f"Attempted to change transparency for excluded window '{get_window_exe_name(hwnd) or get_window_class_name(hwnd)}'. Ignored.", "yellow")
-            return
-
-        # If dynamic transparency is enabled, hotkeys should modify the 'active' level
-        if self.settings['dynamic_transparency_enabled']:
-            # Hotkeys should always be able to change transparency of the foreground window
-            # if dynamic transparency is enabled, regardless of 'manage_all' or 'manual update' settings.
-            # The foreground window is explicitly targeted by the user.
-
-            current_active_level = self.settings['active_window_transparency']
-            calculated_new_active_level = current_active_level # Initialize with current for cases where new_level is None
-
-            if new_level is not None:
-                calculated_new_active_level = new_level
-            elif delta != 0:
-                current_time = time.time() * 1000
-                time_diff = current_time - self.last_scroll_time
-                self.last_scroll_time = current_time
-
-                if time_diff < self.settings['transparency_levels']['fast_scroll_threshold_ms'] and time_diff > 0:
-                    increment = self.settings['transparency_levels']['scroll_increment_fast']
-                else:
-                    increment = self.settings['transparency_levels']['scroll_increment_slow']
-                calculated_new_active_level = current_active_level + (increment * delta)
-
-            calculated_new_active_level = max(self.settings['transparency_levels']['min'],
-                                   min(self.settings['transparency_levels']['max'],
-                                       calculated_new_active_level))
-            self.settings['active_window_transparency'] = calculated_new_active_level # THIS LINE IS KEY FOR THE NUANCE
-            self.current_transparency_level = calculated_new_active_level # Keep for tooltip display consistency
-            
-            # Crucially, add the window to managed_by_script_hwnds if hotkey was successful
-            self.managed_by_script_hwnds.add(hwnd) # Ensure it's now dynamically managed
-            self.save_settings() # Save the updated active level
-            
-            # Reapply dynamic transparency to ensure all windows are updated, especially the foreground one
-            # and potentially other inactive ones.
-            self._reapply_dynamic_transparency_on_all_windows(force_all=self.settings['manage_all_windows_dynamically'])
-
-        else: # Dynamic transparency is NOT enabled, use the old logic for direct transparency
-            # Hotkey changes should directly apply to the foreground window if dynamic is OFF.
-            if new_level is not None:
-                self.current_transparency_level = new_level
-            elif delta != 0:
-                current_time = time.time() * 1000
-                time_diff = current_time - self.last_scroll_time
-                self.last_scroll_time = current_time
-
-                if time_diff < self.settings['transparency_levels']['fast_scroll_threshold_ms'] and time_diff > 0:
-                    increment = self.settings['transparency_levels']['scroll_increment_fast']
-                else:
-                    increment = self.settings['transparency_levels']['scroll_increment_slow']
-
-                self.current_transparency_level += (increment * delta)
-
-            self.current_transparency_level = max(self.settings['transparency_levels']['min'],
-                                                  min(self.settings['transparency_levels']['max'],
-                                                      self.current_transparency_level))
-            # Apply transparency to the current foreground window
-            success = set_transparency_for_hwnd(hwnd, self.current_transparency_level)
-            if success:
-                # If not dynamically managed, hotkey changes add it to managed for potential future restoration
-                # or if dynamic mode is later enabled.
-                self.managed_by_script_hwnds.add(hwnd)
-            else:
-                if self.last_processed_hwnd != hwnd:
-                    self.show_tooltip(f"Failed to set transparency for window.", "red")
-                    self.show_message(f"Could not set transparency for HWND {hwnd}. It might not support layering or require elevated privileges.", "red")
-                self.last_processed_hwnd = hwnd
-
-
-        self.show_tooltip(f"Transparency: {self.current_transparency_level}%")
-        self.last_processed_hwnd = hwnd # Update last processed HWND regardless of success for message suppression
-
     def _on_entry_scroll(self, event, entry_widget, category, key, is_top_level, value_type, increment):
         """Handles mouse wheel scrolling on an entry widget to adjust its value."""
         entry_widget.focus_set()
@@ -2578,9 +6070,34 @@ Fixes Electricsheep Hotkey Compatibility """,
         except Exception as e:
             self.show_message(f"Error adjusting value: {e}", "red")
 
+    def open_settings_ui(self):
+        """Brings the settings panel to the front."""
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+
+    def toggle_focus_mode(self):
+        super().toggle_focus_mode()
+        if not self.settings_sections['focus_mode'].built:
+            return
+        if self.focus_mode_active:
+            self.focus_mode_checkbox.select()
+        else:
+            self.focus_mode_checkbox.deselect()
+
+    def on_closing(self):
+        """Handles graceful shutdown when the main window is closed."""
+        self.tooltip_following = False
+        super().on_closing()
+
     def reset_to_defaults(self):
             """Restores all settings to their default values and refreshes the UI."""
+            # Every widget below is refreshed, so build the sections that are still collapsed.
+            for section in self.settings_sections.values():
+                section.ensure_built()
+
             self.settings = DEFAULT_SETTINGS.copy()
+            self._on_exclusion_list_changed()
             self.save_settings()
 
             self.theme_menu_var.set(self.settings['theme_color'])
@@ -2593,13 +6110,10 @@ Fixes Electricsheep Hotkey Compatibility """,
                 self.ui_topmost_checkbox.deselect()
             self.root.attributes('-topmost', self.settings['ui_always_on_top'])
 
+            self._last_mouse_label_pos = None
             if self.settings['show_mouse_position_ui']:
                 self.show_mouse_pos_checkbox.select()
-                self.update_mouse_position_label()
             else:
-                if self.mouse_pos_timer:
-                    self.root.after_cancel(self.mouse_pos_timer)
-                    self.mouse_pos_timer = None
                 self.mouse_pos_label.configure(text="")
 
             # Update new window transparency checkbox
@@ -2650,6 +6164,11 @@ Fixes Electricsheep Hotkey Compatibility """,
             else:
                 self.enable_hotkey_passthrough_checkbox.deselect()
 
+            if self.settings['hotkey_backend'] == 'native':
+                self.native_hotkeys_checkbox.select()
+            else:
+                self.native_hotkeys_checkbox.deselect()
+
             # New: Minimize Inactive Windows checkbox
             if self.settings['minimize_inactive_windows']:
                 self.minimize_inactive_windows_checkbox.select()
@@ -2711,6 +6230,7 @@ Fixes Electricsheep Hotkey Compatibility """,
             self.update_status_label()
 
             self.register_hotkeys()
+            self.periodic.refresh()
 
             self.show_message("Settings reset to defaults.", "green")
             self.restart_warning_label.pack_forget()
@@ -2728,7 +6248,7 @@ Fixes Electricsheep Hotkey Compatibility """,
             # Reset brightness state
             self.current_brightness_level = self.settings['brightness_levels']['initial']
             self.is_brightness_scrolling = False
-            self.last_brightness_scroll_time = 0
+            self.input_aggregator.reset_scroll_timing('brightness')
             self.last_brightness_hotkey_press_time = 0
             self._set_screen_brightness(self.current_brightness_level) # Apply default brightness
 
@@ -2743,12 +6263,7 @@ Fixes Electricsheep Hotkey Compatibility """,
         
             # Re-initialize the initial window list
             self._populate_initial_script_hwnds()
-            current_time_ms = time.time() * 1000
-            for hwnd in self.initial_script_start_hwnds:
-                self.window_last_active_time[hwnd] = current_time_ms
-            fg_hwnd = win32gui.GetForegroundWindow()
-            if fg_hwnd:
-                self.window_last_active_time[fg_hwnd] = current_time_ms
+            self.inactivity.set_enabled(self.settings['minimize_inactive_windows'])
 
             # Reapply dynamic transparency if enabled by defaults
             if self.settings['dynamic_transparency_enabled']:
@@ -2764,73 +6279,47 @@ Fixes Electricsheep Hotkey Compatibility """,
             else:
                 self.managed_by_script_hwnds.clear()
 
-    def kill_script(self):
-        """Failsafe hotkey to initiate a clean shutdown."""
-        self.show_message("Kill hotkey pressed. Exiting script.", "red")
-        self.on_closing()
-
-    def on_closing(self):
-        """Handles graceful shutdown when the main window is closed."""
-        self.ahk.stop_hotkeys()
-
-        if self.mouse_pos_timer:
-            self.root.after_cancel(self.mouse_pos_timer)
-            self.mouse_pos_timer = None
-
-        if self.window_monitor_fg_timer:
-            self.root.after_cancel(self.window_monitor_fg_timer)
-            self.window_monitor_fg_timer = None
-
-        if self.window_monitor_new_timer:
-            self.root.after_cancel(self.window_monitor_new_timer)
-            self.window_monitor_new_timer = None
-        
-        if self.window_monitor_inactivity_timer: # NEW: Cancel inactivity timer
-            self.root.after_cancel(self.window_monitor_inactivity_timer)
-            self.window_monitor_inactivity_timer = None
-
-        self._stop_tooltip_follow()
-
-        # Restore any dynamically transparent windows to full opacity before closing
-        self._restore_managed_transparency_to_full_opacity()
-
-        # NEW: Restore any windows minimized by the script to full size before closing
-        for hwnd in list(self.minimized_by_script_hwnds):
-            if win32gui.IsWindow(hwnd) and not self._is_window_excluded(hwnd): # Only restore if NOT excluded
-                win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-        self.minimized_by_script_hwnds.clear() # Clear the set after restoring/ignoring
-
-        self.save_settings()
-        self.root.destroy()
-
 # --- Helper Functions (outside class for reusability) ---
 
-def get_window_exe_name(hwnd):
+def get_window_pid(hwnd):
     """
-    Retrieves the executable name (e.g., 'notepad.exe') for a given window handle.
-    Returns None if unable to retrieve.
+    Retrieves the process ID owning a given window handle.
+    Returns 0 if the handle is not a valid window.
     """
     pid = ctypes.c_ulong()
     GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-    if pid.value == 0:
-        return None
+    return pid.value
 
-    process_handle = OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+def get_process_exe_and_start_time(pid):
+    """
+    Retrieves the executable name (e.g., 'notepad') and creation time of a process with a single OpenProcess.
+    Returns (None, None) if unable to retrieve; start time is None if only the name could be read.
+    """
+    process_handle = OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
     if not process_handle:
-        process_handle = OpenProcess(PROCESS_QUERY_INFORMATION, False, pid.value)
+        process_handle = OpenProcess(PROCESS_QUERY_INFORMATION, False, pid)
         if not process_handle:
-            return None
-
-    image_name_buffer = ctypes.create_unicode_buffer(260)
-    buffer_size = ctypes.c_ulong(260)
+            return None, None
 
-    if QueryFullProcessImageNameW(process_handle, 0, image_name_buffer, ctypes.byref(buffer_size)):
-        full_path = image_name_buffer.value
-        base_name = os.path.splitext(os.path.basename(full_path))[0].lower()
+    base_name = None
+    start_time = None
+    try:
+        image_name_buffer = ctypes.create_unicode_buffer(260)
+        buffer_size = ctypes.c_ulong(260)
+        if QueryFullProcessImageNameW(process_handle, 0, image_name_buffer, ctypes.byref(buffer_size)):
+            full_path = image_name_buffer.value
+            base_name = os.path.splitext(os.path.basename(full_path))[0].lower()
+
+        creation_time = ctypes.wintypes.FILETIME()
+        exit_time = ctypes.wintypes.FILETIME()
+        kernel_time = ctypes.wintypes.FILETIME()
+        user_time = ctypes.wintypes.FILETIME()
+        if GetProcessTimes(process_handle, ctypes.byref(creation_time), ctypes.byref(exit_time),
+                           ctypes.byref(kernel_time), ctypes.byref(user_time)):
+            start_time = (creation_time.dwHighDateTime << 32) | creation_time.dwLowDateTime
+    finally:
         CloseHandle(process_handle)
-        return base_name
-    CloseHandle(process_handle)
-    return None
+    return base_name, start_time
 
 def get_window_class_name(hwnd):
     """
@@ -2842,11 +6331,8 @@ def get_window_class_name(hwnd):
     except win32gui.error:
         return None
 
-def set_transparency_for_hwnd(hwnd, transparency_percentage):
-    """
-    Sets the transparency of a specific window using Windows API calls.
-    Returns True on success, False on failure.
-    """
+def transparency_percentage_to_alpha(transparency_percentage):
+    """Converts a 1-100 transparency percentage to the 0-255 alpha passed to SetLayeredWindowAttributes."""
     transparency_percentage = max(1, min(100, transparency_percentage))
 
     # Convert 1-100 percentage to 0-255 alpha value
@@ -2857,19 +6343,31 @@ def set_transparency_for_hwnd(hwnd, transparency_percentage):
     # This helps avoid visual glitches that can occur when Windows tries to render
     # windows with near-zero alpha values.
     MIN_EFFECTIVE_ALPHA_VALUE = 15 
-    alpha = max(MIN_EFFECTIVE_ALPHA_VALUE, min(255, alpha)) # Ensure alpha is within [MIN_EFFECTIVE_ALPHA_VALUE, 255]
+    return max(MIN_EFFECTIVE_ALPHA_VALUE, min(255, alpha)) # Ensure alpha is within [MIN_EFFECTIVE_ALPHA_VALUE, 255]
 
-    try:
-        current_ex_style = GetWindowLongPtrW(hwnd, GWL_EXSTYLE)
-
-        if not (current_ex_style & WS_EX_LAYERED):
-            new_ex_style = current_ex_style | WS_EX_LAYERED
-            SetWindowLongPtrW(hwnd, GWL_EXSTYLE, new_ex_style)
+def window_error_reason(error_code):
+    """Maps a GetLastError code from a failed transparency call to a FAILURE_* reason code."""
+    if error_code == ERROR_ACCESS_DENIED:
+        return FAILURE_ACCESS_DENIED
+    if error_code == ERROR_INVALID_WINDOW_HANDLE:
+        return FAILURE_INVALID
+    return FAILURE_NOT_LAYERABLE
 
-        success = SetLayeredWindowAttributes(hwnd, 0, alpha, LWA_ALPHA)
-        return success
-    except Exception as e:
-        return False
+def apply_layered_alpha(hwnd, ex_style, alpha):
+    """
+    Adds WS_EX_LAYERED to hwnd if ex_style (its GWL_EXSTYLE, or None if known to be layered) lacks it,
+    then sets its alpha. Returns (success, FAILURE_* reason or None). GetLastError is read here, on the
+    thread that made the calls, so this can run on a SafeWin32 pool thread.
+    """
+    if ex_style is not None and not (ex_style & WS_EX_LAYERED):
+        SetLastError(0)
+        if not SetWindowLongPtrW(hwnd, GWL_EXSTYLE, ex_style | WS_EX_LAYERED) and GetLastError():
+            return False, window_error_reason(GetLastError())
+        if not (GetWindowLongPtrW(hwnd, GWL_EXSTYLE) & WS_EX_LAYERED):
+            return False, FAILURE_NOT_LAYERABLE
+    if SetLayeredWindowAttributes(hwnd, 0, alpha, LWA_ALPHA):
+        return True, None
+    return False, window_error_reason(GetLastError())
 
 def set_layered_window_colorkey_and_alpha(hwnd, colorkey_rgb, alpha_percentage):
     """
@@ -2894,8 +6392,597 @@ def set_layered_window_colorkey_and_alpha(hwnd, colorkey_rgb, alpha_percentage):
         print(f"Error setting layered window attributes for HWND {hwnd}: {e}")
         return False
 
+# --- Benchmarks ---
+
+def default_benchmark_window_system(window_count=300):
+    """The live desktop on Windows, a synthetic one elsewhere."""
+    if WIN32_AVAILABLE:
+        return Win32WindowSystem()
+    return SimulatedWindowSystem.synthetic(window_count)
+
+def benchmark_window_snapshot(ticks=20, window_system=None):
+    """
+    Counts window-system calls per scheduling tick (on the live desktop when available): the old pattern
+    (five separate EnumWindows filters plus the per-window checks of the inactivity monitor) versus one
+    shared WindowSnapshotService serving the same six consumers.
+    """
+    window_system = window_system or default_benchmark_window_system()
+    legacy_calls = 0
+    legacy_start = time.perf_counter()
+    for _ in range(ticks):
+        for _consumer in range(5):
+            titled = []
+            hwnds = window_system.enum_windows()
+            legacy_calls += 1
+            for hwnd in hwnds:
+                legacy_calls += 1
+                if window_system.is_visible(hwnd):
+                    legacy_calls += 1
+                    if window_system.get_title(hwnd) != "":
+                        titled.append(hwnd)
+        for hwnd in titled:
+            legacy_calls += 3
+            window_system.is_window(hwnd) and window_system.is_visible(hwnd) and window_system.get_title(hwnd)
+    legacy_ms = (time.perf_counter() - legacy_start) * 1000
+
+    service = WindowSnapshotService(DEFAULT_SETTINGS['window_snapshot_max_age_ms'], scanner=WindowScanner(window_system))
+    shared_start = time.perf_counter()
+    for _ in range(ticks):
+        service.invalidate()
+        for _consumer in range(6):
+            service.get()
+    shared_ms = (time.perf_counter() - shared_start) * 1000
+    stats = service.get_stats()
+
+    print(f"Windows on {window_system.name} desktop: {stats['windows']}")
+    print(f"Legacy:   {legacy_calls / ticks:8.1f} calls/tick, {legacy_ms / ticks:7.2f} ms/tick")
+    print(f"Snapshot: {stats['win32_calls'] / ticks:8.1f} calls/tick, {shared_ms / ticks:7.2f} ms/tick")
+
+def benchmark_window_scan(window_count=1000, per_window_ms=0.02, duration_s=2.0, tick_ms=5, scan_every_ms=100):
+    """
+    Measures GUI event-loop latency (how late a tick_ms heartbeat runs) while a simulated desktop of
+    window_count windows is rescanned every scan_every_ms: synchronously on the loop thread versus on a
+    WindowScanWorker whose snapshots come back through a CommandQueue, as in the app.
+    """
+    def run(use_worker):
+        lock = threading.Lock()
+        timers = []
+        order = [0]
+
+        def schedule(ms, callback):
+            with lock:
+                order[0] += 1
+                heapq.heappush(timers, (time.perf_counter() + ms / 1000, order[0], callback))
+
+        lateness_ms = []
+
+        def heartbeat(due):
+            lateness_ms.append((time.perf_counter() - due) * 1000)
+            schedule_heartbeat()
+
+        def schedule_heartbeat():
+            due = time.perf_counter() + tick_ms / 1000
+            schedule(tick_ms, lambda: heartbeat(due))
+
+        # The whole scan's cost is spent in one enumeration call, so sleep granularity does not skew it.
+        desktop = SimulatedWindowSystem.synthetic(window_count, method_latency_ms={'enum_windows': window_count * per_window_ms})
+        snapshots = WindowSnapshotService(max_age_ms=0, scanner=WindowScanner(desktop))
+        worker = None
+        if use_worker:
+            commands = CommandQueue(schedule, interval_ms=0)
+            worker = WindowScanWorker(snapshots.scanner, lambda snapshot: commands.post('window_snapshot', snapshots.publish, snapshot),
+                                      min_interval_ms=0)
+            snapshots.attach_worker(worker)
+            snapshots.publish(snapshots.scanner.scan())
+
+        def rescan():
+            snapshots.invalidate()
+            snapshots.get().visible_titled_hwnds()
+            schedule(scan_every_ms, rescan)
+
+        schedule(0, rescan)
+        schedule_heartbeat()
+        end = time.perf_counter() + duration_s
+        while time.perf_counter() < end:
+            with lock:
+                due, _, callback = timers[0]
+                if due <= time.perf_counter():
+                    heapq.heappop(timers)
+                else:
+                    callback = None
+            if callback is None:
+                time.sleep(max(0.0, min(due - time.perf_counter(), 0.001)))
+            else:
+                callback()
+        if worker:
+            worker.stop()
+        lateness_ms.sort()
+        return lateness_ms, snapshots.scanner.scans
+
+    print(f"Simulated desktop: {window_count} windows, {window_count * per_window_ms:.0f} ms per scan, rescan every {scan_every_ms} ms")
+    print(f"{'mode':>12} {'scans':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for use_worker in (False, True):
+        lateness_ms, scans = run(use_worker)
+        p50 = lateness_ms[len(lateness_ms) // 2]
+        p99 = lateness_ms[int(len(lateness_ms) * 0.99)]
+        print(f"{'worker' if use_worker else 'tk thread':>12} {scans:>6} {p50:>8.2f} {p99:>8.2f} {lateness_ms[-1]:>8.2f}")
+
+def benchmark_hung_windows(windows=20, hung=3, rounds=5, hang_s=2.0, timeout_ms=100):
+    """
+    Applies a (simulated) blocking cross-process call to every window for several rounds while a few
+    windows belong to a hung process, through SafeWin32. A direct call would block the Tk thread for
+    hang_s on every hung window; the safe layer waits at most timeout_ms once, then quarantines it.
+    """
+    desktop = SimulatedWindowSystem.synthetic(windows, invisible_ratio=0, hang_ms=hang_s * 1000)
+    hwnds = list(desktop.windows)
+    hung_hwnds = set(hwnds[:hung])
+
+    def blocking_call(hwnd):
+        if hwnd in hung_hwnds:
+            time.sleep(hang_s)
+        return 1
+
+    # IsHungAppWindow only reports a window hung after it ignored messages for seconds, so the simulated
+    # windows are not flagged: the first round has to find them through timeouts.
+    safe = SafeWin32(timeout_ms, window_system=desktop) # Fewer workers than hung windows: stuck ones get replaced
+    for round_index in range(rounds):
+        start = time.perf_counter()
+        applied = sum(1 for hwnd in hwnds if safe.call(hwnd, blocking_call, hwnd))
+        round_ms = (time.perf_counter() - start) * 1000
+        print(f"Round {round_index + 1}: {applied}/{windows} applied in {round_ms:7.1f} ms "
+              f"(direct calls: {hung * hang_s * 1000:.0f} ms blocked)")
+    safe.close()
+    print(safe.get_stats())
+
+def benchmark_simulated_desktop(sizes=(10, 100, 1000, 5000), ticks=50, latency_ms=0.0):
+    """
+    Runs the monitoring loops against synthetic desktops: a startup pass (scan, exclusion check and
+    transparency for every window), then ticks that switch the foreground window and rerun the scan,
+    exclusion, dynamic transparency and inactivity steps, then one minimize-others pass. Reports
+    window-system calls and time per phase; latency_ms is injected into every simulated call.
+    """
+    print(f"{'windows':>8} {'startup calls':>14} {'startup ms':>11} {'calls/tick':>11} {'ms/tick':>8} {'minimize calls':>15}")
+    for size in sizes:
+        desktop = SimulatedWindowSystem.synthetic(size, latency_ms=latency_ms)
+        safe = SafeWin32(window_system=desktop)
+        snapshots = WindowSnapshotService(DEFAULT_SETTINGS['window_snapshot_max_age_ms'], scanner=WindowScanner(desktop, safe))
+        metadata = WindowMetadataCache(window_system=desktop)
+        matcher = ExclusionMatcher(DEFAULT_SETTINGS['global_transparency_exclusions'])
+        transparency = TransparencyReconciler(safe, metadata.get_exe_name)
+        clock = [0.0]
+        inactivity = InactivityScheduler(lambda ms, callback: None, lambda timer_id: None, lambda expired: None,
+                                         clock=lambda: clock[0])
+
+        def tick(foreground):
+            snapshots.invalidate()
+            snapshot = snapshots.get()
+            metadata.prime(snapshot)
+            desired = {}
+            for hwnd in snapshot.visible_titled_hwnds():
+                inactivity.track(hwnd)
+                # As _should_window_be_dynamically_managed does for every window on each reapply
+                if snapshots.is_visible_titled(hwnd) and not metadata.is_excluded(hwnd, matcher.matches):
+                    desired[hwnd] = DEFAULT_SETTINGS['active_window_transparency' if hwnd == foreground else 'inactive_window_transparency']
+            transparency.reconcile(desired)
+            inactivity.touch(foreground)
+
+        start = time.perf_counter()
+        tick(desktop.get_foreground_window())
+        startup_ms = (time.perf_counter() - start) * 1000
+        startup_calls = sum(desktop.calls.values())
+
+        rng = random.Random(size)
+        candidates = snapshots.get().visible_titled_hwnds()
+        start = time.perf_counter()
+        for _ in range(ticks):
+            clock[0] += 1.0
+            desktop.set_foreground(rng.choice(candidates))
+            tick(desktop.get_foreground_window())
+        tick_ms = (time.perf_counter() - start) * 1000 / ticks
+        tick_calls = (sum(desktop.calls.values()) - startup_calls) / ticks
+
+        before = sum(desktop.calls.values())
+        keep = desktop.get_root(desktop.window_from_point(desktop.get_cursor_pos()))
+        for hwnd in snapshots.get().visible_titled_hwnds():
+            if hwnd != keep and not desktop.is_iconic(hwnd):
+                safe.show_window(hwnd, SW_MINIMIZE)
+        minimize_calls = sum(desktop.calls.values()) - before
+        safe.close()
+        print(f"{size:>8} {startup_calls:>14} {startup_ms:>11.2f} {tick_calls:>11.1f} {tick_ms:>8.2f} {minimize_calls:>15}")
+
+def benchmark_headless_engine(window_count=200, switches=200):
+    """
+    Runs the engine on a HeadlessEngineLoop against a synthetic desktop, with scripted hotkeys,
+    simulated WinEvents, modifiers and brightness and a throwaway settings file. Reports the time and
+    Python memory to start, then drives foreground switches and Ctrl+wheel hotkeys from another
+    thread while the loop runs, and reports how they were handled.
+    """
+    import tempfile
+    import tracemalloc
+    desktop = SimulatedWindowSystem.synthetic(window_count)
+    events = SimulatedWinEventSource()
+    hotkeys = ScriptedHotkeyBackend()
+    modifiers = SimulatedModifierState()
+    with tempfile.TemporaryDirectory() as settings_dir:
+        tracemalloc.start()
+        start = time.perf_counter()
+        loop = HeadlessEngineLoop()
+        engine = TransparencyEngine(loop, events, modifiers, hotkeys, desktop, SimulatedBrightnessBackend(0),
+                                    settings_file=os.path.join(settings_dir, 'settings.pkl'))
+        engine.start()
+        startup_ms = (time.perf_counter() - start) * 1000
+        retained_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        candidates = engine.window_snapshots.get().visible_titled_hwnds()
+        wheel_up = engine.hotkey_specs['increase_transparency'].ahk_syntax
+
+        def switch(hwnd):
+            desktop.set_foreground(hwnd)
+            events.emit(EVENT_SYSTEM_FOREGROUND, hwnd)
+
+        def drive():
+            modifiers.press(MOD_CONTROL)
+            for i in range(switches):
+                loop.after(0, functools.partial(switch, candidates[i % len(candidates)]))
+                hotkeys.press(wheel_up) # Posts from this thread, as a hotkey backend thread would
+                time.sleep(0.002)
+            modifiers.release(MOD_CONTROL)
+            time.sleep(0.2) # Let the last command pump run
+            loop.after(0, engine.on_closing)
+
+        start = time.perf_counter()
+        driver = threading.Thread(target=drive, name="BenchmarkDriver", daemon=True)
+        driver.start()
+        loop.run()
+        driver.join()
+        run_s = time.perf_counter() - start
+
+    event_stats = events.get_stats()
+    command_stats = engine.commands.get_stats()
+    print(f"startup (traced):          {startup_ms:.1f} ms for {len(candidates)} visible windows, phases {engine.startup_timings}")
+    print(f"python memory at startup:  {retained_bytes / 1e6:.2f} MB retained, {peak_bytes / 1e6:.2f} MB peak")
+    print(f"foreground switches:       {event_stats['events_dispatched']} (avg {event_stats['avg_dispatch_ms']} ms, max {event_stats['max_dispatch_ms']} ms)")
+    print(f"hotkey commands:           {command_stats['executed']} in {command_stats['pumps']} pumps "
+          f"(avg {command_stats['avg_latency_ms']} ms queued, max {command_stats['max_latency_ms']} ms)")
+    print(f"loop callbacks:            {loop.callbacks_run} in {run_s:.2f} s, {loop.errors} errors")
+    print(f"window-system calls:       {sum(desktop.calls.values())}")
+
+def benchmark_startup_pass(window_count=200, latency_ms=0.05):
+    """
+    'Apply on Script Start' on a headless engine over a synthetic desktop of window_count visible
+    windows (latency_ms injected into every window-system call): done in one blocking pass (slice
+    without limit) versus time-sliced. Reports when start() returned (hotkeys live), when the foreground
+    window was done, the longest the loop was blocked (start() or any one pump of due callbacks) and
+    when the whole pass finished.
+    """
+    import tempfile
+    print(f"{'mode':>8} {'start() ms':>11} {'foreground ms':>14} {'longest block ms':>17} {'slices':>7} {'pass done ms':>13}")
+    for mode, slice_ms in (('blocking', float('inf')), ('sliced', DEFAULT_SETTINGS['startup_pass_slice_ms'])):
+        desktop = SimulatedWindowSystem.synthetic(window_count, invisible_ratio=0.0, latency_ms=latency_ms)
+        with tempfile.TemporaryDirectory() as settings_dir:
+            loop = HeadlessEngineLoop()
+            engine = TransparencyEngine(loop, SimulatedWinEventSource(), SimulatedModifierState(), ScriptedHotkeyBackend(),
+                                        desktop, SimulatedBrightnessBackend(0), settings_file=os.path.join(settings_dir, 'settings.pkl'))
+            engine.settings.update(apply_on_script_start=True, dynamic_transparency_enabled=True,
+                                   manage_all_windows_dynamically=True, startup_pass_slice_ms=slice_ms)
+            start = time.perf_counter()
+            engine.start()
+            start_ms = longest_ms = (time.perf_counter() - start) * 1000
+            while not engine.startup_finished:
+                pump_start = time.perf_counter()
+                loop.run_pending()
+                longest_ms = max(longest_ms, (time.perf_counter() - pump_start) * 1000)
+                time.sleep(0.001)
+            done_ms = (time.perf_counter() - start) * 1000
+            foreground_ms = engine.startup_timings['foreground_applied'] - (start - engine._created_at) * 1000
+            stats = engine.startup_pass.get_stats()
+            loop.after(0, engine.on_closing)
+            loop.run()
+        print(f"{mode:>8} {start_ms:>11.1f} {foreground_ms:>14.1f} {longest_ms:>17.1f} {stats['slices']:>7} {done_ms:>13.1f}")
+
+def benchmark_exclusion_matcher(lookups=20000):
+    """
+    Times exclusion checks as the list grows: the old per-call split/strip/lower plus linear
+    'in' scan versus the precompiled ExclusionMatcher (with a few glob and regex entries mixed in).
+    """
+    samples = [('notepad', 'Notepad'), ('chrome', 'Chrome_WidgetWin_1'), ('explorer', 'CabinetWClass'), ('code', 'Chrome_WidgetWin_1')]
+    print(f"{'entries':>8} {'legacy us/check':>16} {'compiled us/check':>18}")
+    for size in (5, 50, 200, 500):
+        names = [f"app{i}" for i in range(size - 3)] + ['explorer', 'chrome*', 're:^Chrome_WidgetWin_\\d+$']
+        exclusion_list_str = ", ".join(names)
+
+        start = time.perf_counter()
+        for i in range(lookups):
+            exe_name, window_class = samples[i % len(samples)]
+            exclusion_list = [e.strip().lower() for e in exclusion_list_str.split(',') if e.strip()]
+            _ = (exe_name in exclusion_list) or (window_class.lower() in exclusion_list)
+        legacy_us = (time.perf_counter() - start) * 1e6 / lookups
+
+        matcher = ExclusionMatcher(exclusion_list_str)
+        start = time.perf_counter()
+        for i in range(lookups):
+            exe_name, window_class = samples[i % len(samples)]
+            matcher.matches(exe_name, window_class)
+        compiled_us = (time.perf_counter() - start) * 1e6 / lookups
+
+        print(f"{size:>8} {legacy_us:>16.2f} {compiled_us:>18.2f}")
+
+def benchmark_brightness_worker(notches=50, notch_interval_ms=5, latency_ms=150):
+    """
+    Simulates a fast alt+wheel burst against a slow (DDC/CI-like) brightness backend and reports how
+    long the GUI thread spent in each request and how many intermediate levels were dropped, then
+    checks the sysfs backlight backend against a temporary sysfs-like tree.
+    """
+    backend = SimulatedBrightnessBackend(latency_ms)
+    worker = BrightnessWorker(backend)
+    max_request_ms = 0.0
+    burst_start = time.perf_counter()
+    for level in range(notches):
+        start = time.perf_counter()
+        worker.request(level)
+        max_request_ms = max(max_request_ms, (time.perf_counter() - start) * 1000)
+        time.sleep(notch_interval_ms / 1000)
+    burst_ms = (time.perf_counter() - burst_start) * 1000
+    while not backend.applied_levels or backend.applied_levels[-1] != notches - 1:
+        time.sleep(latency_ms / 1000)
+    settle_ms = (time.perf_counter() - burst_start) * 1000 - burst_ms
+    worker.stop()
+
+    stats = worker.get_stats()
+    print(f"Notches: {notches} over {burst_ms:.0f} ms, backend latency {latency_ms} ms")
+    print(f"GUI thread: max {max_request_ms:.3f} ms per request (synchronous would be {latency_ms} ms)")
+    print(f"Backend calls: {stats['applied']} (dropped {stats['dropped']} stale levels), final level applied {settle_ms:.0f} ms after the burst")
+    print(f"Synchronous equivalent: {notches * latency_ms} ms of blocking")
+    check_sysfs_backlight_backend()
+
+def check_sysfs_backlight_backend():
+    """
+    Runs SysfsBacklightBackend against a temporary directory laid out like /sys/class/backlight with two
+    devices of different types: checks that the preferred type is chosen and that levels are scaled to
+    the device's max_brightness. Raises AssertionError on a mismatch.
+    """
+    import tempfile
+    devices = {'acpi_video0': ('firmware', 1000), 'intel_backlight': ('raw', 7500)}
+    with tempfile.TemporaryDirectory() as base_path:
+        for name, (device_type, max_brightness) in devices.items():
+            device_path = os.path.join(base_path, name)
+            os.mkdir(device_path)
+            for file_name, value in (('type', device_type), ('max_brightness', max_brightness), ('brightness', max_brightness)):
+                with open(os.path.join(device_path, file_name), 'w') as f:
+                    f.write(f"{value}\n")
+
+        backend = SysfsBacklightBackend.open(base_path)
+        assert backend is not None and os.path.basename(backend.device_path) == 'acpi_video0', backend
+        brightness_path = os.path.join(backend.device_path, 'brightness')
+        written = []
+        try:
+            for level in (37, 5, 100):
+                # sysfs replaces the whole value on each write; empty the plain file so it reads back the same way.
+                os.truncate(brightness_path, 0)
+                backend.set_brightness(level)
+                with open(brightness_path) as f:
+                    written.append(f.read())
+        finally:
+            backend.close()
+        assert written == ['370', '50', '1000'], written
+        print(f"sysfs backlight: chose {os.path.basename(backend.device_path)} (firmware over raw), wrote {written} for 37/5/100%")
+
+        # 'platform' beats 'raw' too, whatever the directory order.
+        with open(os.path.join(base_path, 'acpi_video0', 'type'), 'w') as f:
+            f.write("raw\n")
+        with open(os.path.join(base_path, 'intel_backlight', 'type'), 'w') as f:
+            f.write("platform\n")
+        device_path = SysfsBacklightBackend.find_device(base_path)
+        assert os.path.basename(device_path) == 'intel_backlight', device_path
+        print(f"sysfs backlight: chose {os.path.basename(device_path)} (platform over raw)")
+
+def benchmark_modifier_state(checks=200, round_trip_ms=0.5):
+    """
+    Times check_modifiers_match-style checks: eight ahk.key_state() round-trips (simulated with
+    round_trip_ms of latency each) versus one bitmask read from a modifier source.
+    """
+    class FakeAhk:
+        def __init__(self, held):
+            self.held = held
+        def key_state(self, key):
+            time.sleep(round_trip_ms / 1000)
+            return key in self.held
+
+    hotkey_str = 'ctrl+shift+wheelup'
+    required = modifier_mask_from_hotkey(hotkey_str)
+    sources = [
+        AhkModifierState(FakeAhk({'LCtrl', 'RShift'})),
+        SimulatedModifierState(MOD_CONTROL | MOD_SHIFT),
+    ]
+    for source in sources:
+        start = time.perf_counter()
+        for _ in range(checks):
+            matched = source.read() == required
+        per_check_us = (time.perf_counter() - start) * 1e6 / checks
+        print(f"{source.name:>10}: {per_check_us:10.1f} us/check (matched={matched})")
+
+def benchmark_hotkey_specs(rounds=200):
+    """
+    Checks and times hotkey compilation for every key in the hotkey dropdown combined with each
+    modifier set: the old per-use parse (linear scan of internal_to_display_map) versus HotkeyCompiler.
+    Any entry where the two disagree is printed.
+    """
+    internal_to_display_map, display_to_internal_map = build_hotkey_key_maps()
+    compiler = HotkeyCompiler(internal_to_display_map)
+
+    def legacy_ahk_syntax(hotkey_str, non_suppressing):
+        ahk_modifiers = []
+        ahk_main_key = ''
+        for part in hotkey_str.split('+'):
+            part_lower = part.strip().lower()
+            if part_lower in ('ctrl', 'shift', 'alt', 'win', 'windows'):
+                ahk_modifiers.append({'ctrl': '^', 'shift': '+', 'alt': '!'}.get(part_lower, '#'))
+            else:
+                found_ahk_key = next((k for k, v in internal_to_display_map.items()
+                                      if k.lower() == part_lower or v.lower() == part_lower), None)
+                if found_ahk_key:
+                    ahk_main_key = found_ahk_key
+                elif len(part) == 1 and (part.isalpha() or part.isdigit()):
+                    ahk_main_key = part
+                else:
+                    ahk_main_key = part.title()
+        if not ahk_main_key:
+            return None
+        ahk_modifiers_str = "".join(sorted(ahk_modifiers, key=lambda x: ('^', '+', '!', '#').index(x)))
+        return f"{'~' if non_suppressing else ''}{ahk_modifiers_str}{ahk_main_key}"
+
+    keys = [display_to_internal_map.get(name, name).lower() for name in TransparencyControllerApp._CUSTOM_KEY_DISPLAY_ORDER
+            if name != 'None'] + list('abcdefghijklmnopqrstuvwxyz')
+    modifier_sets = ['', 'ctrl+', 'ctrl+shift+', 'alt+', 'win+', 'ctrl+alt+shift+']
+    hotkey_strs = [f"{mods}{key}" for mods in modifier_sets for key in keys]
+
+    mismatches = 0
+    for hotkey_str in hotkey_strs:
+        for non_suppressing in (False, True):
+            spec = compiler.compile(None, hotkey_str, suppress=not non_suppressing)
+            expected = legacy_ahk_syntax(hotkey_str, non_suppressing)
+            if spec.ahk_syntax != expected or spec.modifiers != modifier_mask_from_hotkey(hotkey_str):
+                mismatches += 1
+                print(f"MISMATCH {hotkey_str!r}: compiled {spec.ahk_syntax!r}, legacy {expected!r}")
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for hotkey_str in hotkey_strs:
+            legacy_ahk_syntax(hotkey_str, False)
+    legacy_us = (time.perf_counter() - start) * 1e6 / (rounds * len(hotkey_strs))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for hotkey_str in hotkey_strs:
+            compiler.compile(None, hotkey_str)
+    compiled_us = (time.perf_counter() - start) * 1e6 / (rounds * len(hotkey_strs))
+
+    print(f"Hotkey strings checked: {len(hotkey_strs)} x 2 suppress modes, mismatches: {mismatches}")
+    print(f"Legacy parse: {legacy_us:.2f} us, compile: {compiled_us:.2f} us (compiled once per settings change)")
+
+def benchmark_inactivity_scheduler(windows=40, minutes=60, focus_interval_s=20, poll_interval_ms=200, delay_ms=15000):
+    """
+    Simulates an hour of a user switching between a few of the open windows (on a fake clock) and
+    compares the wakes of the deadline scheduler with the full scans a fixed-interval poll would run.
+    """
+    clock = [0.0]
+    timers = {}
+    timer_ids = [0]
+
+    def schedule(ms, callback):
+        timer_ids[0] += 1
+        timer_id = timer_ids[0]
+        timers[timer_id] = (clock[0] + ms / 1000, callback)
+        return timer_id
+
+    def cancel(timer_id):
+        timers.pop(timer_id, None)
+
+    minimize_calls = []
+    scheduler = InactivityScheduler(schedule, cancel, minimize_calls.append, delay_ms, clock=lambda: clock[0])
+    for hwnd in range(windows):
+        scheduler.track(hwnd)
+
+    end = minutes * 60
+    next_focus = 0.0
+    focus_count = 0
+    start = time.perf_counter()
+    while clock[0] < end:
+        due = min((timers[timer_id][0], timer_id) for timer_id in timers) if timers else (end, None)
+        if next_focus <= due[0]:
+            clock[0] = next_focus
+            scheduler.touch(focus_count % 5)
+            focus_count += 1
+            next_focus += focus_interval_s
+        else:
+            clock[0] = due[0]
+            timers.pop(due[1])[1]()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    stats = scheduler.get_stats()
+    print(f"{windows} windows, {minutes} min simulated, focus change every {focus_interval_s} s")
+    print(f"Polling every {poll_interval_ms} ms: {int(end * 1000 / poll_interval_ms)} scans of {windows} windows")
+    print(f"Deadline scheduler: {stats['wakes']} wakes, {len(minimize_calls)} minimize passes, "
+          f"{stats['stale_entries']} stale heap entries skipped ({elapsed_ms:.1f} ms total)")
+
+def benchmark_periodic_scheduler(minutes=60, active_every_s=300):
+    """
+    Simulates an hour, mostly idle, of the app's polling loops on a fake clock (hooks active, mouse label shown,
+    a burst of mouse movement every active_every_s) and compares the callback runs of fixed-interval
+    root.after loops with the backing-off PeriodicScheduler.
+    """
+    clock = [0.0]
+    timers = {}
+    timer_ids = [0]
+
+    def schedule(ms, callback):
+        timer_ids[0] += 1
+        timers[timer_ids[0]] = (clock[0] + ms / 1000, callback)
+        return timer_ids[0]
+
+    def cancel(timer_id):
+        timers.pop(timer_id, None)
+
+    def is_active():
+        return clock[0] % active_every_s < 2 # Two seconds of activity per period
+
+    intervals = {'foreground': 1000, 'new_windows': 30000, 'mouse_position': 100}
+    scheduler = PeriodicScheduler(schedule, cancel, clock=lambda: clock[0])
+    scheduler.add_task('foreground', lambda: False, intervals['foreground'], max_backoff=4)
+    scheduler.add_task('new_windows', lambda: False, intervals['new_windows'], max_backoff=4)
+    scheduler.add_task('mouse_position', is_active, intervals['mouse_position'], max_backoff=4)
+    scheduler.refresh()
+
+    end = minutes * 60
+    while timers:
+        timer_id, (due, callback) = min(timers.items(), key=lambda item: item[1][0])
+        if due > end:
+            break
+        del timers[timer_id]
+        clock[0] = due
+        callback()
+
+    stats = scheduler.get_stats()
+    print(f"{minutes} min simulated, activity for 2 s every {active_every_s} s")
+    for name, interval_ms in intervals.items():
+        print(f"{name:>15}: fixed loop {int(end * 1000 / interval_ms):6d} runs, scheduler {stats['tasks'][name]['runs']:6d} runs")
+    print(f"Scheduler timer wakes: {stats['timer_wakes']} (fixed loops: {sum(int(end * 1000 / ms) for ms in intervals.values())})")
+
+BENCHMARKS = {
+    'snapshot': benchmark_window_snapshot,
+    'scan': benchmark_window_scan,
+    'hung': benchmark_hung_windows,
+    'desktop': benchmark_simulated_desktop,
+    'engine': benchmark_headless_engine,
+    'startup': benchmark_startup_pass,
+    'exclusions': benchmark_exclusion_matcher,
+    'brightness': benchmark_brightness_worker,
+    'modifiers': benchmark_modifier_state,
+    'hotkeys': benchmark_hotkey_specs,
+    'inactivity': benchmark_inactivity_scheduler,
+    'periodic': benchmark_periodic_scheduler,
+}
+
+MODULE_LOAD_MS = round((time.perf_counter() - _MODULE_LOAD_STARTED) * 1000, 1)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Dynamic window transparency controller.")
+    parser.add_argument('--benchmark', choices=sorted(BENCHMARKS), help="Run a benchmark instead of the GUI.")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run in the background without the settings panel (the Open Settings hotkey brings it up).")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="Start up, print an import-time and startup-phase breakdown, then shut down.")
+    args = parser.parse_args()
+    if args.benchmark:
+        BENCHMARKS[args.benchmark]()
+        sys.exit(0)
+    if not WIN32_AVAILABLE:
+        print(f"Error loading Windows API functions: {WIN32_LOAD_ERROR}")
+        print("This script is intended for Windows operating systems.")
+        sys.exit(1)
+
+    preamble_start = time.perf_counter()
     settings = DEFAULT_SETTINGS.copy()
     if os.path.exists(SETTINGS_FILE):
         try:
@@ -2905,16 +6992,41 @@ if __name__ == "__main__":
             # ... (merge and cleanup logic) ...
 
             settings = loaded_settings
-        except (EOFError, pickle.UnpickingError):
+        except (EOFError, pickle.UnpicklingError):
             # If file is corrupt or empty, use default settings
             settings = DEFAULT_SETTINGS.copy()
             pass 
 
     # Always save settings after loading/merging to ensure file is up-to-date with current structure
     # and deprecated keys are removed for next launch.
-    with open(SETTINGS_FILE, 'wb') as f:
-        pickle.dump(settings, f)
-
+    write_file_atomic(SETTINGS_FILE, pickle.dumps(settings))
+    preamble = [('settings file refresh', (time.perf_counter() - preamble_start) * 1000)]
+
+    if args.headless:
+        engine = TransparencyEngine(HeadlessEngineLoop())
+        engine.start()
+        if args.profile_startup:
+            while not engine.startup_finished:
+                engine.loop.run_pending()
+                time.sleep(0.001)
+            engine.print_startup_profile(preamble)
+            engine.on_closing()
+            sys.exit(0)
+        engine.loop.run()
+        sys.exit(0)
+
+    root_start = time.perf_counter()
+    load_gui_toolkit()
     root = customtkinter.CTk()
+    preamble.append(('GUI toolkit import + Tk root', (time.perf_counter() - root_start) * 1000))
     app = TransparencyControllerApp(root)
+    if args.profile_startup:
+        root.update() # First paint, including the sections reopened via after_idle
+        app._mark_startup('first_paint')
+        while not app.startup_finished:
+            root.update()
+            time.sleep(0.001)
+        app.print_startup_profile(preamble)
+        app.on_closing()
+        sys.exit(0)
     root.mainloop()
\ No newline at end of file